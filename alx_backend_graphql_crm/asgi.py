@@ -2,6 +2,9 @@
 ASGI config for alx_backend_graphql_crm project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+WebSocket connections on ``/graphql`` serve GraphQL subscriptions; all
+other traffic goes to Django. Set ``DJANGO_SETTINGS_MODULE`` to
+``alx_backend_graphql_crm.settings_api`` for an API-only worker.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +16,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql_crm.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once the apps are loaded
+from alx_backend_graphql_crm.schema import schema  # noqa: E402
+from crm.websocket import GraphQLWebSocket, route_websockets  # noqa: E402
+
+application = route_websockets(django_application, {'/graphql': GraphQLWebSocket(schema)})
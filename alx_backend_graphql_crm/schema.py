@@ -1,6 +1,7 @@
 import graphene
 from crm.schema import Query as CRMQuery
 from crm.schema import Mutation as CRMMutation
+from crm.schema import Subscription as CRMSubscription
 
 class Query(CRMQuery, graphene.ObjectType):
     pass
@@ -8,4 +9,7 @@ class Query(CRMQuery, graphene.ObjectType):
 class Mutation(CRMMutation, graphene.ObjectType):
     pass
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
\ No newline at end of file
+class Subscription(CRMSubscription, graphene.ObjectType):
+    pass
+
+schema = graphene.Schema(query=Query, mutation=Mutation, subscription=Subscription)
\ No newline at end of file
@@ -5,6 +5,8 @@ Django settings for alx-backend-graphql_crm project.
 import os
 from pathlib import Path
 
+import django
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -69,13 +71,34 @@ WSGI_APPLICATION = 'alx_backend_graphql_crm.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Connections are kept for CONN_MAX_AGE seconds and checked before reuse.
+# 'replica' only serves reads once listed in CRM_DATABASE['READ_REPLICAS']; with
+# SQLite it is the primary file opened through its own connections. It is never
+# migrated (see ReplicaRouter) and mirrors the test database in tests.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+if django.VERSION >= (5, 1):
+    # Writers take the lock when their transaction begins instead of failing
+    # to upgrade a read lock under WAL
+    DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+
+DATABASE_ROUTERS = ['crm.database.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -120,5 +143,98 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # GraphQL Configuration
 GRAPHENE = {
-    'SCHEMA': 'schema.schema'
-}
\ No newline at end of file
+    'SCHEMA': 'alx_backend_graphql_crm.schema.schema',
+    # graphene-django adds DjangoDebugMiddleware when DEBUG is on; the schema
+    # has no _debug field to drain it, so it would leave every cursor wrapped
+    'MIDDLEWARE': [],
+}
+
+# Parsed/validated GraphQL documents are cached by sha256 (see crm/persisted.py).
+# Set ALLOW_LIST to a {sha256: query} JSON manifest to reject any other document.
+CRM_PERSISTED_QUERIES = {
+    'CACHE_SIZE': 500,
+    'ALLOW_LIST': None,
+}
+
+# Operations are costed before execution (see crm/cost.py) and rejected
+# above MAX_COST or MAX_DEPTH. FAN_OUT overrides the per-relation estimates.
+CRM_QUERY_COST = {
+    'MAX_COST': 20000,
+    'MAX_DEPTH': 15,
+    'FAN_OUT': {},
+}
+
+# Applied to every new SQLite connection (see crm/database.py). GraphQL query
+# operations read from one of READ_REPLICAS, e.g. ['replica']; everything else
+# uses the primary.
+CRM_DATABASE = {
+    'SQLITE_PRAGMAS': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 134217728,
+        'cache_size': -20000,
+        'busy_timeout': 5000,
+    },
+    'READ_REPLICAS': [],
+}
+
+# Per-resolver timing and SQL counts (see crm/tracing.py). A request is traced
+# when ENABLED or when it sends "<HEADER>: 1"; /metrics serves the aggregated
+# histograms to METRICS_ALLOWED_IPS only.
+CRM_TRACING = {
+    'ENABLED': False,
+    'HEADER': 'X-CRM-Trace',
+    'METRICS_ALLOWED_IPS': ['127.0.0.1', '::1'],
+    # Distinct operation names kept as metric labels, the rest are "other"
+    'MAX_OPERATION_NAMES': 50,
+}
+
+# Cached responses of query operations, invalidated when the models they read
+# change (see crm/response_cache.py). Off by default: LocMemBackend only sees
+# the invalidations of its own process, so enable it as is for a single worker
+# only. With several workers use 'crm.response_cache.FileBackend' with OPTIONS
+# {'directory': ...}, which every worker shares.
+CRM_RESPONSE_CACHE = {
+    'ENABLED': False,
+    'BACKEND': 'crm.response_cache.LocMemBackend',
+    'OPTIONS': {'max_entries': 1000},
+    'TIMEOUT': 60,
+}
+
+# A POST body holding a JSON array runs its operations as one batch (see
+# CRMGraphQLView), at most MAX_SIZE of them. With PARALLEL, the async endpoint
+# executes a batch made only of queries concurrently.
+CRM_BATCH = {
+    'MAX_SIZE': 20,
+    'PARALLEL': True,
+}
+
+# Message broker feeding the GraphQL subscriptions (see crm/pubsub.py).
+# LocalBroker only reaches subscribers in the process that made the write.
+CRM_PUBSUB = {
+    'BROKER': 'crm.pubsub.LocalBroker',
+    'OPTIONS': {'max_queue': 100},
+}
+
+# Jobs run by `manage.py crm_worker` (see crm/scheduler.py). SCHEDULE is a cron
+# expression in TIME_ZONE; each run is delayed by up to JITTER seconds. A job
+# never overlaps itself, across worker processes sharing LOCK_DIR either.
+CRM_WORKER = {
+    'MAX_WORKERS': 4,
+    'LOCK_DIR': None,  # <tempdir>/crm_worker
+    'JOBS': {
+        'log_crm_heartbeat': {'SCHEDULE': '*/5 * * * *', 'FUNCTION': 'crm.jobs.log_crm_heartbeat'},
+        'update_low_stock': {'SCHEDULE': '0 */12 * * *', 'FUNCTION': 'crm.jobs.update_low_stock', 'JITTER': 60},
+        'send_order_reminders': {'SCHEDULE': '0 8 * * *', 'FUNCTION': 'crm.jobs.send_order_reminders', 'JITTER': 60},
+        'clean_inactive_customers': {'SCHEDULE': '0 2 * * 0', 'FUNCTION': 'crm.jobs.clean_inactive_customers', 'JITTER': 300},
+    },
+}
+
+# Order reminder digests (crm/reminders.py). SINK is any
+# crm.reminders.ReminderSink: FileSink, or EmailSink to send them through an
+# email backend, e.g. {'backend': 'django.core.mail.backends.smtp.EmailBackend',
+# 'host': 'localhost', 'port': 1025} for a local SMTP server.
+CRM_REMINDERS = {
+    'SINK': 'crm.reminders.FileSink',
+    'OPTIONS': {'path': '/tmp/order_reminders_log.txt'},
+}
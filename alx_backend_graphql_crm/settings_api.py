@@ -0,0 +1,34 @@
+"""
+Settings for GraphQL-only workers.
+
+Same database and ``CRM_*`` options as ``settings.py``, without the admin,
+auth, sessions, messages, static files and templates that an API worker
+never uses, so it imports and migrates less at startup and holds less
+memory. GraphiQL is off. Run with
+``DJANGO_SETTINGS_MODULE=alx_backend_graphql_crm.settings_api``.
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+
+DEBUG = False
+
+ALLOWED_HOSTS = os.environ.get('CRM_ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
+
+INSTALLED_APPS = [
+    'graphene_django',
+    'django_filters',
+    'crm',
+]
+
+# CommonMiddleware validates the Host header against ALLOWED_HOSTS
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+ROOT_URLCONF = 'alx_backend_graphql_crm.urls_api'
+
+TEMPLATES = []
+
+AUTH_PASSWORD_VALIDATORS = []
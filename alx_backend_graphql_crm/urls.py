@@ -1,11 +1,14 @@
 from django.contrib import admin
 from django.urls import path, include, re_path
-from graphene_django.views import GraphQLView
-from crm.schema import schema
+from alx_backend_graphql_crm.schema import schema
+from crm.views import AsyncCRMGraphQLView, CRMGraphQLView, export_orders, metrics
 from django.views.decorators.csrf import csrf_exempt
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('crm/', include('crm.urls')),
-    re_path(r"graphql", csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema)), name='graphql'),
-]
\ No newline at end of file
+    path('export/orders', export_orders, name='export-orders'),
+    path('metrics', metrics, name='metrics'),
+    path('graphql/async', csrf_exempt(AsyncCRMGraphQLView.as_view(schema=schema)), name='graphql-async'),
+    re_path(r"graphql", csrf_exempt(CRMGraphQLView.as_view(graphiql=True, schema=schema)), name='graphql'),
+]
@@ -0,0 +1,13 @@
+"""URLs of the API-only settings profile: GraphQL without GraphiQL, export and metrics"""
+from django.urls import path, re_path
+from django.views.decorators.csrf import csrf_exempt
+
+from alx_backend_graphql_crm.schema import schema
+from crm.views import AsyncCRMGraphQLView, CRMGraphQLView, export_orders, metrics
+
+urlpatterns = [
+    path('export/orders', export_orders, name='export-orders'),
+    path('metrics', metrics, name='metrics'),
+    path('graphql/async', csrf_exempt(AsyncCRMGraphQLView.as_view(schema=schema)), name='graphql-async'),
+    re_path(r"graphql", csrf_exempt(CRMGraphQLView.as_view(schema=schema)), name='graphql'),
+]
@@ -2,6 +2,10 @@
 WSGI config for alx_backend_graphql_crm project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
+The URLconf, and with it the GraphQL schema, is loaded here rather than on
+the first request, so a preloading server (``gunicorn --preload``) builds it
+once for all its workers. Set ``DJANGO_SETTINGS_MODULE`` to
+``alx_backend_graphql_crm.settings_api`` for an API-only worker.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
@@ -14,3 +18,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql_crm.settings')
 
 application = get_wsgi_application()
+
+from django.urls import get_resolver  # noqa: E402
+
+get_resolver().url_patterns
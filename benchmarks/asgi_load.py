@@ -0,0 +1,188 @@
+"""
+Load-test the sync view under WSGI against the async view under ASGI.
+
+Starts gunicorn (``/graphql``, gthread workers) and uvicorn
+(``/graphql/async``) with the same number of worker processes on a seeded
+throwaway SQLite database, then holds 50/200/1000 keep-alive clients
+against each for ``--duration`` seconds and prints req/s and latency
+percentiles. The servers are not project dependencies:
+
+    pip install gunicorn uvicorn
+    python benchmarks/asgi_load.py --clients 50 200 1000 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.utils import ROOT, free_port, setup_django
+
+# Two independent root fields: the async view awaits them together
+QUERY = """
+query Dashboard {
+  recent: allOrders(first: 20) { edges { node { id totalAmount customer { name } } } }
+  lowStock: allProducts(first: 20, lowStock: true) { edges { node { name stock } } }
+}
+"""
+
+
+def seed(customers, products, orders):
+    from django.core.management import call_command
+    from django.utils import timezone
+
+    from crm.models import Customer, Order, OrderItem, Product
+
+    call_command('migrate', verbosity=0)
+    Customer.objects.bulk_create(
+        Customer(name=f"Customer {i}", email=f"customer{i}@example.com") for i in range(customers)
+    )
+    Product.objects.bulk_create(
+        Product(name=f"Product {i}", price=10 + i % 90, stock=i % 40) for i in range(products)
+    )
+    customer_ids = list(Customer.objects.values_list('id', flat=True))
+    product_ids = list(Product.objects.values_list('id', flat=True))
+    now = timezone.now()
+    Order.objects.bulk_create(
+        Order(customer_id=customer_ids[i % customers], order_date=now, total_amount=30)
+        for i in range(orders)
+    )
+    OrderItem.objects.bulk_create(
+        OrderItem(order_id=order_id, product_id=product_ids[(order_id + k) % products], quantity=1)
+        for order_id in Order.objects.values_list('id', flat=True)
+        for k in range(3)
+    )
+
+
+def server_command(kind, port, workers, threads):
+    if kind == 'wsgi':
+        return [
+            sys.executable, '-m', 'gunicorn', 'alx_backend_graphql_crm.wsgi:application',
+            '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+            '--worker-class', 'gthread', '--threads', str(threads),
+            '--backlog', '2048', '--log-level', 'warning',
+        ]
+    return [
+        sys.executable, '-m', 'uvicorn', 'alx_backend_graphql_crm.asgi:application',
+        '--port', str(port), '--workers', str(workers),
+        '--backlog', '2048', '--log-level', 'warning', '--no-access-log',
+    ]
+
+
+async def send(reader, writer, request):
+    writer.write(request)
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length = 0
+    for line in head.split(b'\r\n'):
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def client(port, request, deadline, latencies, errors):
+    loop = asyncio.get_running_loop()
+    reader = writer = None
+    while loop.time() < deadline:
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            status = await send(reader, writer, request)
+        except (OSError, asyncio.IncompleteReadError):
+            errors.append('connection')
+            writer = None
+            await asyncio.sleep(0.05)
+            continue
+        latencies.append(time.perf_counter() - started)
+        if status != 200:
+            errors.append(status)
+    if writer is not None:
+        writer.close()
+
+
+async def load(port, path, clients, duration):
+    body = json.dumps({'query': QUERY}).encode()
+    request = (
+        f'POST {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n'
+        f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n'
+    ).encode() + body
+    latencies, errors = [], []
+    started = time.perf_counter()
+    deadline = asyncio.get_running_loop().time() + duration
+    await asyncio.gather(*(client(port, request, deadline, latencies, errors) for _ in range(clients)))
+    # Requests still in flight at the deadline are waited for and counted
+    return latencies, errors, time.perf_counter() - started
+
+
+def wait_for(port, path, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            latencies, errors, _ = asyncio.run(load(port, path, 1, 0.2))
+            if latencies and not errors:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not answer {path}")
+
+
+def percentile(samples, fraction):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, nargs='+', default=[50, 200, 1000])
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument('--customers', type=int, default=2000)
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--orders', type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'benchmarks.server_settings',
+            'CRM_BENCH_DB': os.path.join(tmpdir, 'bench.sqlite3'),
+            'PYTHONPATH': ROOT,
+        }
+        os.environ.update(env)
+        setup_django()
+        seed(args.customers, args.products, args.orders)
+
+        print(f"{'server':<14} {'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for kind, path in (('wsgi', '/graphql'), ('asgi', '/graphql/async')):
+            port = free_port()
+            server = subprocess.Popen(
+                server_command(kind, port, args.workers, args.threads), cwd=ROOT, env=env
+            )
+            try:
+                wait_for(port, path)
+                for clients in args.clients:
+                    latencies, errors, elapsed = asyncio.run(load(port, path, clients, args.duration))
+                    label = 'gunicorn/wsgi' if kind == 'wsgi' else 'uvicorn/asgi'
+                    p50 = statistics.median(latencies) * 1000 if latencies else float('nan')
+                    p99 = percentile(latencies, 0.99) * 1000 if latencies else float('nan')
+                    print(
+                        f"{label:<14} {clients:>7} {len(latencies) / elapsed:>8.0f} "
+                        f"{p50:>8.1f} {p99:>8.1f} {len(errors):>7}"
+                    )
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Time bulkCreateCustomers at several payload sizes, optionally against the
+old per-row exists()/create() loop.
+
+    python benchmarks/bulk_create_customers.py --sizes 1000 10000 100000 --baseline
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.utils import setup_django, test_database
+
+setup_django()
+
+from django.db import connection, transaction
+from django.test import RequestFactory
+
+from alx_backend_graphql_crm.schema import schema
+from crm.models import Customer
+
+MUTATION = """
+mutation ($input: [CustomerInput]!, $batchSize: Int) {
+  bulkCreateCustomers(input: $input, batchSize: $batchSize) { errors }
+}
+"""
+
+
+def payload(size, offset):
+    # Every 50th row collides with an earlier one to exercise the error path
+    return [
+        {
+            'name': f"Customer {i}",
+            'email': f"customer{i - i % 50 if i % 50 == 49 else i}.{offset}@example.com",
+            'phone': "+1234567890",
+        }
+        for i in range(size)
+    ]
+
+
+def per_row(rows):
+    """The pre-batching implementation, kept for comparison"""
+    with transaction.atomic():
+        for row in rows:
+            if Customer.objects.filter(email=row['email']).exists():
+                continue
+            Customer.objects.create(name=row['name'], email=row['email'], phone=row['phone'])
+
+
+def batched(rows, batch_size):
+    result = schema.execute(
+        MUTATION,
+        variables={'input': rows, 'batchSize': batch_size},
+        context_value=RequestFactory().post('/graphql'),
+    )
+    if result.errors:
+        raise SystemExit(result.errors)
+
+
+def measure(fn):
+    queries = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+    return elapsed, queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--baseline', action='store_true', help="Also time the per-row loop")
+    args = parser.parse_args()
+
+    with test_database():
+        print(f"{'impl':<10}{'rows':>8}{'seconds':>10}{'rows/s':>12}{'queries':>10}")
+        for offset, size in enumerate(args.sizes):
+            impls = [('batched', lambda rows: batched(rows, args.batch_size))]
+            if args.baseline:
+                impls.append(('per-row', per_row))
+            for name, fn in impls:
+                rows = payload(size, f"{name}{offset}")
+                elapsed, queries = measure(lambda: fn(rows))
+                print(f"{name:<10}{size:>8}{elapsed:>10.2f}{size / elapsed:>12.0f}{queries:>10}")
+
+
+if __name__ == '__main__':
+    main()
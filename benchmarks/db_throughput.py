@@ -0,0 +1,152 @@
+"""
+Throughput of concurrent GraphQL readers and writers on SQLite, before and
+after the connection tuning in crm.database.
+
+Each mode runs on a fresh file database holding the 10k synthetic dataset.
+``--readers`` threads run a nested orders query and ``--writers`` threads
+run ``createOrder`` for ``--duration`` seconds. Every operation ends like a
+request, with ``close_old_connections()``. The modes are:
+
+* ``baseline``: rollback journal, ``synchronous=FULL``, deferred
+  transactions and a new connection per request (``CONN_MAX_AGE=0``);
+* ``tuned``: the ``CRM_DATABASE`` pragmas (WAL and friends), immediate
+  transactions and persistent connections.
+
+The benchmark prints operations/s, p50/p99 latency and "database is
+locked" errors per role:
+
+    python benchmarks/db_throughput.py --readers 8 --writers 2 --duration 10
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.utils import setup_django
+
+setup_django()
+
+import django
+from django.core.management import call_command
+from django.db import OperationalError, close_old_connections, connection
+from django.test import RequestFactory, override_settings
+
+from alx_backend_graphql_crm.schema import schema
+from crm.database import DEFAULT_SQLITE_PRAGMAS
+from crm.models import Customer, Product
+from crm.response_cache import reset_response_cache
+from crm.synthetic import generate
+
+READ = """
+query { allOrders(first: 20) { edges { node { id totalAmount customer { name } items { quantity } } } } }
+"""
+WRITE = """
+mutation ($customer: ID!, $products: [ID]!) {
+  createOrder(input: {customerId: $customer, productIds: $products}) { order { id } errors }
+}
+"""
+MODES = {
+    'baseline': {
+        'pragmas': {'journal_mode': 'DELETE', 'synchronous': 'FULL'},
+        'conn_max_age': 0,
+        'transaction_mode': 'DEFERRED',
+    },
+    'tuned': {
+        'pragmas': DEFAULT_SQLITE_PRAGMAS,
+        'conn_max_age': 60,
+        'transaction_mode': 'IMMEDIATE',
+    },
+}
+
+
+def worker(role, deadline, customers, products, samples, errors):
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        if role == 'read':
+            document, variables = READ, {}
+        else:
+            document, variables = WRITE, {
+                'customer': rng.choice(customers), 'products': rng.sample(products, 2),
+            }
+        started = time.perf_counter()
+        try:
+            result = schema.execute(document, variables=variables, context_value=RequestFactory().post('/graphql'))
+            failed = bool(result.errors) or 'locked' in str((result.data or {}).get('createOrder', {}).get('errors'))
+        except OperationalError:
+            failed = True
+        finally:
+            close_old_connections()
+        if failed:
+            errors.append(role)
+        else:
+            samples[role].append(time.perf_counter() - started)
+
+
+def run_mode(name, options, args, tmpdir):
+    settings_dict = connection.settings_dict
+    settings_dict['NAME'] = os.path.join(tmpdir, f'{name}.sqlite3')
+    settings_dict['CONN_MAX_AGE'] = options['conn_max_age']
+    if django.VERSION >= (5, 1):
+        settings_dict['OPTIONS']['transaction_mode'] = options['transaction_mode']
+    with override_settings(CRM_DATABASE={'SQLITE_PRAGMAS': options['pragmas']}):
+        connection.close()
+        call_command('migrate', verbosity=0)
+        generate('10k', seed=args.seed)
+        Product.objects.update(stock=10 ** 6)
+        customers = list(Customer.objects.values_list('pk', flat=True))
+        products = list(Product.objects.values_list('pk', flat=True))
+        connection.close()
+
+        samples, errors = {'read': [], 'write': []}, []
+        deadline = time.perf_counter() + args.duration
+        threads = [
+            threading.Thread(target=worker, args=(role, deadline, customers, products, samples, errors))
+            for role, count in (('read', args.readers), ('write', args.writers))
+            for _ in range(count)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        connection.close()
+
+    for role in ('read', 'write'):
+        latencies = sorted(samples[role])
+        p50 = statistics.median(latencies) * 1000 if latencies else float('nan')
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000 if latencies else float('nan')
+        print(
+            f"{name:<10}{role:<7}{len(latencies) / elapsed:>10.0f}{p50:>10.1f}{p99:>10.1f}"
+            f"{errors.count(role):>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', choices=sorted(MODES), nargs='+')
+    args = parser.parse_args()
+
+    if connection.vendor != 'sqlite':
+        raise SystemExit("This benchmark compares SQLite settings")
+    # Measure the database, not response cache hits or DEBUG query logging
+    override_settings(DEBUG=False, CRM_RESPONSE_CACHE={'ENABLED': False}).enable()
+    reset_response_cache()
+
+    print(f"{'mode':<10}{'role':<7}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name in args.only or MODES:
+            run_mode(name, MODES[name], args, tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+"""
+Run a fixed catalog of GraphQL operations against a synthetic dataset.
+
+Each query and mutation of ``CATALOG`` is executed in-process through the
+schema ``--repeat`` times after a warm-up. The suite reports latency
+percentiles, SQL statements per execution and peak Python allocations
+(tracemalloc, measured in a separate run). Mutations are rolled back, so
+every iteration sees the same data. Results go to ``--output`` as JSON;
+``--compare`` prints the change against an earlier result file, e.g. from
+another commit:
+
+    python benchmarks/graphql_suite.py --size 10k --output before.json
+    git checkout my-branch
+    python benchmarks/graphql_suite.py --size 10k --output after.json --compare before.json
+
+The dataset comes from ``crm.synthetic`` with ``--seed``, in a throwaway
+database, or in the SQLite file ``--db`` which is generated once and
+reused by later runs.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.utils import ROOT, setup_django, test_database
+
+setup_django()
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+
+from alx_backend_graphql_crm.schema import schema
+from crm.models import Customer, Order, Product
+from crm.response_cache import reset_response_cache
+from crm.schema import Query
+from crm.synthetic import SIZES, generate
+
+CUSTOMER = """
+query ($id: ID!) {
+  customer(id: $id) { name email orders { edges { node { id totalAmount orderDate } } } }
+}
+"""
+SEARCH_CUSTOMERS = """
+query { allCustomers(first: 20, name: "mar") { edges { node { name email phone } } } }
+"""
+LOW_STOCK = """
+query { allProducts(first: 50, lowStock: true) { edges { node { name stock price } } } }
+"""
+RECENT_ORDERS = """
+query {
+  allOrders(first: 50) {
+    edges { node { id totalAmount customer { name email } items { quantity product { name price } } } }
+  }
+}
+"""
+DEEP_OFFSET = """
+query ($offset: Int) { allOrders(first: 20, offset: $offset) { edges { node { id orderDate } } } }
+"""
+DEEP_KEYSET = """
+query ($after: String) { allOrdersKeyset(first: 20, after: $after) { edges { node { id orderDate } } } }
+"""
+LARGE_ORDERS = """
+query ($since: Date) {
+  allOrdersKeyset(first: 20, totalAmountGte: 500, orderDateGte: $since) {
+    totalCount edges { node { id totalAmount customer { name } } }
+  }
+}
+"""
+SALES = """
+query ($from: Date!, $to: Date!, $customer: ID!) {
+  salesByDay(from: $from, to: $to) { date orders revenue }
+  topProducts(limit: 10) { product { name } units revenue }
+  customerLifetimeValue(id: $customer) { orders revenue lastOrder }
+}
+"""
+CREATE_CUSTOMER = """
+mutation { createCustomer(input: {name: "Bench", email: "bench@example.com", phone: "+15550000000"}) { errors } }
+"""
+BULK_CREATE_CUSTOMERS = """
+mutation ($input: [CustomerInput]!) { bulkCreateCustomers(input: $input) { customers { id } errors } }
+"""
+CREATE_ORDER = """
+mutation ($customer: ID!, $products: [ID]!) {
+  createOrder(input: {customerId: $customer, productIds: $products, quantities: [1, 1, 1]}) {
+    order { id totalAmount } errors
+  }
+}
+"""
+RESTOCK = """
+mutation { updateLowStockProducts(threshold: 5, increment: 10, limit: 20) { updated errors } }
+"""
+
+
+def catalog():
+    """``(name, document, variables)`` of every benchmarked operation, from the dataset"""
+    orders = Order.objects.count()
+    customers = list(Customer.objects.order_by('pk').values_list('pk', flat=True))
+    products = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    busiest = Order.objects.values('customer').order_by().annotate(n=Count('pk')).order_by('-n')
+    busiest = busiest[0]['customer']
+    middle = Order.objects.order_by('-order_date', '-id')[orders // 2]
+    cursor = Query._meta.fields['all_orders_keyset'].keyset.encode(middle)
+    # The dataset ends on a fixed date, not today
+    today = timezone.localdate(Order.objects.aggregate(last=Max('order_date'))['last'])
+    return [
+        ('customer_by_id', CUSTOMER, {'id': busiest}),
+        ('search_customers', SEARCH_CUSTOMERS, {}),
+        ('low_stock_products', LOW_STOCK, {}),
+        ('recent_orders_nested', RECENT_ORDERS, {}),
+        ('orders_deep_offset', DEEP_OFFSET, {'offset': orders // 2}),
+        ('orders_deep_keyset', DEEP_KEYSET, {'after': cursor}),
+        ('large_orders_filtered', LARGE_ORDERS, {'since': str(today - timedelta(days=30))}),
+        ('sales_analytics', SALES, {
+            'from': str(today - timedelta(days=30)), 'to': str(today), 'customer': busiest,
+        }),
+        ('create_customer', CREATE_CUSTOMER, {}),
+        ('bulk_create_customers', BULK_CREATE_CUSTOMERS, {'input': [
+            {'name': f"Bench {i}", 'email': f"bench{i}@example.com"} for i in range(100)
+        ]}),
+        ('create_order', CREATE_ORDER, {'customer': customers[len(customers) // 3], 'products': products[:3]}),
+        ('restock_low_stock', RESTOCK, {}),
+    ]
+
+
+def execute(document, variables):
+    # Mutations are rolled back so every iteration starts from the same data
+    with transaction.atomic():
+        result = schema.execute(document, variables=variables, context_value=RequestFactory().post('/graphql'))
+        transaction.set_rollback(True)
+    errors = result.errors or [
+        error for value in (result.data or {}).values() if isinstance(value, dict)
+        for error in value.get('errors') or []
+    ]
+    if errors:
+        raise SystemExit(f"{document.strip().splitlines()[0]}: {errors}")
+
+
+def measure(document, variables, repeat, warmup):
+    for _ in range(warmup):
+        execute(document, variables)
+
+    statements = []
+    counter = lambda run, sql, params, many, context: statements.append(sql) or run(sql, params, many, context)
+    samples, queries = [], []
+    for _ in range(repeat):
+        statements.clear()
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            execute(document, variables)
+            samples.append((time.perf_counter() - started) * 1000)
+        queries.append(len(statements))
+
+    tracemalloc.start()
+    execute(document, variables)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    samples.sort()
+    percentile = lambda q: samples[min(len(samples) - 1, round(q * (len(samples) - 1)))]
+    return {
+        'p50_ms': round(percentile(0.50), 3),
+        'p95_ms': round(percentile(0.95), 3),
+        'p99_ms': round(percentile(0.99), 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'sql': max(queries),
+        'peak_alloc_kb': round(peak / 1024, 1),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} (commit {baseline['meta'].get('commit')}, size {baseline['meta'].get('size')})")
+    print(f"{'operation':<24}{'p50 ms':>18}{'sql':>12}{'alloc kb':>22}")
+    for name, current in results.items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f"{name:<24}{'(new)':>18}")
+            continue
+        change = (current['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+        print(
+            f"{name:<24}{before['p50_ms']:>8.2f} {change:>+8.1f}%"
+            f"{before['sql']:>6} -> {current['sql']:<4}"
+            f"{before['peak_alloc_kb']:>10.0f} -> {current['peak_alloc_kb']:<8.0f}"
+        )
+
+
+def run_suite(args):
+    started = time.perf_counter()
+    if not Order.objects.exists():
+        print(f"Generating the {args.size} dataset (seed {args.seed})...")
+        generate(args.size, seed=args.seed)
+    print(f"Dataset ready in {time.perf_counter() - started:.1f}s")
+
+    results = {}
+    print(f"{'operation':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'sql':>6}{'alloc kb':>10}")
+    for name, document, variables in catalog():
+        if args.only and name not in args.only:
+            continue
+        result = results[name] = measure(document, variables, args.repeat, args.warmup)
+        print(
+            f"{name:<24}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+            f"{result['sql']:>6}{result['peak_alloc_kb']:>10.0f}"
+        )
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'size': args.size,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'rows': {model.__name__: model.objects.count() for model in (Customer, Product, Order)},
+            'database': f"{connection.vendor} {connection.Database.sqlite_version if connection.vendor == 'sqlite' else ''}".strip(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            'timestamp': timezone.now().isoformat(),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', choices=sorted(SIZES), default='10k')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--only', nargs='+', metavar='NAME', help="Run only these operations")
+    parser.add_argument('--db', help="SQLite file to generate once and reuse")
+    parser.add_argument('--output', help="Write the results as JSON here")
+    parser.add_argument('--compare', metavar='JSON', help="Print the change from an earlier result file")
+    args = parser.parse_args()
+
+    # Measure execution, not response cache hits or DEBUG query logging
+    override_settings(DEBUG=False, CRM_RESPONSE_CACHE={**settings.CRM_RESPONSE_CACHE, 'ENABLED': False}).enable()
+    reset_response_cache()
+    if args.db:
+        connection.settings_dict['NAME'] = os.path.abspath(args.db)
+        call_command('migrate', verbosity=0)
+        run_suite(args)
+    else:
+        with test_database(sqlite_wal=True):
+            run_suite(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Compare page 1 vs page N latency for offset (allOrders) and keyset
+(allOrdersKeyset) pagination.
+
+Runs against a throwaway test database, never the project db.sqlite3:
+
+    python benchmarks/keyset_pagination.py --pages 10000 --page-size 20
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.utils import median_ms, setup_django, test_database
+
+setup_django()
+
+from django.test import RequestFactory
+
+from alx_backend_graphql_crm.schema import schema
+from crm.models import Customer, Order
+from crm.schema import Query
+
+OFFSET_QUERY = """
+query ($first: Int, $offset: Int) {
+  allOrders(first: $first, offset: $offset) { edges { node { id orderDate } } }
+}
+"""
+
+KEYSET_QUERY = """
+query ($first: Int, $after: String) {
+  allOrdersKeyset(first: $first, after: $after) { edges { node { id orderDate } } }
+}
+"""
+
+
+def seed(order_count, batch_size=5000):
+    customers = Customer.objects.bulk_create(
+        Customer(name=f"Customer {i}", email=f"bench{i}@example.com") for i in range(1000)
+    )
+    for start in range(0, order_count, batch_size):
+        Order.objects.bulk_create(
+            Order(customer=customers[i % len(customers)])
+            for i in range(start, min(start + batch_size, order_count))
+        )
+
+
+def timed(query, variables, repeat):
+    def run():
+        result = schema.execute(query, variables=variables, context_value=RequestFactory().post('/graphql'))
+        if result.errors:
+            raise SystemExit(result.errors)
+    return median_ms(run, repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=10000, help="Deep page number to measure")
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with test_database():
+        total = args.pages * args.page_size
+        print(f"Seeding {total} orders...")
+        seed(total)
+
+        skip = (args.pages - 1) * args.page_size
+        last_seen = Order.objects.order_by('-order_date', '-id')[skip - 1]
+        cursor = Query._meta.fields['all_orders_keyset'].keyset.encode(last_seen)
+
+        rows = [
+            ('offset', 1, timed(OFFSET_QUERY, {'first': args.page_size, 'offset': 0}, args.repeat)),
+            ('offset', args.pages, timed(OFFSET_QUERY, {'first': args.page_size, 'offset': skip}, args.repeat)),
+            ('keyset', 1, timed(KEYSET_QUERY, {'first': args.page_size}, args.repeat)),
+            ('keyset', args.pages, timed(KEYSET_QUERY, {'first': args.page_size, 'after': cursor}, args.repeat)),
+        ]
+        print(f"{'mode':<8}{'page':>8}{'median ms':>12}")
+        for mode, page, ms in rows:
+            print(f"{mode:<8}{page:>8}{ms:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Compare /graphql request latency with and without the document cache.
+
+Runs against a throwaway test database, never the project db.sqlite3:
+
+    python benchmarks/persisted_queries.py --repeat 2000
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.utils import median_ms, setup_django, test_database
+
+setup_django()
+
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment
+
+from crm.persisted import get_persisted_queries, query_hash, reset_persisted_queries
+
+# The shape of the documents the cron jobs and dashboards send
+QUERY = """
+query ($first: Int, $name: String) {
+  allOrders(first: $first, customerName: $name) {
+    edges {
+      node {
+        id
+        totalAmount
+        orderDate
+        customer { name email phone }
+        products { edges { node { name price stock } } }
+      }
+    }
+  }
+}
+"""
+
+
+def run(client, body, repeat):
+    def request():
+        response = client.post('/graphql', body, content_type='application/json')
+        assert response.status_code == 200, response.content
+    request()
+    return median_ms(request, repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    variables = {'first': 1, 'name': 'nobody'}
+    persisted = {'persistedQuery': {'version': 1, 'sha256Hash': query_hash(QUERY)}}
+    setup_test_environment()  # allows the test client's host
+    with test_database():
+        client = Client()
+        rows = []
+        with override_settings(CRM_PERSISTED_QUERIES={'CACHE_SIZE': 0}):
+            reset_persisted_queries()
+            rows.append(('no cache', run(client, {'query': QUERY, 'variables': variables}, args.repeat)))
+        reset_persisted_queries()
+        rows.append(('cached text', run(client, {'query': QUERY, 'variables': variables}, args.repeat)))
+        rows.append(('hash only', run(client, {'variables': variables, 'extensions': persisted}, args.repeat)))
+        print(f"{'mode':<14}{'median ms':>12}")
+        for mode, ms in rows:
+            print(f"{mode:<14}{ms:>12.3f}")
+        print(get_persisted_queries().cache.stats())
+
+
+if __name__ == '__main__':
+    main()
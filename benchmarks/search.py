@@ -0,0 +1,119 @@
+"""
+Time the list filters before and after the search indexes of migration 0004.
+
+"before" runs the plain lookups (``icontains`` / ``startswith``) with the
+B-tree indexes dropped, "after" runs the filters as the API does. Runs
+against a throwaway test database, never the project db.sqlite3:
+
+    python benchmarks/search.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.utils import median_ms, setup_django, test_database
+
+setup_django()
+
+from django.db import connection
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from crm.filters import CustomerFilter, OrderFilter, ProductFilter
+from crm.models import Customer, Order, Product
+from crm.search import rebuild_index
+
+FIRST = ['Alice', 'Bob', 'Carol', 'David', 'Eve', 'Frank', 'Grace', 'Heidi', 'Ivan', 'Judy']
+LAST = ['Johnson', 'Smith', 'Brown', 'Garcia', 'Miller', 'Davis', 'Lopez', 'Wilson', 'Moore', 'Clark']
+
+B_TREE_INDEXES = {
+    'crm_customer_created_idx': 'crm_customer (created_at)',
+    'crm_customer_phone_idx': 'crm_customer (phone)',
+    'crm_product_stock_idx': 'crm_product (stock)',
+    'crm_order_date_id_idx': 'crm_order (order_date, id)',
+}
+
+
+def seed(rows, batch_size=20000):
+    now = timezone.now()
+    for start in range(0, rows, batch_size):
+        batch = range(start, min(start + batch_size, rows))
+        Customer.objects.bulk_create(
+            Customer(
+                name=f"{FIRST[i % 10]} {LAST[i // 10 % 10]} {i}",
+                email=f"user{i}@example{i % 97}.com",
+                phone=f"+1{i:010d}",
+            )
+            for i in batch
+        )
+        Product.objects.bulk_create(
+            Product(name=f"Product {i} {LAST[i % 10]}", price=1, stock=i % 500) for i in batch
+        )
+    customer_ids = list(Customer.objects.values_list('pk', flat=True)[:1000])
+    for start in range(0, rows, batch_size):
+        Order.objects.bulk_create(
+            Order(customer_id=customer_ids[i % len(customer_ids)])
+            for i in range(start, min(start + batch_size, rows))
+        )
+    # Spread the auto_now_add timestamps over a year
+    spread = Case(
+        *[When(pk__gt=rows * k // 12, then=Value(now - timedelta(days=30 * k))) for k in range(11, 0, -1)],
+        default=Value(now),
+    )
+    Customer.objects.update(created_at=spread)
+    Order.objects.update(created_at=spread, order_date=spread)
+    rebuild_index()
+
+
+def cases(since):
+    page = slice(0, 20)
+    return [
+        ('customer name contains', lambda: list(Customer.objects.filter(name__icontains='johnson 4242')[page]),
+         lambda: list(CustomerFilter({'name': 'johnson 4242'}).qs[page])),
+        ('customer email contains', lambda: list(Customer.objects.filter(email__icontains='r123456@')[page]),
+         lambda: list(CustomerFilter({'email': 'r123456@'}).qs[page])),
+        ('product name contains', lambda: list(Product.objects.filter(name__icontains='ct 77777 ')[page]),
+         lambda: list(ProductFilter({'name': 'ct 77777 '}).qs[page])),
+        ('phone prefix', lambda: list(Customer.objects.filter(phone__startswith='+1000012')[page]),
+         lambda: list(CustomerFilter({'phone_pattern': '+1000012'}).qs[page])),
+        ('customer created since', lambda: Customer.objects.filter(created_at__gte=since).count(),
+         lambda: CustomerFilter({'created_at_gte': since.date()}).qs.count()),
+        ('low stock', lambda: Product.objects.filter(stock__lt=10).count(),
+         lambda: ProductFilter({'low_stock': True}).qs.count()),
+        ('orders newest page', lambda: list(Order.objects.order_by('-order_date', '-id')[page]),
+         lambda: list(OrderFilter({}).qs.order_by('-order_date', '-id')[page])),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000, help="Customers, products and orders each")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with test_database():
+        print(f"Seeding {args.rows} customers, products and orders...")
+        seed(args.rows)
+        since = timezone.now() - timedelta(days=45)
+
+        with connection.cursor() as cursor:
+            for name in B_TREE_INDEXES:
+                cursor.execute(f'DROP INDEX {name}')
+            cursor.execute('ANALYZE')
+        before = [median_ms(plain, args.repeat) for _, plain, _ in cases(since)]
+
+        with connection.cursor() as cursor:
+            for name, target in B_TREE_INDEXES.items():
+                cursor.execute(f'CREATE INDEX {name} ON {target}')
+            cursor.execute('ANALYZE')
+        after = [median_ms(indexed, args.repeat) for _, _, indexed in cases(since)]
+
+        print(f"{'filter':<26}{'before ms':>12}{'after ms':>12}")
+        for (label, _, _), b, a in zip(cases(since), before, after):
+            print(f"{label:<26}{b:>12.2f}{a:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
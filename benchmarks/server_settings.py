@@ -0,0 +1,19 @@
+"""Settings for the servers benchmarks/asgi_load.py starts against its own database."""
+import os
+
+from alx_backend_graphql_crm.settings import *  # noqa: F401,F403
+from alx_backend_graphql_crm.settings import CRM_RESPONSE_CACHE, DATABASES
+
+DEBUG = False
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+
+DATABASES = {
+    'default': {
+        **DATABASES['default'],
+        'NAME': os.environ['CRM_BENCH_DB'],
+        'OPTIONS': {'timeout': 30},
+    },
+}
+
+# Measure execution, not response cache hits
+CRM_RESPONSE_CACHE = {**CRM_RESPONSE_CACHE, 'ENABLED': False}
@@ -0,0 +1,133 @@
+"""
+Compare worker startup under the full and the API-only settings profiles.
+
+For each profile a fresh Python process imports the WSGI application and
+serves it with wsgiref on a migrated throwaway SQLite database. The
+benchmark times the span from spawning the process to its first successful
+GraphQL response (time to first response). It also reads the worker's
+resident memory (VmRSS) after that response and again after
+``--requests`` more. Linux only, as memory comes from ``/proc``:
+
+    python benchmarks/startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.utils import ROOT, free_port, setup_django
+
+PROFILES = {
+    'full': 'alx_backend_graphql_crm.settings',
+    'api': 'alx_backend_graphql_crm.settings_api',
+}
+QUERY = "{ allProducts(first: 10) { edges { node { name stock } } } }"
+
+
+def serve(port, database):
+    """Run in the child: load the WSGI application and serve it"""
+    from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = database
+    from alx_backend_graphql_crm.wsgi import application
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    make_server('127.0.0.1', port, application, handler_class=QuietHandler).serve_forever()
+
+
+def prepare_database(path):
+    setup_django()
+    from django.core.management import call_command
+    from django.db import connection
+
+    from crm.models import Product
+
+    connection.settings_dict['NAME'] = path
+    call_command('migrate', verbosity=0)
+    Product.objects.bulk_create(Product(name=f"Product {i}", price=10, stock=i) for i in range(10))
+    connection.close()
+
+
+def request(port):
+    body = json.dumps({'query': QUERY}).encode()
+    req = urllib.request.Request(
+        f'http://127.0.0.1:{port}/graphql', data=body, headers={'Content-Type': 'application/json'},
+    )
+    with urllib.request.urlopen(req, timeout=10) as response:
+        response.read()
+        return response.status
+
+
+def rss_mb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+
+def measure(profile, database, requests, timeout=30):
+    port = free_port()
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': PROFILES[profile], 'PYTHONPATH': ROOT}
+    started = time.perf_counter()
+    worker = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', str(port), database], cwd=ROOT, env=env,
+    )
+    try:
+        while True:
+            try:
+                if request(port) == 200:
+                    break
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            if worker.poll() is not None or time.perf_counter() - started > timeout:
+                raise SystemExit(f"The {profile} worker did not answer")
+            time.sleep(0.005)
+        first_response = time.perf_counter() - started
+        rss_first = rss_mb(worker.pid)
+        for _ in range(requests):
+            request(port)
+        return first_response * 1000, rss_first, rss_mb(worker.pid)
+    finally:
+        worker.terminate()
+        worker.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=200, help="Requests before the second RSS reading")
+    parser.add_argument('--serve', nargs=2, metavar=('PORT', 'DATABASE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        import django
+
+        django.setup()
+        serve(int(args.serve[0]), args.serve[1])
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database = os.path.join(tmpdir, 'startup.sqlite3')
+        prepare_database(database)
+        print(f"{'profile':<8}{'first response ms':>20}{'RSS MB':>10}{f'RSS after {args.requests}':>16}")
+        for profile in PROFILES:
+            runs = [measure(profile, database, args.requests) for _ in range(args.runs)]
+            first, rss, rss_after = (statistics.median(values) for values in zip(*runs))
+            print(f"{profile:<8}{first:>20.0f}{rss:>10.1f}{rss_after:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
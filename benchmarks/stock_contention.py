@@ -0,0 +1,128 @@
+"""
+Multi-threaded createOrder stress test: proves stock is never oversold and
+measures orders/s under contention.
+
+Uses a file-backed SQLite database in WAL mode by default. To run against a
+locally running server database, point DJANGO_SETTINGS_MODULE at settings
+whose DATABASES['default'] uses it; a throwaway test database is created.
+
+    python benchmarks/stock_contention.py --threads 8 --orders 200 --products 5 --stock 300
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.utils import setup_django, test_database
+
+setup_django()
+
+from django.db import connection
+from django.db.models import Sum
+from django.test import RequestFactory
+
+from alx_backend_graphql_crm.schema import schema
+from crm.models import Customer, OrderItem, Product
+
+MUTATION = """
+mutation ($customer: ID!, $products: [ID]!, $quantities: [Int]) {
+  createOrder(input: {customerId: $customer, productIds: $products, quantities: $quantities}) {
+    order { id }
+    errors
+  }
+}
+"""
+
+
+def worker(customer_id, product_ids, orders, seed, outcomes, lock):
+    rng = random.Random(seed)
+    local = Counter()
+    try:
+        for _ in range(orders):
+            chosen = rng.sample(product_ids, rng.randint(1, min(3, len(product_ids))))
+            result = schema.execute(
+                MUTATION,
+                variables={
+                    'customer': customer_id,
+                    'products': chosen,
+                    'quantities': [rng.randint(1, 3) for _ in chosen],
+                },
+                context_value=RequestFactory().post('/graphql'),
+            )
+            data = result.data and result.data['createOrder']
+            if result.errors:
+                local['graphql error'] += 1
+            elif data['errors']:
+                local[data['errors'][0].split(' for:')[0]] += 1
+            else:
+                local['created'] += 1
+    finally:
+        connection.close()
+        with lock:
+            outcomes.update(local)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--orders', type=int, default=200, help="Orders attempted per thread")
+    parser.add_argument('--products', type=int, default=5)
+    parser.add_argument('--stock', type=int, default=300, help="Initial stock of every product")
+    args = parser.parse_args()
+
+    with test_database(sqlite_wal=True) as conn:
+        customers = Customer.objects.bulk_create(
+            Customer(name=f"Buyer {i}", email=f"buyer{i}@example.com") for i in range(args.threads)
+        )
+        products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", price=10, stock=args.stock) for i in range(args.products)
+        )
+        product_ids = [p.pk for p in products]
+        # Seeded rows must be visible to the worker connections
+        conn.close()
+
+        outcomes, lock = Counter(), threading.Lock()
+        threads = [
+            threading.Thread(
+                target=worker,
+                args=(customer.pk, product_ids, args.orders, i, outcomes, lock),
+            )
+            for i, customer in enumerate(customers)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        sold = dict(
+            OrderItem.objects.values('product').annotate(n=Sum('quantity')).values_list('product', 'n')
+        )
+        oversold = []
+        for product in Product.objects.filter(pk__in=product_ids):
+            taken = args.stock - product.stock
+            if product.stock < 0 or taken != sold.get(product.pk, 0):
+                oversold.append((product.name, product.stock, sold.get(product.pk, 0)))
+
+        attempted = args.threads * args.orders
+        print(f"backend:   {conn.vendor}")
+        print(f"attempted: {attempted} orders on {args.threads} threads in {elapsed:.2f}s")
+        for outcome, count in sorted(outcomes.items()):
+            print(f"  {outcome}: {count}")
+        print(f"throughput: {outcomes['created'] / elapsed:.0f} orders/s "
+              f"({attempted / elapsed:.0f} attempts/s)")
+        remaining = dict(Product.objects.filter(pk__in=product_ids).values_list('name', 'stock'))
+        print(f"remaining stock: {remaining}")
+        if oversold:
+            print(f"OVERSOLD: {oversold}")
+            sys.exit(1)
+        print("no oversell: every unit sold is accounted for by an order item")
+
+
+if __name__ == '__main__':
+    main()
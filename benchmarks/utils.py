@@ -0,0 +1,66 @@
+"""Shared setup for the benchmark scripts."""
+import contextlib
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django():
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql_crm.settings')
+    import django
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_database(sqlite_wal=False):
+    """Run the block against a freshly migrated throwaway database
+
+    With ``sqlite_wal`` a SQLite database is created as a temporary file in
+    WAL mode instead of in memory, so that several threads can share it.
+    """
+    import django
+    from django.db import connection
+
+    settings_dict = connection.settings_dict
+    old_name = settings_dict['NAME']
+    tmpdir = None
+    if sqlite_wal and connection.vendor == 'sqlite':
+        tmpdir = tempfile.TemporaryDirectory()
+        settings_dict['TEST']['NAME'] = os.path.join(tmpdir.name, 'bench.sqlite3')
+        settings_dict['OPTIONS'].setdefault('timeout', 30)
+        if django.VERSION >= (5, 1):
+            # Take the write lock up front instead of failing on upgrade
+            settings_dict['OPTIONS'].setdefault('transaction_mode', 'IMMEDIATE')
+
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        if tmpdir is not None:
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode=WAL')
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import Customer, Product, Order
+from django.db.models.functions import TruncDate
+
+from .models import Customer, Product, Order, OrderItem
+from .analytics import refresh_orders
+from .totals import recompute_totals
 
 
 @admin.register(Customer)
@@ -19,16 +23,36 @@ class ProductAdmin(admin.ModelAdmin):
     list_editable = ('price', 'stock')
 
 
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 1
+    autocomplete_fields = ('product',)
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'customer', 'total_amount', 'order_date')
     list_filter = ('order_date',)
     search_fields = ('customer__name', 'customer__email')
     ordering = ('-order_date',)
-    filter_horizontal = ('products',)
+    inlines = (OrderItemInline,)
+    # Maintained by crm.totals when the products change
     readonly_fields = ('total_amount',)
-    
+
     def save_model(self, request, obj, form, change):
+        # The rollup keys the order is counted under until this save moves it
+        obj._rollup_previous = (
+            Order.objects.filter(pk=obj.pk).annotate(day=TruncDate('order_date'))
+            .values_list('day', 'customer_id').first()
+            if change else None
+        )
         super().save_model(request, obj, form, change)
-        # Recalculate total after saving
-        obj.save()
\ No newline at end of file
+
+    def save_related(self, request, form, formsets, change):
+        order = form.instance
+        previous = list(OrderItem.objects.filter(order=order).values_list('product_id', flat=True))
+        super().save_related(request, form, formsets, change)
+        # Inline item edits bypass m2m_changed, recompute in one UPDATE
+        recompute_totals(Order.objects.filter(pk=order.pk))
+        day, customer_id = getattr(order, '_rollup_previous', None) or (None, None)
+        refresh_orders([order.pk], previous, [day] if day else [], [customer_id] if customer_id else [])
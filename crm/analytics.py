@@ -0,0 +1,313 @@
+"""
+Sales rollups: revenue per day, sales per product and customer lifetime value.
+
+``DailySales``, ``ProductSales`` and ``CustomerSales`` hold one row per
+day, product and customer, so ``salesByDay``, ``topProducts`` and
+``customerLifetimeValue`` read only the rows they return instead of
+aggregating every order. They are kept up to date like
+``Order.total_amount``:
+
+* new orders are added with ``add_orders()`` by the paths that create
+  them (``createOrder``, the order importer): one aggregate query per
+  rollup over the new orders only, then one ``INSERT ... ON CONFLICT DO
+  UPDATE`` adding them to the affected rows. ``bulkCreateOrders`` already
+  holds the orders, quantities and prices, so ``add_created_orders()``
+  aggregates them in Python and only runs the upserts;
+* item changes on existing orders (``m2m_changed``, the admin) recompute
+  the affected days, products and customers exactly with ``refresh()``,
+  and deletions do so once their transaction commits;
+* ``rebuild_rollups()`` recomputes every table with one aggregate query
+  each (``manage.py rebuild_sales_rollups``).
+
+Days are calendar dates in ``TIME_ZONE``.
+"""
+import threading
+from decimal import Decimal
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import Greatest, Least, TruncDate
+from django.utils import timezone
+
+from .models import CustomerSales, DailySales, Order, OrderItem, ProductSales
+from .response_cache import invalidate
+
+ROLLUP_MODELS = (DailySales, ProductSales, CustomerSales)
+
+
+def _aggregates(orders, items):
+    """Rollup rows of ``orders`` (an Order queryset) and ``items`` (their OrderItems)
+
+    Returns ``(days, products, customers)``: dicts keyed by date, product
+    id and customer id of the values of each rollup row.
+    """
+    days = {
+        row['day']: {'orders': row['orders'], 'units': 0, 'revenue': row['revenue']}
+        for row in orders.annotate(day=TruncDate('order_date')).order_by().values('day')
+        .annotate(orders=Count('pk'), revenue=Sum('total_amount'))
+    }
+    for row in (
+        items.annotate(day=TruncDate('order__order_date')).order_by().values('day')
+        .annotate(units=Sum('quantity'))
+    ):
+        days.setdefault(row['day'], {'orders': 0, 'units': 0, 'revenue': 0})['units'] = row['units']
+
+    products = {
+        row.pop('product'): row
+        for row in items.order_by().values('product').annotate(
+            orders=Count('pk'), units=Sum('quantity'), revenue=Sum(F('quantity') * F('product__price')),
+        )
+    }
+    customers = {
+        row.pop('customer'): row
+        for row in orders.order_by().values('customer').annotate(
+            orders=Count('pk'), revenue=Sum('total_amount'),
+            first_order=Min('order_date'), last_order=Max('order_date'),
+        )
+    }
+    return days, products, customers
+
+
+def _increment(queryset, create, **deltas):
+    """Add ``deltas`` to the row of ``queryset``, creating it if missing"""
+    increments = {name: F(name) + value for name, value in deltas.items()}
+    if 'first_order' in deltas:
+        increments['first_order'] = Least(F('first_order'), deltas['first_order'])
+        increments['last_order'] = Greatest(F('last_order'), deltas['last_order'])
+    if queryset.update(**increments):
+        return
+    try:
+        with transaction.atomic(using=queryset.db):
+            create(**deltas)
+    except IntegrityError:
+        # Created concurrently since the UPDATE
+        queryset.update(**increments)
+
+
+def _add(model, key, rows, using):
+    """Add ``rows`` (key -> deltas) to ``model`` with one upsert per chunk of rows
+
+    Backends without ``INSERT ... ON CONFLICT`` increment row by row.
+    """
+    if not rows:
+        return
+    connection = connections[using]
+    if not connection.features.supports_update_conflicts_with_target:
+        for value, deltas in rows.items():
+            _increment(
+                model.objects.filter(**{key: value}),
+                lambda **v: model.objects.create(**{key: value}, **v), **deltas,
+            )
+        return
+
+    opts = model._meta
+    qn = connection.ops.quote_name
+    table = qn(opts.db_table)
+    names = list(next(iter(rows.values())))
+    fields = [opts.get_field(key)] + [opts.get_field(name) for name in names]
+    least, greatest = ('MIN', 'MAX') if connection.vendor == 'sqlite' else ('LEAST', 'GREATEST')
+    updates = []
+    for field in fields[1:]:
+        column = qn(field.column)
+        function = {'first_order': least, 'last_order': greatest}.get(field.name)
+        if function:
+            updates.append(f'{column} = {function}({table}.{column}, EXCLUDED.{column})')
+        else:
+            updates.append(f'{column} = {table}.{column} + EXCLUDED.{column}')
+    placeholders = f"({', '.join(['%s'] * len(fields))})"
+
+    items = list(rows.items())
+    step = (connection.features.max_query_params or len(items) * len(fields)) // len(fields)
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), step):
+            chunk = items[start:start + step]
+            params = [
+                field.get_db_prep_save(value, connection)
+                for key_value, deltas in chunk
+                for field, value in zip(fields, [key_value] + [deltas[name] for name in names])
+            ]
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(qn(field.column) for field in fields)}) "
+                f"VALUES {', '.join([placeholders] * len(chunk))} "
+                f"ON CONFLICT ({qn(fields[0].column)}) DO UPDATE SET {', '.join(updates)}",
+                params,
+            )
+
+
+def add_orders(order_ids):
+    """Add the new orders ``order_ids``, with their items, to the rollups"""
+    order_ids = list(order_ids)
+    if not order_ids:
+        return
+    _add_rows(*_aggregates(
+        Order.objects.filter(pk__in=order_ids), OrderItem.objects.filter(order_id__in=order_ids)
+    ))
+
+
+def add_created_orders(orders, items):
+    """Add new orders already in memory to the rollups, without reading them back
+
+    ``orders`` are saved ``Order`` instances with their final
+    ``order_date`` and ``total_amount``; ``items`` are
+    ``(order, product_id, quantity, price)`` tuples.
+    """
+    days, products, customers = {}, {}, {}
+    zero = Decimal('0.00')
+    for order in orders:
+        day = days.setdefault(
+            timezone.localdate(order.order_date), {'orders': 0, 'units': 0, 'revenue': zero}
+        )
+        day['orders'] += 1
+        day['revenue'] += order.total_amount
+        customer = customers.setdefault(order.customer_id, {
+            'orders': 0, 'revenue': zero, 'first_order': order.order_date, 'last_order': order.order_date,
+        })
+        customer['orders'] += 1
+        customer['revenue'] += order.total_amount
+        customer['first_order'] = min(customer['first_order'], order.order_date)
+        customer['last_order'] = max(customer['last_order'], order.order_date)
+    for order, product_id, quantity, price in items:
+        days[timezone.localdate(order.order_date)]['units'] += quantity
+        product = products.setdefault(product_id, {'orders': 0, 'units': 0, 'revenue': zero})
+        product['orders'] += 1
+        product['units'] += quantity
+        product['revenue'] += quantity * price
+    _add_rows(days, products, customers)
+
+
+def _add_rows(days, products, customers):
+    using = router.db_for_write(DailySales)
+    # No savepoint of its own: callers already write inside a transaction
+    with transaction.atomic(using=using, savepoint=False):
+        _add(DailySales, 'date', days, using)
+        _add(ProductSales, 'product', products, using)
+        _add(CustomerSales, 'customer', customers, using)
+    invalidate(*ROLLUP_MODELS)
+
+
+def refresh(days=(), product_ids=(), customer_ids=()):
+    """Recompute the rollup rows of ``days``, ``product_ids`` and ``customer_ids``"""
+    days, product_ids, customer_ids = set(days), set(product_ids), set(customer_ids)
+    orders = Order.objects.annotate(day=TruncDate('order_date'))
+    items = OrderItem.objects.annotate(day=TruncDate('order__order_date'))
+    day_rows, _, _ = _aggregates(orders.filter(day__in=days), items.filter(day__in=days))
+    _, product_rows, _ = _aggregates(Order.objects.none(), OrderItem.objects.filter(product_id__in=product_ids))
+    _, _, customer_rows = _aggregates(Order.objects.filter(customer_id__in=customer_ids), OrderItem.objects.none())
+
+    with transaction.atomic(using=router.db_for_write(DailySales)):
+        _replace(DailySales, 'date', days, day_rows)
+        _replace(ProductSales, 'pk', product_ids, product_rows)
+        _replace(CustomerSales, 'pk', customer_ids, customer_rows)
+    invalidate(*ROLLUP_MODELS)
+
+
+def _replace(model, key, keys, rows):
+    """Upsert ``rows`` (key -> values) and delete the rows of ``keys`` without any"""
+    if not keys:
+        return
+    model.objects.filter(**{f'{key}__in': keys - rows.keys()}).delete()
+    if rows:
+        fields = list(next(iter(rows.values())))
+        model.objects.bulk_create(
+            [model(**{key: value}, **values) for value, values in rows.items()],
+            update_conflicts=True,
+            unique_fields=[model._meta.pk.name if key == 'pk' else key],
+            update_fields=fields,
+        )
+
+
+def refresh_orders(order_ids, product_ids=(), days=(), customer_ids=()):
+    """Recompute the rollups touched by changes to ``order_ids`` and ``product_ids``
+
+    ``days`` and ``customer_ids`` add the keys the orders had before the
+    change, which their current rows no longer show.
+    """
+    rows = Order.objects.filter(pk__in=list(order_ids)).annotate(day=TruncDate('order_date'))
+    days, customer_ids = set(days), set(customer_ids)
+    for day, customer_id in rows.values_list('day', 'customer_id'):
+        days.add(day)
+        customer_ids.add(customer_id)
+    product_ids = set(product_ids) | set(
+        OrderItem.objects.filter(order_id__in=list(order_ids)).values_list('product_id', flat=True)
+    )
+    refresh(days, product_ids, customer_ids)
+
+
+def rebuild_rollups(using='default'):
+    """Recompute every rollup table from scratch; returns the row count of each"""
+    orders, items = Order.objects.using(using), OrderItem.objects.using(using)
+    days, products, customers = _aggregates(orders.all(), items.all())
+    counts = {}
+    with transaction.atomic(using=using):
+        for model, key, rows in (
+            (DailySales, 'date', days),
+            (ProductSales, 'pk', products),
+            (CustomerSales, 'pk', customers),
+        ):
+            model.objects.using(using).all().delete()
+            model.objects.using(using).bulk_create(
+                (model(**{key: value}, **values) for value, values in rows.items()), batch_size=1000,
+            )
+            counts[model.__name__] = len(rows)
+    invalidate(*ROLLUP_MODELS)
+    return counts
+
+
+def items_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """``m2m_changed`` receiver for ``Order.products``, after ``crm.totals``"""
+    if action == 'pre_clear':
+        # The affected rows are gone by post_clear, remember them now
+        if reverse:
+            instance._rollup_order_ids = list(instance.orders.values_list('pk', flat=True))
+        else:
+            instance._rollup_product_ids = list(instance.products.values_list('pk', flat=True))
+        return
+    if action in ('post_add', 'post_remove') and pk_set:
+        if reverse:
+            refresh_orders(pk_set, [instance.pk])
+        else:
+            refresh_orders([instance.pk], pk_set)
+    elif action == 'post_clear':
+        if reverse:
+            refresh_orders(getattr(instance, '_rollup_order_ids', []), [instance.pk])
+        else:
+            refresh_orders([instance.pk], getattr(instance, '_rollup_product_ids', []))
+
+
+_pending = threading.local()
+
+
+def refresh_on_commit(days=(), product_ids=(), customer_ids=()):
+    """``refresh()`` once the transaction commits, merged with the other pending keys
+
+    A cascade deleting many orders sends a signal per order and item;
+    this refreshes each affected key once instead of once per row. Keys
+    left over by a rolled back transaction are refreshed by the next
+    flush, which is harmless.
+    """
+    using = router.db_for_write(Order)
+    pending = getattr(_pending, using, None)
+    if pending is None:
+        pending = (set(), set(), set())
+        setattr(_pending, using, pending)
+    for keys, new in zip(pending, (days, product_ids, customer_ids)):
+        keys.update(new)
+    # Callbacks of a rolled back transaction are dropped, so always register one
+    transaction.on_commit(lambda: _flush(using), using=using)
+
+
+def _flush(using):
+    pending = getattr(_pending, using, None)
+    if pending is not None and any(pending):
+        setattr(_pending, using, None)
+        refresh(*pending)
+
+
+def order_deleted(sender, instance, **kwargs):
+    """``post_delete`` receiver for ``Order``; its items' products follow from theirs"""
+    refresh_on_commit([timezone.localdate(instance.order_date)], customer_ids=[instance.customer_id])
+
+
+def item_deleted(sender, instance, **kwargs):
+    """``post_delete`` receiver for ``OrderItem``"""
+    refresh_on_commit(product_ids=[instance.product_id])
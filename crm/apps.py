@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class CrmConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crm'
-    verbose_name = 'Customer Relationship Management'
\ No newline at end of file
+    verbose_name = 'Customer Relationship Management'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,68 @@
+"""
+Resolver helpers shared by the sync and async GraphQL views.
+
+The same schema serves ``CRMGraphQLView`` and ``AsyncCRMGraphQLView``.
+When a resolver runs on an event loop (the async view) it returns a
+coroutine that reads through the async ORM (``aget``, ``acount``,
+``async for``), and graphql-core awaits sibling root fields together;
+otherwise it returns the value as before. Querysets are still built
+synchronously since that never touches the database.
+
+Database connections are per thread, and async ORM queries run on a
+worker thread, not on the loop: connection state such as execute wrappers
+has to be set up there, with ``on_orm_thread()``.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+from asgiref.sync import sync_to_async
+
+
+def in_event_loop():
+    """Whether the caller runs on an event loop, where the sync ORM is not allowed"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+async def aget_or_none(queryset, **lookup):
+    try:
+        return await queryset.aget(**lookup)
+    except queryset.model.DoesNotExist:
+        return None
+
+
+def get_or_none(queryset, **lookup):
+    """``queryset.get()`` returning None for a missing row, awaitable on an event loop"""
+    if in_event_loop():
+        return aget_or_none(queryset, **lookup)
+    try:
+        return queryset.get(**lookup)
+    except queryset.model.DoesNotExist:
+        return None
+
+
+async def alist(queryset):
+    return [row async for row in queryset]
+
+
+def get_list(queryset):
+    """``list(queryset)``, awaitable on an event loop"""
+    if in_event_loop():
+        return alist(queryset)
+    return list(queryset)
+
+
+@asynccontextmanager
+async def on_orm_thread(manager):
+    """Enter and exit the sync context ``manager`` on the async ORM's thread"""
+    value = await sync_to_async(manager.__enter__)()
+    try:
+        yield value
+    except BaseException as e:
+        if not await sync_to_async(manager.__exit__)(type(e), e, e.__traceback__):
+            raise
+    else:
+        await sync_to_async(manager.__exit__)(None, None, None)
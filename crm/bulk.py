@@ -0,0 +1,259 @@
+"""
+Set-based bulk creation of customers and orders.
+
+Rows are validated in Python, email collisions against the database are
+resolved with ``email__in`` probes (one per ``max_query_params`` emails)
+and valid rows are written with ``bulk_create`` in chunks, instead of an
+``exists()`` plus an ``INSERT`` per row.
+
+Orders are checked against one ``IN`` query for their customers and one
+locking ``IN`` query for their products, stock for the whole batch is
+reserved with one conditional ``UPDATE``, and orders and items are
+inserted with a ``bulk_create`` each, split only where the database's
+bound parameter limit requires it. Totals and the sales rollups are
+computed in Python from the locked prices, so the created orders are
+never read back. The number of queries does not depend on the number
+of orders.
+"""
+import sqlite3
+from collections import Counter
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, DateTimeField, Value, When
+
+from .analytics import add_created_orders
+from .models import Customer, Order, OrderItem
+from .pubsub import ORDER_CREATED, publish
+from .response_cache import invalidate
+from .search import index_instances
+from .stock import lock_products, reserve_stock
+from .validators import is_valid_email, validate_phone_format
+
+PARTIAL = 'partial'
+ALL_OR_NOTHING = 'all_or_nothing'
+
+DEFAULT_BATCH_SIZE = 500
+
+
+@contextmanager
+def full_parameter_limit():
+    """Let ``bulk_create`` use the bound parameter limit of the loaded SQLite
+
+    Django sizes SQLite batches for the 999 parameters of SQLite < 3.32;
+    newer libraries accept 32766, so a batch of orders fits one INSERT.
+    """
+    features = connection.features
+    raw = connection.connection if connection.vendor == 'sqlite' else None
+    if raw is None or not hasattr(raw, 'getlimit'):
+        yield
+        return
+    default = features.max_query_params
+    features.max_query_params = raw.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    try:
+        yield
+    finally:
+        features.max_query_params = default
+
+
+def existing_emails(emails):
+    """Return the subset of ``emails`` already used by a customer"""
+    emails = list(emails)
+    step = connection.features.max_query_params or len(emails) or 1
+    found = set()
+    for start in range(0, len(emails), step):
+        found.update(
+            Customer.objects.filter(email__in=emails[start:start + step])
+            .values_list('email', flat=True)
+        )
+    return found
+
+
+def validate_customer_rows(rows):
+    """Split ``rows`` into ``(valid, errors)``
+
+    ``valid`` is a list of ``(index, row)`` pairs and ``errors`` a list of
+    ``(index, message)``. Each row reports its first failing check, in the
+    order: email format, email taken, duplicate in payload, phone format.
+    """
+    candidates = {row.email for row in rows if is_valid_email(row.email)}
+    taken = existing_emails(candidates)
+
+    valid, errors, seen = [], [], {}
+    for i, row in enumerate(rows):
+        if row.email not in candidates:
+            errors.append((i, "Invalid email format"))
+        elif row.email in taken:
+            errors.append((i, "Email already exists"))
+        elif row.email in seen:
+            errors.append((i, f"Duplicate email in input (same as customer {seen[row.email] + 1})"))
+        elif row.phone and not validate_phone_format(row.phone):
+            errors.append((i, "Invalid phone format"))
+        else:
+            seen[row.email] = i
+            valid.append((i, row))
+    return valid, errors
+
+
+def _create_one_by_one(chunk, errors):
+    """Fallback for a chunk that raced with a concurrent insert"""
+    created = []
+    for i, customer in chunk:
+        try:
+            with transaction.atomic():
+                customer.save(force_insert=True)
+            created.append(customer)
+        except IntegrityError:
+            errors.append((i, "Email already exists"))
+    return created
+
+
+def bulk_create_customers(rows, mode=PARTIAL, batch_size=DEFAULT_BATCH_SIZE):
+    """Create customers from ``rows`` (objects with name/email/phone)
+
+    Returns ``(customers, errors)`` where ``errors`` are ``"Customer N: ..."``
+    messages in input order. In ``ALL_OR_NOTHING`` mode nothing is written
+    if any row fails.
+    """
+    valid, errors = validate_customer_rows(rows)
+    customers = []
+
+    if not (errors and mode == ALL_OR_NOTHING):
+        pending = [
+            (i, Customer(name=row.name, email=row.email, phone=row.phone))
+            for i, row in valid
+        ]
+        with transaction.atomic():
+            for start in range(0, len(pending), batch_size):
+                chunk = pending[start:start + batch_size]
+                try:
+                    with transaction.atomic():
+                        Customer.objects.bulk_create([customer for _, customer in chunk])
+                    customers.extend(customer for _, customer in chunk)
+                except IntegrityError:
+                    customers.extend(_create_one_by_one(chunk, errors))
+
+            if errors and mode == ALL_OR_NOTHING:
+                # A concurrent insert took one of the emails after validation
+                transaction.set_rollback(True)
+                customers = []
+            else:
+                # bulk_create sends no post_save
+                index_instances(Customer, customers)
+                invalidate(Customer)
+
+    errors.sort()
+    return customers, [f"Customer {i + 1}: {message}" for i, message in errors]
+
+
+def _parse_order_row(row):
+    """``(customer_id, {product_id: quantity})`` of an order row, or an error message"""
+    if not row.product_ids:
+        return "At least one product must be selected"
+    quantities = row.quantities or [1] * len(row.product_ids)
+    if len(quantities) != len(row.product_ids):
+        return "Quantities must match product IDs"
+    if any(quantity is None or quantity < 1 for quantity in quantities):
+        return "Quantities must be positive"
+    try:
+        customer_id = int(row.customer_id)
+    except (TypeError, ValueError):
+        return "Invalid customer ID"
+    try:
+        requested = {int(pk): quantity for pk, quantity in zip(row.product_ids, quantities)}
+    except (TypeError, ValueError):
+        return "One or more invalid product IDs"
+    if len(requested) != len(row.product_ids):
+        return "Duplicate product IDs"
+    return customer_id, requested
+
+
+def bulk_create_orders(rows, mode=PARTIAL):
+    """Create orders from ``rows`` (objects shaped like ``OrderInput``)
+
+    Returns ``(orders, errors)`` like ``bulk_create_customers``, with
+    ``"Order N: ..."`` messages. Rows are checked in input order, so when
+    stock runs out the later orders are the ones rejected. Raises
+    ``InsufficientStock`` if stock changed under the reservation, in
+    which case nothing is written.
+    """
+    parsed, errors = [], []
+    for i, row in enumerate(rows):
+        result = _parse_order_row(row)
+        if isinstance(result, str):
+            errors.append((i, result))
+        else:
+            parsed.append((i, row, *result))
+
+    orders = []
+    with transaction.atomic():
+        customers = set(
+            Customer.objects.filter(pk__in={customer_id for _, _, customer_id, _ in parsed})
+            .values_list('pk', flat=True)
+        )
+        products = {
+            product.pk: product
+            for product in lock_products({pk for _, _, _, requested in parsed for pk in requested})
+        }
+
+        stock = {pk: product.stock for pk, product in products.items()}
+        accepted = []
+        for i, row, customer_id, requested in parsed:
+            if customer_id not in customers:
+                errors.append((i, "Invalid customer ID"))
+            elif not requested.keys() <= products.keys():
+                errors.append((i, "One or more invalid product IDs"))
+            elif any(stock[pk] < quantity for pk, quantity in requested.items()):
+                short = [products[pk].name for pk, quantity in requested.items() if stock[pk] < quantity]
+                errors.append((i, f"Insufficient stock for: {', '.join(short)}"))
+            else:
+                for pk, quantity in requested.items():
+                    stock[pk] -= quantity
+                accepted.append((i, row, customer_id, requested))
+
+        if accepted and not (errors and mode == ALL_OR_NOTHING):
+            reserved = Counter()
+            for _, _, _, requested in accepted:
+                reserved.update(requested)
+            reserve_stock(dict(reserved))
+
+            # Totals come from the locked prices, so nothing is read back
+            orders = [
+                Order(
+                    customer_id=customer_id,
+                    total_amount=sum(
+                        (products[pk].price * quantity for pk, quantity in requested.items()), Decimal('0.00')
+                    ),
+                )
+                for _, _, customer_id, requested in accepted
+            ]
+            items = [
+                (order, pk, quantity, products[pk].price)
+                for order, (_, _, _, requested) in zip(orders, accepted)
+                for pk, quantity in requested.items()
+            ]
+            with full_parameter_limit():
+                Order.objects.bulk_create(orders)
+                OrderItem.objects.bulk_create(
+                    [OrderItem(order_id=order.pk, product_id=pk, quantity=quantity) for order, pk, quantity, _ in items]
+                )
+            # order_date is auto_now_add, so explicit dates are applied afterwards
+            dated = [(order, row.order_date) for order, (_, row, _, _) in zip(orders, accepted) if row.order_date]
+            if dated:
+                Order.objects.filter(pk__in=[order.pk for order, _ in dated]).update(
+                    order_date=Case(
+                        *(When(pk=order.pk, then=Value(order_date)) for order, order_date in dated),
+                        output_field=DateTimeField(),
+                    )
+                )
+                for order, order_date in dated:
+                    order.order_date = order_date
+            invalidate(Order, OrderItem)
+            add_created_orders(orders, items)
+            # bulk_create sends no post_save
+            for order in orders:
+                publish(ORDER_CREATED, {'id': order.pk}, Order)
+
+    errors.sort()
+    return orders, [f"Order {i + 1}: {message}" for i, message in errors]
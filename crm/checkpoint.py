@@ -0,0 +1,29 @@
+import json
+import os
+
+
+class Checkpoint:
+    """Progress of a batch job, kept in a JSON file when ``path`` is set"""
+
+    def __init__(self, path=None):
+        self.path = path
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            return json.load(f)
+
+    def save(self, state):
+        if not self.path:
+            return
+        # Write then rename so a crash never leaves a truncated checkpoint
+        temporary = f"{self.path}.tmp"
+        with open(temporary, 'w') as f:
+            # str() keeps full datetime precision, unlike DjangoJSONEncoder
+            json.dump(state, f, default=str)
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
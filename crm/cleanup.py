@@ -0,0 +1,78 @@
+"""
+Batched deletion of inactive customers.
+
+Candidates are customers created before a cutoff with no orders, found
+with a ``NOT EXISTS`` anti-join answered by the ``Order.customer`` index
+(and ``crm_customer_created_idx`` for the ``created_at`` range) instead of
+counting every customer's orders. They are deleted in primary-key order,
+``batch_size`` rows per transaction with an optional pause in between, so
+no statement holds the table for long. After every batch the cutoff and
+the last deleted key are written to a checkpoint file; an interrupted run
+resumes from there with the same cutoff.
+"""
+import time
+from datetime import timedelta
+
+from django.db import router, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .checkpoint import Checkpoint
+from .models import Customer, Order
+
+INACTIVE_DAYS = 365
+DEFAULT_BATCH_SIZE = 500
+
+
+def inactive_customers(cutoff):
+    """Customers created before ``cutoff`` who never placed an order"""
+    return Customer.objects.filter(created_at__lt=cutoff).filter(
+        ~Exists(Order.objects.filter(customer=OuterRef('pk')))
+    )
+
+
+def clean_inactive_customers(days=INACTIVE_DAYS, batch_size=DEFAULT_BATCH_SIZE, pause=0.0,
+                             checkpoint=None, dry_run=False, on_progress=None):
+    """Delete inactive customers in batches and return the run's stats
+
+    ``checkpoint`` is a ``Checkpoint``; a saved one is resumed, ignoring
+    ``days``. ``on_progress(stats)`` is called after each batch. With
+    ``dry_run`` the candidates are only counted.
+    """
+    checkpoint = checkpoint or Checkpoint()
+    state = checkpoint.load()
+    if state:
+        cutoff, last_pk, deleted = parse_datetime(state['cutoff']), state['last_pk'], state['deleted']
+    else:
+        cutoff, last_pk, deleted = timezone.now() - timedelta(days=days), 0, 0
+    stats = {'cutoff': cutoff, 'resumed': bool(state), 'deleted': deleted, 'batches': 0, 'rate': 0.0}
+
+    candidates = inactive_customers(cutoff)
+    if dry_run:
+        stats['candidates'] = candidates.filter(pk__gt=last_pk).count()
+        return stats
+
+    using = router.db_for_write(Customer)
+    started = time.perf_counter()
+    while True:
+        with transaction.atomic(using=using):
+            batch = list(candidates.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            # Re-checked inside the DELETE in case an order arrived since
+            _, counts = inactive_customers(cutoff).filter(pk__in=batch).delete()
+        last_pk = batch[-1]
+        stats['deleted'] += counts.get(Customer._meta.label, 0)
+        stats['batches'] += 1
+        elapsed = time.perf_counter() - started
+        stats['rate'] = (stats['deleted'] - deleted) / elapsed if elapsed else 0.0
+        checkpoint.save({'cutoff': cutoff, 'last_pk': last_pk, 'deleted': stats['deleted']})
+        if on_progress:
+            on_progress(stats)
+        if len(batch) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    checkpoint.clear()
+    return stats
@@ -0,0 +1,194 @@
+"""
+Static cost and depth analysis of a GraphQL operation.
+
+Runs on the parsed document before anything is resolved. Every object
+fetched costs 1, and a field's cost is multiplied by how many times it is
+expected to resolve:
+
+* connections by ``first``/``last`` (or ``RELAY_CONNECTION_MAX_LIMIT`` when
+  neither is given), capped by the relation's estimated fan-out if known;
+* plain lists by their estimated fan-out.
+
+So ``allCustomers(first: 100) { edges { node { orders { edges { node { id } } } } } }``
+costs ``1 + 100 * (1 + 1 + 20 * 1)``. Introspection fields are free.
+"""
+from dataclasses import dataclass
+
+from django.conf import settings
+from graphene_django.settings import graphene_settings
+from graphql import (
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLInterfaceType,
+    GraphQLList,
+    GraphQLObjectType,
+    InlineFragmentNode,
+    get_named_type,
+    get_nullable_type,
+    get_operation_ast,
+)
+from graphql.execution.values import get_argument_values, get_variable_values
+from graphql.language import FragmentDefinitionNode
+
+DEFAULT_MAX_COST = 20000
+DEFAULT_MAX_DEPTH = 15
+DEFAULT_LIST_SIZE = 20
+
+# "<ParentType>.<field>" -> expected number of related rows per parent
+DEFAULT_FAN_OUT = {
+    'CustomerType.orders': 20,
+    'ProductType.orders': 50,
+    'OrderType.products': 10,
+    'OrderType.items': 10,
+}
+
+TOO_EXPENSIVE = 'QUERY_TOO_EXPENSIVE'
+TOO_DEEP = 'QUERY_TOO_DEEP'
+
+
+@dataclass
+class QueryCost:
+    cost: int
+    depth: int
+    max_cost: int
+    max_depth: int
+
+    def as_dict(self):
+        return {
+            'requested': self.cost,
+            'maximum': self.max_cost,
+            'depth': self.depth,
+            'maxDepth': self.max_depth,
+        }
+
+    def errors(self):
+        errors = []
+        if self.cost > self.max_cost:
+            errors.append(GraphQLError(
+                f"Query cost {self.cost} exceeds the maximum of {self.max_cost}",
+                extensions={'code': TOO_EXPENSIVE, 'cost': self.as_dict()},
+            ))
+        if self.depth > self.max_depth:
+            errors.append(GraphQLError(
+                f"Query depth {self.depth} exceeds the maximum of {self.max_depth}",
+                extensions={'code': TOO_DEEP, 'cost': self.as_dict()},
+            ))
+        return errors
+
+
+def _is_connection(type_):
+    return isinstance(type_, GraphQLObjectType) and {'edges', 'pageInfo'} <= type_.fields.keys()
+
+
+class CostAnalyzer:
+    def __init__(self, schema, fan_out=None, default_page_size=None, default_list_size=DEFAULT_LIST_SIZE):
+        self.schema = schema
+        self.fan_out = DEFAULT_FAN_OUT if fan_out is None else fan_out
+        self.default_page_size = default_page_size or graphene_settings.RELAY_CONNECTION_MAX_LIMIT or 100
+        self.default_list_size = default_list_size
+
+    def analyze(self, document, operation_name=None, variables=None):
+        """Return ``(cost, depth)`` of the selected operation"""
+        operation = get_operation_ast(document, operation_name)
+        if operation is None:
+            return 0, 0
+        root = self.schema.get_root_type(operation.operation)
+        if root is None:
+            return 0, 0
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        self.fragment_costs = {}
+        coerced = get_variable_values(self.schema, operation.variable_definitions or (), variables or {})
+        # Invalid variables are reported by execution, estimate with defaults
+        self.variables = coerced if isinstance(coerced, dict) else {}
+        return self._selection_cost(root, operation.selection_set, 0)
+
+    def _fragment_cost(self, name, depth, page_size):
+        """Cost and depth of spreading fragment ``name``, computed once per page size
+
+        Without the memo, fragments spread several times inside fragments
+        that are themselves spread several times cost exponential time.
+        """
+        fragment = self.fragments.get(name)
+        if fragment is None:
+            return 0, depth
+        key = (name, page_size)
+        if key not in self.fragment_costs:
+            self.fragment_costs[key] = (0, 0)  # Cycles are left to validation
+            type_ = self.schema.get_type(fragment.type_condition.name.value)
+            if isinstance(type_, (GraphQLObjectType, GraphQLInterfaceType)):
+                cost, deepest = self._selection_cost(type_, fragment.selection_set, 0, page_size)
+                self.fragment_costs[key] = (cost, deepest)
+        cost, relative_depth = self.fragment_costs[key]
+        return cost, depth + relative_depth
+
+    def _page_size(self, parent_type, field_def, node):
+        try:
+            args = get_argument_values(field_def, node, self.variables)
+        except GraphQLError:
+            args = {}
+        size = max(args.get('first') or 0, args.get('last') or 0) or self.default_page_size
+        estimate = self.fan_out.get(f'{parent_type.name}.{node.name.value}')
+        return min(size, estimate) if estimate else size
+
+    def _selection_cost(self, parent_type, selection_set, depth, page_size=1):
+        total, deepest = 0, depth
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                cost, child_depth = self._field_cost(parent_type, selection, depth, page_size)
+            elif isinstance(selection, FragmentSpreadNode):
+                cost, child_depth = self._fragment_cost(selection.name.value, depth, page_size)
+            elif isinstance(selection, InlineFragmentNode):
+                condition = selection.type_condition
+                type_ = self.schema.get_type(condition.name.value) if condition else parent_type
+                if not isinstance(type_, (GraphQLObjectType, GraphQLInterfaceType)):
+                    continue
+                cost, child_depth = self._selection_cost(type_, selection.selection_set, depth, page_size)
+            else:
+                continue
+            total += cost
+            deepest = max(deepest, child_depth)
+        return total, deepest
+
+    def _field_cost(self, type_, node, depth, page_size):
+        name = node.name.value
+        field_def = type_.fields.get(name)
+        if name.startswith('__') or field_def is None:
+            return 0, depth
+        named = get_named_type(field_def.type)
+        if not node.selection_set or not isinstance(named, (GraphQLObjectType, GraphQLInterfaceType)):
+            return 0, depth + 1
+
+        own, multiplier, child_page_size = 1, 1, 1
+        if _is_connection(named):
+            child_page_size = self._page_size(type_, field_def, node)
+        elif _is_connection(type_) and name == 'edges':
+            own, multiplier = 0, page_size
+        elif named.name == 'PageInfo' or (_is_connection(type_) and name != 'edges'):
+            own = 0
+        elif isinstance(get_nullable_type(field_def.type), GraphQLList):
+            multiplier = self.fan_out.get(f'{type_.name}.{name}', self.default_list_size)
+
+        child_cost, child_depth = self._selection_cost(named, node.selection_set, depth + 1, child_page_size)
+        return multiplier * (own + child_cost), max(depth + 1, child_depth)
+
+
+def analyze_query_cost(schema, document, operation_name=None, variables=None):
+    """Compute the ``QueryCost`` of an operation with the ``CRM_QUERY_COST`` settings"""
+    options = getattr(settings, 'CRM_QUERY_COST', {})
+    analyzer = CostAnalyzer(
+        schema,
+        fan_out={**DEFAULT_FAN_OUT, **options.get('FAN_OUT', {})},
+        default_list_size=options.get('DEFAULT_LIST_SIZE', DEFAULT_LIST_SIZE),
+    )
+    cost, depth = analyzer.analyze(document, operation_name, variables)
+    return QueryCost(
+        cost=cost,
+        depth=depth,
+        max_cost=options.get('MAX_COST', DEFAULT_MAX_COST),
+        max_depth=options.get('MAX_DEPTH', DEFAULT_MAX_DEPTH),
+    )
@@ -1,31 +1,14 @@
 #!/usr/bin/env python3
+"""Run the order reminders job once; it logs to /tmp/order_reminders_log.txt"""
+import os
+import sys
 
-from datetime import datetime, timedelta
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Setup GraphQL Client
-transport = RequestsHTTPTransport(url="http://localhost:8000/graphql", verify=False)
-client = Client(transport=transport, fetch_schema_from_transport=True)
+if __name__ == '__main__':
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql_crm.settings')
+    from django.core.management import execute_from_command_line
 
-# Query: Pending orders from the last 7 days
-query = gql("""
-{
-  orders(filter: { orderDate_Gte: "%s" }) {
-    id
-    customer {
-      email
-    }
-  }
-}
-""" % (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d'))
-
-response = client.execute(query)
-
-# Log orders
-timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-with open('/tmp/order_reminders_log.txt', 'a') as f:
-    for order in response["orders"]:
-        f.write(f"{timestamp} - Order {order['id']}: {order['customer']['email']}\n")
-
-print("Order reminders processed!")
+    execute_from_command_line(['manage.py', 'crm_worker', '--run', 'send_order_reminders'])
+    print("Order reminders processed!")
@@ -0,0 +1,80 @@
+"""
+Database connection tuning and read replica routing.
+
+``configure_connection`` runs on ``connection_created`` and applies
+``CRM_DATABASE['SQLITE_PRAGMAS']`` to every new SQLite connection: WAL so
+that readers no longer block on the writer, ``synchronous=NORMAL`` (safe
+under WAL), a memory-mapped file, a larger page cache and a busy timeout.
+Connections themselves are kept open between requests (``CONN_MAX_AGE``)
+and checked before reuse (``CONN_HEALTH_CHECKS``).
+
+``ReplicaRouter`` sends every write to the primary. Reads go to one of
+``CRM_DATABASE['READ_REPLICAS']`` only inside ``read_from_replicas()``,
+which the GraphQL views enter for query operations; mutations, jobs and
+the admin read from the primary and so always see their own writes.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -20000,  # KiB
+    'busy_timeout': 5000,  # ms
+}
+
+_use_replicas = contextvars.ContextVar('crm_use_replicas', default=False)
+
+
+def database_options():
+    options = getattr(settings, 'CRM_DATABASE', {})
+    return {
+        'sqlite_pragmas': options.get('SQLITE_PRAGMAS', DEFAULT_SQLITE_PRAGMAS),
+        'read_replicas': list(options.get('READ_REPLICAS', ())),
+    }
+
+
+def configure_connection(sender, connection, **kwargs):
+    """``connection_created`` receiver applying the SQLite pragmas"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in database_options()['sqlite_pragmas'].items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@contextmanager
+def read_from_replicas():
+    """Route the reads made in this context to the read replicas, if any"""
+    token = _use_replicas.set(True)
+    try:
+        yield
+    finally:
+        _use_replicas.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _use_replicas.get():
+            return None
+        replicas = database_options()['read_replicas']
+        return random.choice(replicas) if replicas else None
+
+    def db_for_write(self, model, **hints):
+        # Also for instances read from a replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *database_options()['read_replicas']}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Every write goes to the primary; replicas copy its schema from it
+        return db == DEFAULT_DB_ALIAS
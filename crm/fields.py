@@ -0,0 +1,99 @@
+import inspect
+from functools import partial
+
+from django.db.models import QuerySet
+from graphene.relay.connection import connection_adapter, page_info_adapter
+from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.utils import maybe_queryset
+from graphql_relay import connection_from_array_slice, cursor_to_offset, get_offset_with_default, offset_to_cursor
+
+from .async_orm import alist, in_event_loop
+from .loaders import get_loaders
+from .optimizer import optimize_queryset
+
+
+def page_bounds(args, length):
+    """Offsets ``[start, end)`` of the page ``connection_from_array_slice`` returns"""
+    start, end = 0, length
+    after_offset = get_offset_with_default(args.get('after'), -1)
+    if 0 <= after_offset < length:
+        start = after_offset + 1
+    before_offset = get_offset_with_default(args.get('before'), end)
+    if 0 <= before_offset < length:
+        end = min(end, before_offset)
+    first, last = args.get('first'), args.get('last')
+    if isinstance(first, int) and first >= 0:
+        end = min(end, start + first)
+    if isinstance(last, int) and last >= 0:
+        start = max(start, end - last)
+    return start, max(start, end)
+
+
+class CRMFilterConnectionField(DjangoFilterConnectionField):
+    """Filter connection that shapes its queryset after the selection set
+
+    The page it returns is also primed into the request loaders so that
+    relations the optimizer could not plan are still batched. On an event
+    loop the count and the page are read through the async ORM.
+    """
+
+    @classmethod
+    def resolve_queryset(cls, connection, iterable, info, args, filtering_args, filterset_class):
+        qs = super().resolve_queryset(
+            connection, iterable, info, args, filtering_args, filterset_class
+        )
+        return optimize_queryset(qs, info)
+
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        iterable = maybe_queryset(iterable)
+        if isinstance(iterable, QuerySet) and in_event_loop():
+            return cls.aresolve_connection(connection, args, iterable, max_limit)
+        return super().resolve_connection(connection, args, iterable, max_limit)
+
+    @classmethod
+    async def aresolve_connection(cls, connection, args, queryset, max_limit=None):
+        """``resolve_connection`` reading only the requested page, with ``acount``"""
+        offset = args.pop('offset', None)
+        after = args.get('after')
+        if offset:
+            if after:
+                offset += cursor_to_offset(after) + 1
+            args['after'] = offset_to_cursor(offset - 1)
+        if max_limit is not None and args.get('first') is None and args.get('last') is None:
+            args['first'] = max_limit
+
+        length = await queryset.acount()
+        start, end = page_bounds(args, length)
+        rows = await alist(queryset[start:end]) if end > start else []
+        result = connection_from_array_slice(
+            rows,
+            args,
+            slice_start=start,
+            array_length=length,
+            array_slice_length=len(rows),
+            connection_type=partial(connection_adapter, connection),
+            edge_type=connection.Edge,
+            page_info_type=page_info_adapter,
+        )
+        result.iterable = queryset
+        result.length = length
+        return result
+
+    def wrap_resolve(self, parent_resolver):
+        resolve = super().wrap_resolve(parent_resolver)
+
+        def prime(connection, info):
+            get_loaders(info).prime(edge.node for edge in connection.edges)
+            return connection
+
+        async def aprime(connection, info):
+            return prime(await connection, info)
+
+        def resolve_and_prime(root, info, **args):
+            connection = resolve(root, info, **args)
+            if inspect.isawaitable(connection):
+                return aprime(connection, info)
+            return prime(connection, info)
+
+        return resolve_and_prime
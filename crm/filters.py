@@ -1,20 +1,27 @@
 import django_filters
 from django.db import models
 from .models import Customer, Product, Order
+from .search import filter_contains, filter_prefix
 
 
 class CustomerFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(lookup_expr='icontains')
-    email = django_filters.CharFilter(lookup_expr='icontains')
+    name = django_filters.CharFilter(method='filter_contains')
+    email = django_filters.CharFilter(method='filter_contains')
     created_at = django_filters.DateFromToRangeFilter()
     created_at_gte = django_filters.DateFilter(field_name='created_at', lookup_expr='gte')
     created_at_lte = django_filters.DateFilter(field_name='created_at', lookup_expr='lte')
-    phone_pattern = django_filters.CharFilter(field_name='phone', lookup_expr='startswith')
+    phone_pattern = django_filters.CharFilter(field_name='phone', method='filter_prefix')
 
     class Meta:
         model = Customer
         fields = ['name', 'email', 'created_at', 'phone_pattern']
 
+    def filter_contains(self, queryset, name, value):
+        return filter_contains(queryset, name, value)
+
+    def filter_prefix(self, queryset, name, value):
+        return filter_prefix(queryset, name, value)
+
     @property
     def qs(self):
         parent = super().qs
@@ -22,7 +29,7 @@ class CustomerFilter(django_filters.FilterSet):
 
 
 class ProductFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(lookup_expr='icontains')
+    name = django_filters.CharFilter(method='filter_contains')
     price = django_filters.RangeFilter()
     price_gte = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
     price_lte = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
@@ -40,6 +47,9 @@ class ProductFilter(django_filters.FilterSet):
             return queryset.filter(stock__lt=10)
         return queryset
 
+    def filter_contains(self, queryset, name, value):
+        return filter_contains(queryset, name, value)
+
     @property
     def qs(self):
         parent = super().qs
@@ -53,14 +63,18 @@ class OrderFilter(django_filters.FilterSet):
     order_date = django_filters.DateFromToRangeFilter()
     order_date_gte = django_filters.DateFilter(field_name='order_date', lookup_expr='gte')
     order_date_lte = django_filters.DateFilter(field_name='order_date', lookup_expr='lte')
-    customer_name = django_filters.CharFilter(field_name='customer__name', lookup_expr='icontains')
-    product_name = django_filters.CharFilter(field_name='products__name', lookup_expr='icontains')
+    customer_name = django_filters.CharFilter(field_name='customer__name', method='filter_contains')
+    product_name = django_filters.CharFilter(field_name='products__name', method='filter_contains')
     product_id = django_filters.NumberFilter(field_name='products__id')
 
     class Meta:
         model = Order
         fields = ['total_amount', 'order_date', 'customer_name', 'product_name', 'product_id']
 
+    def filter_contains(self, queryset, name, value):
+        path, _, field = name.rpartition('__')
+        return filter_contains(queryset, field, value, path=path + '__')
+
     @property
     def qs(self):
         parent = super().qs
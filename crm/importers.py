@@ -0,0 +1,240 @@
+"""
+Streaming CSV/JSONL importers for customers, products and orders.
+
+Rows are read lazily and written in chunks, one transaction per chunk, so
+memory stays bounded by the chunk size (plus the email/name -> id index
+used to resolve order references) regardless of the file size.
+"""
+import csv
+import json
+import os
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from types import SimpleNamespace
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .analytics import add_orders
+from .bulk import validate_customer_rows
+from .models import Customer, Product, Order, OrderItem
+from .response_cache import invalidate
+from .search import index_instances
+from .totals import recompute_totals
+from .validators import product_errors
+
+
+class RowError(Exception):
+    pass
+
+
+def read_rows(path, fmt=None):
+    """Yield ``(line_number, row_dict)`` from a CSV or JSONL file"""
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    with open(path, newline='', encoding='utf-8') as handle:
+        if fmt == 'csv':
+            # Line 1 is the header
+            for line, row in enumerate(csv.DictReader(handle), start=2):
+                yield line, row
+        elif fmt in ('jsonl', 'ndjson'):
+            for line, text in enumerate(handle, start=1):
+                if text.strip():
+                    try:
+                        row = json.loads(text)
+                    except json.JSONDecodeError as e:
+                        yield line, RowError(f"Invalid JSON: {e.msg}")
+                        continue
+                    if isinstance(row, dict):
+                        yield line, row
+                    else:
+                        yield line, RowError("Expected a JSON object")
+        else:
+            raise ValueError(f"Unsupported format: {fmt!r} (expected csv or jsonl)")
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _text(row, key):
+    value = row.get(key)
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+class Importer:
+    """Validate and write one chunk at a time
+
+    Subclasses implement ``import_chunk(rows)`` returning the number of
+    rows written and reporting rejected rows through ``self.on_error``.
+    """
+
+    def __init__(self, on_error):
+        self.on_error = on_error
+
+    def run(self, rows, batch_size, on_progress=None):
+        stats = {'read': 0, 'imported': 0, 'skipped': 0}
+        for chunk in chunked(rows, batch_size):
+            parsed = []
+            for line, row in chunk:
+                if isinstance(row, RowError):
+                    self.on_error(line, str(row))
+                else:
+                    parsed.append((line, row))
+            with transaction.atomic():
+                imported = self.import_chunk(parsed)
+            stats['read'] += len(chunk)
+            stats['imported'] += imported
+            stats['skipped'] = stats['read'] - stats['imported']
+            if on_progress:
+                on_progress(stats)
+        return stats
+
+
+class CustomerImporter(Importer):
+    """Columns: name, email, phone"""
+
+    def import_chunk(self, rows):
+        named = []
+        for line, row in rows:
+            if not _text(row, 'name'):
+                self.on_error(line, "Name is required")
+                continue
+            named.append((line, SimpleNamespace(
+                name=_text(row, 'name'),
+                email=_text(row, 'email'),
+                phone=_text(row, 'phone') or None,
+            )))
+
+        # Earlier chunks are committed, so the email probe also catches
+        # duplicates across chunks without keeping every email in memory
+        valid, errors = validate_customer_rows([row for _, row in named])
+        for i, message in errors:
+            self.on_error(named[i][0], message)
+        customers = Customer.objects.bulk_create(
+            Customer(name=row.name, email=row.email, phone=row.phone) for _, row in valid
+        )
+        index_instances(Customer, customers)
+        invalidate(Customer)
+        return len(customers)
+
+
+PRICE_FIELD = Product._meta.get_field('price')
+
+
+class ProductImporter(Importer):
+    """Columns: name, price, stock"""
+
+    def import_chunk(self, rows):
+        products = []
+        for line, row in rows:
+            name = _text(row, 'name')
+            try:
+                price = Decimal(_text(row, 'price'))
+                stock = int(_text(row, 'stock') or 0)
+            except (InvalidOperation, ValueError):
+                self.on_error(line, "Invalid price or stock")
+                continue
+            try:
+                # Rejects NaN/Infinity and prices the column cannot hold
+                PRICE_FIELD.run_validators(price)
+            except ValidationError as e:
+                self.on_error(line, f"Invalid price: {' '.join(e.messages)}")
+                continue
+            errors = product_errors(price, stock)
+            if not name:
+                errors.insert(0, "Name is required")
+            if errors:
+                self.on_error(line, "; ".join(errors))
+                continue
+            products.append(Product(name=name, price=price, stock=stock))
+        Product.objects.bulk_create(products)
+        index_instances(Product, products)
+        invalidate(Product)
+        return len(products)
+
+
+class OrderImporter(Importer):
+    """Columns: customer_email, product_names, order_date (optional)
+
+    ``product_names`` is a JSON list or a ``;``-separated string. Product
+    names are not unique; the oldest product with a name wins.
+    """
+
+    def __init__(self, on_error):
+        super().__init__(on_error)
+        self.customer_ids = dict(Customer.objects.values_list('email', 'id').iterator())
+        self.product_ids = {}
+        for name, pk in Product.objects.order_by('-id').values_list('name', 'id').iterator():
+            self.product_ids[name] = pk
+
+    def product_names(self, row):
+        names = row.get('product_names') or []
+        if isinstance(names, str):
+            names = names.split(';')
+        return [str(name).strip() for name in names if str(name).strip()]
+
+    def import_chunk(self, rows):
+        pending = []
+        for line, row in rows:
+            email = _text(row, 'customer_email')
+            customer_id = self.customer_ids.get(email)
+            if customer_id is None:
+                self.on_error(line, f"Unknown customer email: {email}")
+                continue
+            names = self.product_names(row)
+            if not names:
+                self.on_error(line, "At least one product must be selected")
+                continue
+            unknown = [name for name in names if name not in self.product_ids]
+            if unknown:
+                self.on_error(line, f"Unknown product names: {', '.join(unknown)}")
+                continue
+            product_ids = [self.product_ids[name] for name in names]
+            order_date = None
+            if _text(row, 'order_date'):
+                order_date = parse_datetime(_text(row, 'order_date'))
+                if order_date is None:
+                    self.on_error(line, "Invalid order date")
+                    continue
+                if timezone.is_naive(order_date):
+                    order_date = timezone.make_aware(order_date)
+            pending.append((Order(customer_id=customer_id), set(product_ids), order_date))
+
+        if not pending:
+            return 0
+
+        orders = Order.objects.bulk_create(order for order, _, _ in pending)
+        Order.products.through.objects.bulk_create(
+            Order.products.through(order_id=order.pk, product_id=product_id)
+            for order, product_ids, _ in pending
+            for product_id in product_ids
+        )
+        invalidate(Order, OrderItem)
+        ids = [order.pk for order in orders]
+        recompute_totals(Order.objects.filter(pk__in=ids))
+
+        # order_date is auto_now_add, so explicit dates are applied afterwards
+        dated = [When(pk=order.pk, then=Value(date)) for order, _, date in pending if date]
+        if dated:
+            Order.objects.filter(pk__in=ids).update(
+                order_date=Case(*dated, default='order_date', output_field=DateTimeField())
+            )
+        add_orders(ids)
+        return len(orders)
+
+
+IMPORTERS = {
+    'customers': CustomerImporter,
+    'products': ProductImporter,
+    'orders': OrderImporter,
+}
@@ -0,0 +1,68 @@
+"""
+Scheduled CRM jobs, run in-process by ``manage.py crm_worker``.
+
+They replace the crontab entries that called the server's own GraphQL
+endpoint over HTTP (fetching the introspection schema on every run) or
+started a ``manage.py shell``; each one now works directly on the ORM and
+logs to the same file as before (order reminders go to the
+``CRM_REMINDERS`` sink). Each returns a short summary for
+the worker's output.
+"""
+from django.db import connection
+from django.utils import timezone
+
+from . import cleanup, reminders
+from .checkpoint import Checkpoint
+from .stock import restock_low_stock
+
+HEARTBEAT_LOG = '/tmp/crm_heartbeat_log.txt'
+LOW_STOCK_LOG = '/tmp/low_stock_updates_log.txt'
+ORDER_REMINDERS_CHECKPOINT = '/tmp/order_reminders_checkpoint.json'
+CUSTOMER_CLEANUP_LOG = '/tmp/customer_cleanup_log.txt'
+CUSTOMER_CLEANUP_CHECKPOINT = '/tmp/customer_cleanup_checkpoint.json'
+
+
+def _append(path, lines):
+    with open(path, 'a') as f:
+        f.writelines(f"{line}\n" for line in lines)
+
+
+def log_crm_heartbeat(log_path=HEARTBEAT_LOG):
+    """Record whether the schema executes and the database answers"""
+    from alx_backend_graphql_crm.schema import schema
+
+    try:
+        connection.ensure_connection()
+        result = schema.execute('{ hello }')
+        status = "down" if result.errors else "responsive"
+    except Exception:
+        status = "down"
+    timestamp = timezone.localtime().strftime("%d/%m/%Y-%H:%M:%S")
+    _append(log_path, [f"{timestamp} CRM is alive - Status: {status}"])
+    return status
+
+
+def update_low_stock(log_path=LOW_STOCK_LOG, threshold=10, increment=10):
+    """Restock products below ``threshold`` and log their new stock"""
+    products = restock_low_stock(threshold=threshold, increment=increment)
+    timestamp = timezone.localtime().strftime("%Y-%m-%d %H:%M:%S")
+    _append(log_path, [f"{timestamp} - {product.name}: {product.stock}" for product in products])
+    return f"{len(products)} products restocked"
+
+
+def send_order_reminders(checkpoint=ORDER_REMINDERS_CHECKPOINT, days=reminders.REMINDER_DAYS):
+    """Send one digest per customer of their unreminded orders of the last ``days`` days"""
+    stats = reminders.send_order_reminders(days=days, checkpoint=Checkpoint(checkpoint))
+    return f"{stats['digests']} digests for {stats['orders']} orders"
+
+
+def clean_inactive_customers(log_path=CUSTOMER_CLEANUP_LOG, days=cleanup.INACTIVE_DAYS,
+                             checkpoint=CUSTOMER_CLEANUP_CHECKPOINT):
+    """Delete customers without orders created more than ``days`` days ago, in batches"""
+    stats = cleanup.clean_inactive_customers(days=days, checkpoint=Checkpoint(checkpoint))
+    timestamp = timezone.localtime().strftime('%Y-%m-%d %H:%M:%S')
+    _append(log_path, [
+        f"{timestamp} - Deleted {stats['deleted']} inactive customers "
+        f"in {stats['batches']} batches ({stats['rate']:.0f} rows/s)"
+    ])
+    return f"{stats['deleted']} customers deleted"
@@ -0,0 +1,153 @@
+"""
+Request-scoped batch loaders for the CRM GraphQL relations.
+
+Graphene-django resolves relations one parent at a time, so a page of N
+orders costs one customer query and one products query per order. The
+loaders below collect the keys of every sibling on a page and resolve
+them with a single ``IN (...)`` query the first time any of them is read.
+"""
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.db.models import F
+
+from .models import Customer, Product, Order
+from .async_orm import in_event_loop
+from .optimizer import get_cached_related
+
+
+class DataLoader:
+    """Batch and cache one relation for the lifetime of a request"""
+
+    def __init__(self, registry, parent_model, field_name, key_fn, batch_load_fn, default=None):
+        self.registry = registry
+        self.parent_model = parent_model
+        self.field_name = field_name
+        self.key_fn = key_fn
+        self.batch_load_fn = batch_load_fn
+        self.default = default
+        self._cache = {}
+        self._queue = {}
+        self._parents = []
+
+    def prime(self, parent):
+        """Remember a sibling parent whose key joins the next batch
+
+        Keys are read lazily on dispatch, so priming never touches columns
+        the optimizer deferred for relations the client did not select.
+        """
+        self._parents.append(parent)
+
+    def resolve(self, parent):
+        """Return the relation of ``parent``, preferring what is already loaded"""
+        cached = get_cached_related(parent, self.field_name)
+        if cached is not None:
+            return cached
+        if in_event_loop():
+            # Batch on the ORM thread; graphql-core awaits the result
+            return sync_to_async(self.resolve)(parent)
+        return self.load(self.key_fn(parent))
+
+    def load(self, key):
+        if key not in self._cache:
+            self._queue[key] = None
+            self.dispatch()
+        return self._cache[key]
+
+    def dispatch(self):
+        parents, self._parents = self._parents, []
+        for parent in parents:
+            if get_cached_related(parent, self.field_name) is None:
+                key = self.key_fn(parent)
+                if key is not None:
+                    self._queue[key] = None
+
+        keys = [key for key in self._queue if key not in self._cache]
+        self._queue = {}
+        if not keys:
+            return
+
+        results = self.batch_load_fn(keys)
+        for key in keys:
+            value = results.get(key)
+            if value is None:
+                value = self.default() if callable(self.default) else self.default
+            self._cache[key] = value
+
+        # Loaded instances become the siblings of the next level down
+        loaded = []
+        for value in results.values():
+            if isinstance(value, list):
+                loaded.extend(value)
+            elif value is not None:
+                loaded.append(value)
+        self.registry.prime(loaded)
+
+
+def _group_by(instances, attr):
+    grouped = defaultdict(list)
+    for instance in instances:
+        grouped[getattr(instance, attr)].append(instance)
+    return grouped
+
+
+def load_customers(keys):
+    return Customer.objects.in_bulk(keys)
+
+
+def load_order_products(keys):
+    products = Product.objects.filter(orders__id__in=keys).annotate(order_key=F('orders__id'))
+    return _group_by(products, 'order_key')
+
+
+def load_customer_orders(keys):
+    return _group_by(Order.objects.filter(customer_id__in=keys), 'customer_id')
+
+
+def load_product_orders(keys):
+    orders = Order.objects.filter(products__id__in=keys).annotate(product_key=F('products__id'))
+    return _group_by(orders, 'product_key')
+
+
+class LoaderRegistry:
+    """All relation loaders for a single request"""
+
+    def __init__(self):
+        self.order_customer = DataLoader(
+            self, Order, 'customer', lambda order: order.customer_id, load_customers
+        )
+        self.order_products = DataLoader(
+            self, Order, 'products', lambda order: order.pk, load_order_products, default=list
+        )
+        self.customer_orders = DataLoader(
+            self, Customer, 'orders', lambda customer: customer.pk, load_customer_orders, default=list
+        )
+        self.product_orders = DataLoader(
+            self, Product, 'orders', lambda product: product.pk, load_product_orders, default=list
+        )
+        self.loaders = [
+            self.order_customer,
+            self.order_products,
+            self.customer_orders,
+            self.product_orders,
+        ]
+
+    def prime(self, instances):
+        """Register instances whose relations are likely to be resolved together"""
+        for instance in instances:
+            for loader in self.loaders:
+                if isinstance(instance, loader.parent_model):
+                    loader.prime(instance)
+
+
+def get_loaders(info):
+    """Return the loader registry bound to the current request"""
+    context = info.context
+    if context is None:
+        return LoaderRegistry()
+
+    loaders = getattr(context, 'crm_loaders', None)
+    if loaders is None:
+        loaders = LoaderRegistry()
+        context.crm_loaders = loaders
+    return loaders
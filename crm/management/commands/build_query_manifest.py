@@ -0,0 +1,36 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from graphql import GraphQLError, parse, validate
+
+from alx_backend_graphql_crm.schema import schema
+from crm.persisted import query_hash
+
+
+class Command(BaseCommand):
+    help = "Write a {sha256: query} allow-list manifest from .graphql documents"
+
+    def add_arguments(self, parser):
+        parser.add_argument('documents', nargs='+', help="Files holding one GraphQL document each")
+        parser.add_argument('-o', '--output', help="Manifest path (default: stdout)")
+
+    def handle(self, *args, **options):
+        manifest = {}
+        for path in options['documents']:
+            with open(path, encoding='utf-8') as handle:
+                query = handle.read()
+            try:
+                errors = validate(schema.graphql_schema, parse(query))
+            except GraphQLError as e:
+                errors = [e]
+            if errors:
+                raise CommandError(f"{path}: {errors[0].message}")
+            manifest[query_hash(query)] = query
+
+        text = json.dumps(manifest, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                handle.write(text + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote {len(manifest)} documents to {options['output']}"))
+        else:
+            self.stdout.write(text)
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.checkpoint import Checkpoint
+from crm.cleanup import DEFAULT_BATCH_SIZE, INACTIVE_DAYS, clean_inactive_customers
+
+
+class Command(BaseCommand):
+    help = "Delete customers without orders created more than --days ago, in resumable batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=INACTIVE_DAYS, help="Inactivity cutoff in days")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Rows per DELETE and transaction")
+        parser.add_argument('--sleep', type=float, default=0.0, help="Seconds to pause between batches")
+        parser.add_argument('--checkpoint', metavar='PATH', help="Save progress here and resume from it")
+        parser.add_argument('--restart', action='store_true', help="Discard the checkpoint and start over")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the customers that would be deleted")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive")
+        if options['days'] < 0 or options['sleep'] < 0:
+            raise CommandError("--days and --sleep cannot be negative")
+
+        checkpoint = Checkpoint(options['checkpoint'])
+        if options['restart']:
+            checkpoint.clear()
+
+        def on_progress(stats):
+            self.stdout.write(f"batch {stats['batches']}: {stats['deleted']} deleted ({stats['rate']:.0f} rows/s)")
+
+        try:
+            stats = clean_inactive_customers(
+                days=options['days'],
+                batch_size=options['batch_size'],
+                pause=options['sleep'],
+                checkpoint=checkpoint,
+                dry_run=options['dry_run'],
+                on_progress=on_progress,
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        cutoff = f"{stats['cutoff']:%Y-%m-%d %H:%M}"
+        if stats['resumed']:
+            self.stdout.write(f"Resumed from checkpoint, cutoff {cutoff}")
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"{stats['candidates']} customers created before {cutoff} would be deleted"))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Deleted {stats['deleted']} inactive customers in {stats['batches']} batches ({stats['rate']:.0f} rows/s)"
+            ))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.importers import IMPORTERS, read_rows
+
+
+class Command(BaseCommand):
+    help = "Stream customers, products or orders from a CSV or JSONL file into the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension")
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows per bulk insert and transaction")
+        parser.add_argument('--quiet-errors', action='store_true', help="Count rejected rows without printing them")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        def on_error(line, message):
+            if not options['quiet_errors']:
+                self.stderr.write(f"line {line}: {message}")
+
+        started = time.perf_counter()
+
+        def on_progress(stats):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{options['kind']}: {stats['read']} rows read, {stats['imported']} imported, "
+                f"{stats['skipped']} skipped ({stats['read'] / elapsed:.0f} rows/s)"
+            )
+
+        importer = IMPORTERS[options['kind']](on_error)
+        try:
+            rows = read_rows(options['path'], options['format'])
+            stats = importer.run(rows, options['batch_size'], on_progress)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        elapsed = time.perf_counter() - started
+        rate = stats['imported'] / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['imported']} {options['kind']} "
+            f"({stats['skipped']} skipped) in {elapsed:.2f}s, {rate:.0f} rows/s"
+        ))
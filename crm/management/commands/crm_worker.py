@@ -0,0 +1,77 @@
+import signal
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from crm.metrics import REGISTRY
+from crm.scheduler import Scheduler
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = "Run the CRM_WORKER jobs on their cron schedules on a thread pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--run', metavar='JOB', help="Run one job now and exit")
+        parser.add_argument('--list', action='store_true', help="Show the jobs and their next run")
+        parser.add_argument('--only', nargs='+', metavar='JOB', help="Schedule only these jobs")
+        parser.add_argument('--workers', type=int, help="Thread pool size (CRM_WORKER['MAX_WORKERS'])")
+        parser.add_argument('--metrics-port', type=int, help="Serve the job metrics on this port")
+
+    def log(self, message):
+        self.stdout.write(f"{timezone.localtime():%Y-%m-%d %H:%M:%S} {message}")
+
+    def handle(self, *args, **options):
+        if options['workers'] is not None and options['workers'] < 1:
+            raise CommandError("--workers must be positive")
+        try:
+            scheduler = Scheduler.from_settings(
+                only=options['only'], max_workers=options['workers'], log=self.log
+            )
+        except (ValueError, ImportError) as e:
+            raise CommandError(str(e))
+
+        if options['list']:
+            now = timezone.localtime()
+            for job in scheduler.jobs:
+                self.stdout.write(f"{job.name:<24} {str(job.schedule):<16} next {job.schedule.next_after(now):%Y-%m-%d %H:%M}")
+            return
+
+        if options['run']:
+            try:
+                job = scheduler.get_job(options['run'])
+            except KeyError:
+                raise CommandError(f"Unknown job {options['run']!r}")
+            try:
+                ran = scheduler.run_job(job)
+            except Exception as e:
+                raise CommandError(f"{job.name} failed: {e}")
+            if not ran:
+                raise CommandError(f"{job.name} is already running")
+            return
+
+        if not scheduler.jobs:
+            raise CommandError("No jobs configured in CRM_WORKER['JOBS']")
+        if options['metrics_port']:
+            server = ThreadingHTTPServer(('127.0.0.1', options['metrics_port']), MetricsHandler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: scheduler.stop())
+        self.log(f"Scheduling {', '.join(job.name for job in scheduler.jobs)} on {scheduler.max_workers} threads")
+        scheduler.run()
+        self.log("Stopped")
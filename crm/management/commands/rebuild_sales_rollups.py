@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from crm.analytics import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily, product and customer sales rollups from the orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        counts = rebuild_rollups(options['database'])
+        summary = ', '.join(f"{count} {name}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {summary}"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from crm.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Repopulate the customer and product search tables from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        counts = rebuild_index(options['database'])
+        if not counts:
+            self.stdout.write("No search tables on this database, nothing to do")
+            return
+        summary = ', '.join(f"{count} {name}s" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Indexed {summary}"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from crm.totals import recompute_totals
+
+
+class Command(BaseCommand):
+    help = "Recompute Order.total_amount for every order with a single UPDATE"
+
+    def handle(self, *args, **options):
+        updated = recompute_totals()
+        self.stdout.write(self.style.SUCCESS(f"Recomputed totals for {updated} orders"))
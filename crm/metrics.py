@@ -0,0 +1,138 @@
+"""
+In-process metrics rendered in the Prometheus text exposition format.
+
+Deliberately small (counters and histograms with labels) so the project
+does not need ``prometheus_client``. Metrics live for the life of the
+process; with several worker processes each one is scraped separately.
+"""
+import threading
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._samples(key, value))
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self, key, value):
+        yield f'{self.name}{_labels(self.labelnames, key)} {_number(value)}'
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0, 'count': 0}
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state['counts'][index] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state['count'] if state else 0
+
+    def _samples(self, key, state):
+        cumulative = 0
+        for bound, count in zip(self.buckets, state['counts']):
+            cumulative += count
+            yield f'{self.name}_bucket{_labels(self.labelnames, key, [("le", _number(bound))])} {cumulative}'
+        yield f'{self.name}_bucket{_labels(self.labelnames, key, [("le", "+Inf")])} {state["count"]}'
+        yield f'{self.name}_sum{_labels(self.labelnames, key)} {_number(state["sum"])}'
+        yield f'{self.name}_count{_labels(self.labelnames, key)} {state["count"]}'
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def add_collector(self, collector):
+        """``collector()`` returns extra exposition lines at scrape time"""
+        self.collectors.append(collector)
+        return collector
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
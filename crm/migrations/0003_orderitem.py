@@ -0,0 +1,43 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Turn Order.products into an explicit OrderItem through model
+
+    The model takes over the existing ``crm_order_products`` table (state
+    only), then gains a ``quantity`` column.
+    """
+
+    dependencies = [
+        ('crm', '0002_alter_customer_options_alter_order_options_and_more'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='OrderItem',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='crm.order')),
+                        ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_items', to='crm.product')),
+                    ],
+                    options={
+                        'db_table': 'crm_order_products',
+                        'unique_together': {('order', 'product')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='order',
+                    name='products',
+                    field=models.ManyToManyField(related_name='orders', through='crm.OrderItem', to='crm.product'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='quantity',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:12
+
+from django.db import migrations, models, transaction
+
+# table -> (FTS5 mirror, columns); kept in sync at runtime by crm.search
+SEARCH_TABLES = {
+    'crm_customer': ('crm_customer_search', ('name', 'email')),
+    'crm_product': ('crm_product_search', ('name',)),
+}
+
+TRIGRAM_INDEXES = [
+    ('crm_customer_name_trgm', 'crm_customer', 'name'),
+    ('crm_customer_email_trgm', 'crm_customer', 'email'),
+    ('crm_product_name_trgm', 'crm_product', 'name'),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 34, 0):
+        for source, (table, columns) in SEARCH_TABLES.items():
+            values = ', '.join(f"COALESCE({column}, '')" for column in columns)
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {table} USING fts5({', '.join(columns)}, tokenize='trigram')"
+            )
+            schema_editor.execute(
+                f"INSERT INTO {table} (rowid, {', '.join(columns)}) "
+                f"SELECT id, {values} FROM {source}"
+            )
+    elif connection.vendor == 'postgresql':
+        # icontains compiles to UPPER(column) LIKE UPPER(%s)
+        try:
+            with transaction.atomic(using=connection.alias):
+                schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        except Exception:
+            return  # Not permitted here; the filters fall back to scanning
+        for name, table, column in TRIGRAM_INDEXES:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER({column}) gin_trgm_ops)'
+            )
+
+
+def drop_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        for table, _ in SEARCH_TABLES.values():
+            schema_editor.execute(f'DROP TABLE IF EXISTS {table}')
+    elif connection.vendor == 'postgresql':
+        for name, _, _ in TRIGRAM_INDEXES:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0003_orderitem'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['created_at'], name='crm_customer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['phone'], name='crm_customer_phone_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['order_date', 'id'], name='crm_order_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['stock'], name='crm_product_stock_idx'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0004_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SentReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='crm.customer')),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='reminder', to='crm.order')),
+            ],
+        ),
+    ]
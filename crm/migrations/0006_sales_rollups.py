@@ -0,0 +1,93 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:44
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_rollups(apps, schema_editor):
+    # Self-contained so later changes to crm.analytics cannot alter this backfill
+    using = schema_editor.connection.alias
+    Order = apps.get_model('crm', 'Order')
+    OrderItem = apps.get_model('crm', 'OrderItem')
+    DailySales = apps.get_model('crm', 'DailySales')
+    ProductSales = apps.get_model('crm', 'ProductSales')
+    CustomerSales = apps.get_model('crm', 'CustomerSales')
+    orders, items = Order.objects.using(using).order_by(), OrderItem.objects.using(using).order_by()
+
+    units = dict(
+        items.annotate(day=TruncDate('order__order_date')).values('day')
+        .annotate(units=Sum('quantity')).values_list('day', 'units')
+    )
+    DailySales.objects.using(using).bulk_create(
+        (
+            DailySales(date=row['day'], orders=row['orders'], units=units.get(row['day'], 0), revenue=row['revenue'])
+            for row in orders.annotate(day=TruncDate('order_date')).values('day')
+            .annotate(orders=Count('pk'), revenue=Sum('total_amount'))
+        ),
+        batch_size=1000,
+    )
+    ProductSales.objects.using(using).bulk_create(
+        (
+            ProductSales(product_id=row.pop('product'), **row)
+            for row in items.values('product').annotate(
+                orders=Count('pk'), units=Sum('quantity'), revenue=Sum(F('quantity') * F('product__price')),
+            )
+        ),
+        batch_size=1000,
+    )
+    CustomerSales.objects.using(using).bulk_create(
+        (
+            CustomerSales(customer_id=row.pop('customer'), **row)
+            for row in orders.values('customer').annotate(
+                orders=Count('pk'), revenue=Sum('total_amount'),
+                first_order=Min('order_date'), last_order=Max('order_date'),
+            )
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0005_sentreminder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerSales',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales', serialize=False, to='crm.customer')),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('first_order', models.DateTimeField(null=True)),
+                ('last_order', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductSales',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales', serialize=False, to='crm.product')),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-revenue'], name='crm_productsales_revenue_idx')],
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0006_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'order_date', 'id'], name='crm_order_customer_date_idx'),
+        ),
+    ]
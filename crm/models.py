@@ -19,6 +19,11 @@ class Customer(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['created_at'], name='crm_customer_created_idx'),
+            # Prefix search on phone; opclasses only apply on PostgreSQL
+            models.Index(fields=['phone'], name='crm_customer_phone_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
 
 class Product(models.Model):
@@ -31,13 +36,23 @@ class Product(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets post_save receivers tell stock changes from other edits
+        instance._loaded_stock = instance.__dict__.get('stock')
+        return instance
+
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['stock'], name='crm_product_stock_idx'),
+        ]
 
 
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
-    products = models.ManyToManyField(Product, related_name='orders')
+    products = models.ManyToManyField(Product, related_name='orders', through='OrderItem')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     order_date = models.DateTimeField(auto_now_add=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -46,12 +61,74 @@ class Order(models.Model):
     def __str__(self):
         return f"Order {self.id} - {self.customer.name}"
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Calculate total amount after saving
-        if self.products.exists():
-            self.total_amount = sum(product.price for product in self.products.all())
-            super().save(update_fields=['total_amount'])
+    class Meta:
+        ordering = ['-order_date']
+        indexes = [
+            # Keyset pagination and the export walk (order_date, id)
+            models.Index(fields=['order_date', 'id'], name='crm_order_date_id_idx'),
+            # Reminder digests walk each customer's recent orders in turn
+            models.Index(fields=['customer', 'order_date', 'id'], name='crm_order_customer_date_idx'),
+        ]
+
+
+class OrderItem(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='order_items')
+    quantity = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} in order {self.order_id}"
+
+    class Meta:
+        # Reuses the table of the former auto-created many-to-many
+        db_table = 'crm_order_products'
+        unique_together = [('order', 'product')]
+
+
+class SentReminder(models.Model):
+    """An order included in a reminder digest; each order is reminded once"""
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='reminder')
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='reminders')
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Reminder for order {self.order_id}"
+
+
+# Sales rollups, maintained by crm.analytics
+class DailySales(models.Model):
+    date = models.DateField(unique=True)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    def __str__(self):
+        return f"Sales on {self.date}"
+
+
+class ProductSales(models.Model):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='sales')
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    # Quantity times the product's current price, like Order.total_amount
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    def __str__(self):
+        return f"Sales of product {self.product_id}"
 
     class Meta:
-        ordering = ['-order_date']
\ No newline at end of file
+        indexes = [
+            # topProducts reads the first rows of this index
+            models.Index(fields=['-revenue'], name='crm_productsales_revenue_idx'),
+        ]
+
+
+class CustomerSales(models.Model):
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='sales')
+    orders = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    first_order = models.DateTimeField(null=True)
+    last_order = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"Sales to customer {self.customer_id}"
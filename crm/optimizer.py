@@ -0,0 +1,124 @@
+"""
+Selection-set aware queryset optimizer.
+
+Walks the GraphQL selection of the field being resolved and shapes the
+queryset to match it: ``only()`` for the requested columns,
+``select_related`` for forward foreign keys and nested ``Prefetch``
+objects for reverse and many-to-many relations.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+
+def iter_fields(selection_set, info):
+    """Yield field nodes of a selection set, expanding fragments"""
+    if selection_set is None:
+        return
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            yield selection
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = info.fragments[selection.name.value]
+            yield from iter_fields(fragment.selection_set, info)
+        elif isinstance(selection, InlineFragmentNode):
+            yield from iter_fields(selection.selection_set, info)
+
+
+def node_selection_sets(field_node, info):
+    """Return the selection sets describing one object of a field
+
+    Connections are unwrapped through ``edges { node }``; plain object
+    and list fields are returned as they are.
+    """
+    selection_sets = []
+    has_edges = False
+    for child in iter_fields(field_node.selection_set, info):
+        if child.name.value == 'edges':
+            has_edges = True
+            for edge_child in iter_fields(child.selection_set, info):
+                if edge_child.name.value == 'node':
+                    selection_sets.append(edge_child.selection_set)
+    if not has_edges and field_node.selection_set is not None:
+        selection_sets.append(field_node.selection_set)
+    return selection_sets
+
+
+class QueryPlan:
+    """Columns and relations to load for one model"""
+
+    def __init__(self, model):
+        self.model = model
+        self.only = {model._meta.pk.name}
+        self.select_related = []
+        self.prefetch_related = []
+
+    def add_selections(self, selection_sets, info, prefix=''):
+        for selection_set in selection_sets:
+            for field_node in iter_fields(selection_set, info):
+                self.add_field(field_node, info, prefix)
+
+    def add_field(self, field_node, info, prefix):
+        model = self._model_at(prefix)
+        try:
+            field = model._meta.get_field(to_snake_case(field_node.name.value))
+        except FieldDoesNotExist:
+            return
+
+        path = prefix + field.name
+        if field.many_to_many or field.one_to_many:
+            related_model = field.related_model
+            plan = QueryPlan(related_model)
+            if field.one_to_many:
+                # The reverse foreign key is needed to attach rows to their parent
+                plan.only.add(field.field.name)
+            plan.add_selections(node_selection_sets(field_node, info), info)
+            queryset = plan.apply(related_model._default_manager.all())
+            self.prefetch_related.append(Prefetch(path, queryset=queryset))
+        elif field.is_relation:
+            self.only.add(path)
+            self.only.add(f'{path}__{field.related_model._meta.pk.name}')
+            self.select_related.append(path)
+            self.add_selections(node_selection_sets(field_node, info), info, prefix=f'{path}__')
+        elif field.concrete:
+            self.only.add(path)
+
+    def _model_at(self, prefix):
+        model = self.model
+        for name in filter(None, prefix.split('__')):
+            model = model._meta.get_field(name).related_model
+        return model
+
+    def apply(self, queryset):
+        queryset = queryset.only(*self.only)
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        return queryset
+
+
+def optimize_queryset(queryset, info, required=()):
+    """Shape ``queryset`` after the selection of the field being resolved
+
+    ``required`` names columns that must be loaded even when not selected,
+    such as the sort key a cursor is built from.
+    """
+    plan = QueryPlan(queryset.model)
+    plan.only.update(required)
+    for field_node in info.field_nodes:
+        plan.add_selections(node_selection_sets(field_node, info), info)
+    return plan.apply(queryset)
+
+
+def get_cached_related(instance, name):
+    """Return a relation already loaded by the optimizer, or None"""
+    prefetched = getattr(instance, '_prefetched_objects_cache', {})
+    if name in prefetched:
+        return list(prefetched[name])
+
+    field = instance._meta.get_field(name)
+    if field.many_to_one and field.is_cached(instance):
+        return field.get_cached_value(instance)
+    return None
@@ -0,0 +1,177 @@
+"""
+Keyset (seek) pagination for the CRM connections.
+
+Offset cursors make page N cost an ``OFFSET`` scan over every row before
+it plus a full ``COUNT(*)``. A keyset cursor instead encodes the sort key
+of the last row seen, so every page is an indexed ``WHERE key < cursor``
+seek and the total is only counted when ``totalCount`` is selected.
+"""
+import base64
+import json
+from functools import partial
+
+import graphene
+from django.core.exceptions import ValidationError
+from django.db.models import Q, QuerySet
+from graphene_django.filter.utils import get_filtering_args_from_filterset
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError
+
+from .async_orm import alist, in_event_loop
+from .loaders import get_loaders
+from .optimizer import optimize_queryset
+
+CURSOR_PREFIX = 'keyset:'
+
+
+class Keyset:
+    """Sort key of a keyset connection, e.g. ``Keyset('order_date', 'id', descending=True)``"""
+
+    def __init__(self, *fields, descending=False):
+        self.fields = fields
+        self.descending = descending
+
+    def order_by(self, reverse=False):
+        descending = self.descending != reverse
+        return [f'-{name}' if descending else name for name in self.fields]
+
+    def encode(self, instance):
+        values = [getattr(instance, name) for name in self.fields]
+        # str() keeps full datetime precision, unlike DjangoJSONEncoder
+        payload = json.dumps(values, default=str)
+        return base64.b64encode((CURSOR_PREFIX + payload).encode()).decode()
+
+    def decode(self, model, cursor):
+        try:
+            payload = base64.b64decode(cursor.encode()).decode()
+            if not payload.startswith(CURSOR_PREFIX):
+                raise ValueError(cursor)
+            values = json.loads(payload[len(CURSOR_PREFIX):])
+            if len(values) != len(self.fields):
+                raise ValueError(cursor)
+            return [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+        except (ValueError, TypeError, ValidationError, UnicodeDecodeError):
+            raise GraphQLError(f"Invalid cursor: {cursor}")
+
+    def seek(self, queryset, values, reverse=False):
+        """Filter rows strictly after ``values`` in the (possibly reversed) sort order
+
+        Expands the row comparison ``(a, b) > (x, y)`` into
+        ``a > x OR (a = x AND b > y)``, which every backend can serve from
+        a composite index on the key columns.
+        """
+        lookup = 'lt' if self.descending != reverse else 'gt'
+        condition = Q()
+        for i, name in enumerate(self.fields):
+            term = Q(**{f'{name}__{lookup}': values[i]})
+            for prev_name, prev_value in zip(self.fields[:i], values[:i]):
+                term &= Q(**{prev_name: prev_value})
+            condition |= term
+        return queryset.filter(condition)
+
+
+class KeysetConnection(graphene.relay.Connection):
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int()
+
+    def resolve_total_count(self, info):
+        if in_event_loop():
+            return self.iterable.acount()
+        return self.iterable.count()
+
+
+class KeysetConnectionField(graphene.relay.ConnectionField):
+    """Relay connection field paginated by an opaque sort-key cursor
+
+    Accepts the same filter arguments as ``filterset_class``. ``offset``
+    is not supported; pages are reached by following ``after``/``before``.
+    """
+
+    def __init__(self, type_, keyset, filterset_class, *args, **kwargs):
+        self.keyset = keyset
+        self.filterset_class = filterset_class
+        node_type = type_._meta.node
+        self.model = node_type._meta.model
+        self.filtering_args = get_filtering_args_from_filterset(filterset_class, node_type)
+        kwargs.update(self.filtering_args)
+        super().__init__(type_, *args, **kwargs)
+
+    def wrap_resolve(self, parent_resolver):
+        resolver = super(graphene.relay.ConnectionField, self).wrap_resolve(parent_resolver)
+
+        def resolve_page(root, info, **args):
+            return self.resolve_page(resolver, root, info, **args)
+
+        return resolve_page
+
+    def filter_queryset(self, queryset, info, args):
+        data = {k: v for k, v in args.items() if k in self.filtering_args}
+        filterset = self.filterset_class(data=data, queryset=queryset, request=info.context)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.form.errors.as_json())
+        return filterset.qs
+
+    def resolve_page(self, resolver, root, info, first=None, last=None, after=None, before=None, **args):
+        max_limit = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+        if first is not None and last is not None:
+            raise GraphQLError("Provide either `first` or `last`, not both")
+        limit = first if first is not None else last
+        if limit is None:
+            limit = max_limit
+        if limit < 0 or (max_limit and limit > max_limit):
+            raise GraphQLError(f"Page size must be between 0 and {max_limit}")
+
+        queryset = resolver(root, info, **args)
+        if not isinstance(queryset, QuerySet):
+            queryset = self.model._default_manager.all()
+        queryset = self.filter_queryset(queryset, info, args)
+
+        reverse = last is not None or (before is not None and after is None)
+        page = optimize_queryset(queryset, info, required=self.keyset.fields)
+        page = page.order_by(*self.keyset.order_by(reverse=reverse))
+        if after is not None:
+            page = self.keyset.seek(page, self.keyset.decode(self.model, after))
+        if before is not None:
+            page = self.keyset.seek(page, self.keyset.decode(self.model, before), reverse=True)
+
+        page = page[:limit + 1]
+        make_connection = partial(
+            self.make_connection, info, queryset, limit, reverse, after=after, before=before
+        )
+        if in_event_loop():
+            return self.aresolve_rows(page, make_connection)
+        return make_connection(list(page))
+
+    @staticmethod
+    async def aresolve_rows(page, make_connection):
+        return make_connection(await alist(page))
+
+    def make_connection(self, info, queryset, limit, reverse, rows, after=None, before=None):
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if reverse:
+            rows.reverse()
+        get_loaders(info).prime(rows)
+
+        connection_type = self.type
+        if isinstance(connection_type, graphene.NonNull):
+            connection_type = connection_type.of_type
+        edges = [
+            connection_type.Edge(node=row, cursor=self.keyset.encode(row))
+            for row in rows
+        ]
+        page_info = graphene.relay.PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=has_more if reverse else after is not None,
+            has_next_page=before is not None if reverse else has_more,
+        )
+        connection = connection_type(edges=edges, page_info=page_info)
+        # Only counted if the client selects totalCount
+        connection.iterable = queryset
+        return connection
@@ -0,0 +1,178 @@
+"""
+Automatic persisted queries and a cache of parsed, validated documents.
+
+Every document is keyed by the sha256 of its text: clients may send only
+``extensions.persistedQuery.sha256Hash`` once the server has seen the
+text, and plain requests for a known text skip ``parse`` and ``validate``
+too. In allow-list mode (``CRM_PERSISTED_QUERIES['ALLOW_LIST']``, a JSON
+``{sha256: query}`` manifest) documents outside the manifest are rejected
+before they are parsed.
+"""
+import contextlib
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from graphql import GraphQLError, OperationDefinitionNode, parse, validate
+
+DEFAULT_CACHE_SIZE = 500
+
+NOT_FOUND = 'PERSISTED_QUERY_NOT_FOUND'
+NOT_ALLOWED = 'PERSISTED_QUERY_NOT_ALLOWED'
+HASH_MISMATCH = 'PERSISTED_QUERY_HASH_MISMATCH'
+INVALID = 'PERSISTED_QUERY_INVALID'
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+def persisted_query_error(message, code):
+    return GraphQLError(message, extensions={'code': code})
+
+
+def requested_hash(extensions):
+    """The ``persistedQuery.sha256Hash`` of request ``extensions``, or None
+
+    Raises ``GraphQLError`` when ``persistedQuery`` is present but is not
+    an object with a string ``sha256Hash``.
+    """
+    persisted = extensions.get('persistedQuery') if isinstance(extensions, dict) else None
+    if persisted is None:
+        return None
+    if not isinstance(persisted, dict) or not isinstance(persisted.get('sha256Hash'), str):
+        raise persisted_query_error("persistedQuery must be an object with a string sha256Hash", INVALID)
+    return persisted['sha256Hash']
+
+
+class DocumentCache:
+    """Thread-safe LRU of validated ``DocumentNode``s keyed by query hash"""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            document = self._documents.get(key)
+            if document is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._documents.move_to_end(key)
+            return document
+
+    def set(self, key, document):
+        if self.maxsize < 1:
+            return
+        with self._lock:
+            self._documents[key] = document
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self._documents
+
+    def stats(self):
+        return {
+            'size': len(self._documents),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+def load_allow_list(path):
+    """Read a ``{sha256: query}`` manifest, checking every hash"""
+    with open(path, encoding='utf-8') as handle:
+        manifest = json.load(handle)
+    for key, query in manifest.items():
+        if query_hash(query) != key:
+            raise ValueError(f"Manifest entry {key} does not match the sha256 of its query")
+    return manifest
+
+
+class PersistedQueries:
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE, allow_list=None):
+        self.cache = DocumentCache(cache_size)
+        self.allow_list = allow_list
+        # Names of the allow-listed operations, None when any document goes
+        self.operation_names = None if allow_list is None else {
+            definition.name.value
+            for query in allow_list.values()
+            for definition in parse(query).definitions
+            if isinstance(definition, OperationDefinitionNode) and definition.name
+        }
+
+    @classmethod
+    def from_settings(cls):
+        options = getattr(settings, 'CRM_PERSISTED_QUERIES', {})
+        allow_list = options.get('ALLOW_LIST')
+        return cls(
+            cache_size=options.get('CACHE_SIZE', DEFAULT_CACHE_SIZE),
+            allow_list=load_allow_list(allow_list) if allow_list else None,
+        )
+
+    def get_document(self, schema, query, sha256=None, rules=None, max_errors=None, tracer=None):
+        """Return ``(document, errors)`` for ``query`` and/or its ``sha256``
+
+        ``tracer`` (a ``crm.tracing.Tracer``) times the parse and validate
+        phases on a cache miss.
+        """
+        phase = tracer.phase if tracer else lambda name: contextlib.nullcontext()
+        if not query and not sha256:
+            return None, [GraphQLError("Must provide query string.")]
+        if query and sha256 and query_hash(query) != sha256:
+            return None, [persisted_query_error("provided sha does not match query", HASH_MISMATCH)]
+        key = sha256 or query_hash(query)
+
+        if self.allow_list is not None:
+            if key not in self.allow_list:
+                return None, [persisted_query_error("PersistedQueryNotAllowed", NOT_ALLOWED)]
+            query = self.allow_list[key]
+
+        document = self.cache.get(key)
+        if document is not None:
+            return document, []
+        if not query:
+            return None, [persisted_query_error("PersistedQueryNotFound", NOT_FOUND)]
+
+        try:
+            with phase('parse'):
+                document = parse(query)
+        except GraphQLError as e:
+            return None, [e]
+        with phase('validate'):
+            errors = validate(schema, document, rules, max_errors)
+        if errors:
+            return None, errors
+        self.cache.set(key, document)
+        return document, []
+
+
+_persisted_queries = None
+
+
+def get_persisted_queries():
+    global _persisted_queries
+    if _persisted_queries is None:
+        _persisted_queries = PersistedQueries.from_settings()
+    return _persisted_queries
+
+
+def reset_persisted_queries():
+    """Drop the process-wide cache, e.g. after changing the settings"""
+    global _persisted_queries
+    _persisted_queries = None
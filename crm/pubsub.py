@@ -0,0 +1,182 @@
+"""
+Publish/subscribe of CRM changes for the GraphQL subscriptions.
+
+Model signals and the ``UPDATE`` paths that send none (stock reservation
+and restocking) publish small JSON-able messages once their transaction
+commits, so subscribers never see a rolled back write:
+
+* ``ORDER_CREATED``: ``{"id": order_id}``
+* ``STOCK_CHANGED``: ``{"ids": [product_id, ...]}``
+
+Subscribers load the rows they need per message, so clients receive the
+changed objects instead of re-fetching whole connections. The broker is
+chosen by ``CRM_PUBSUB['BROKER']``: any class implementing ``Broker``.
+``LocalBroker`` fans messages out within one process; with several worker
+processes writes only reach the subscribers of the process that made them
+unless the broker spans processes.
+"""
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.db import router, transaction
+from django.utils.module_loading import import_string
+
+from .metrics import REGISTRY
+from .models import Order, Product
+
+ORDER_CREATED = 'crm.order_created'
+STOCK_CHANGED = 'crm.stock_changed'
+DEFAULT_MAX_QUEUE = 100
+
+
+class Broker:
+    """Interface of a message broker
+
+    ``publish`` may be called from any thread; ``subscribe`` is called on
+    the event loop that will consume the messages.
+    """
+
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        """Return an async iterator of the messages on ``channel`` with a ``close()`` method"""
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+
+class LocalSubscription:
+    def __init__(self, broker, channel, max_queue):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(max_queue)
+
+    def push(self, message):
+        """Queue ``message`` from any thread"""
+        self.loop.call_soon_threadsafe(self._deliver, message)
+
+    def _deliver(self, message):
+        # A slow consumer loses its oldest messages rather than growing without bound
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.broker.dropped += 1
+        self.queue.put_nowait(message)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker(Broker):
+    """In-process fan-out to per-subscriber bounded queues"""
+
+    def __init__(self, max_queue=DEFAULT_MAX_QUEUE):
+        self.max_queue = max_queue
+        self.published = self.dropped = 0
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            self.published += 1
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.push(message)
+            except RuntimeError:
+                # Its event loop is closed
+                self.unsubscribe(subscription)
+
+    def subscribe(self, channel):
+        subscription = LocalSubscription(self, channel, self.max_queue)
+        with self._lock:
+            self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.get(subscription.channel, set()).discard(subscription)
+
+    def stats(self):
+        with self._lock:
+            subscribers = sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+        return {'subscribers': subscribers, 'published': self.published, 'dropped': self.dropped}
+
+
+_broker = None
+
+
+def get_broker():
+    """The process-wide broker configured by ``CRM_PUBSUB``"""
+    global _broker
+    if _broker is None:
+        options = getattr(settings, 'CRM_PUBSUB', {})
+        broker_class = import_string(options.get('BROKER', 'crm.pubsub.LocalBroker'))
+        _broker = broker_class(**options.get('OPTIONS', {}))
+    return _broker
+
+
+def reset_broker():
+    global _broker
+    _broker = None
+
+
+def publish(channel, message, model):
+    """Publish ``message`` once the transaction writing ``model`` commits"""
+    transaction.on_commit(
+        lambda: get_broker().publish(channel, message),
+        using=router.db_for_write(model),
+    )
+
+
+def publish_stock_changed(product_ids):
+    product_ids = list(product_ids)
+    if product_ids:
+        publish(STOCK_CHANGED, {'ids': product_ids}, Product)
+
+
+@asynccontextmanager
+async def subscription(channel):
+    subscription = get_broker().subscribe(channel)
+    try:
+        yield subscription
+    finally:
+        subscription.close()
+
+
+def order_saved(sender, instance, created, **kwargs):
+    """``post_save`` receiver for ``Order``"""
+    if created:
+        publish(ORDER_CREATED, {'id': instance.pk}, Order)
+
+
+def product_saved(sender, instance, created, update_fields=None, **kwargs):
+    """``post_save`` receiver for ``Product``, publishing only when stock changed"""
+    if update_fields is not None and 'stock' not in update_fields:
+        return
+    # Instances not loaded from the database (or with stock deferred) count as changed
+    if created or getattr(instance, '_loaded_stock', None) != instance.stock:
+        instance._loaded_stock = instance.stock
+        publish_stock_changed([instance.pk])
+
+
+@REGISTRY.add_collector
+def pubsub_metrics():
+    stats = get_broker().stats()
+    if 'subscribers' in stats:
+        yield '# TYPE crm_graphql_subscribers gauge'
+        yield f"crm_graphql_subscribers {stats['subscribers']}"
+    for name in ('published', 'dropped'):
+        if name in stats:
+            yield f'# TYPE crm_pubsub_messages_{name}_total counter'
+            yield f'crm_pubsub_messages_{name}_total {stats[name]}'
@@ -0,0 +1,198 @@
+"""
+Order reminder digests.
+
+Recent orders are streamed from the ORM in ``(customer, order_date, id)``
+keyset chunks (served by ``crm_order_customer_date_idx``), so each
+customer's orders arrive together and become one digest as soon as the
+next customer starts, even across chunk boundaries. Orders already
+reminded are recorded in ``SentReminder`` and skipped, so re-running is
+idempotent, and with a checkpoint a run only reads orders inserted after
+the last complete one (ids grow in insertion order, unlike
+``order_date``, which imports and bulk creation may set in the past).
+Digests are handed to the sink configured by ``CRM_REMINDERS`` in batches
+while the orders are still being read, and each batch is recorded right
+after the sink accepts it: a crash can at worst resend the batch in
+flight.
+"""
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .checkpoint import Checkpoint
+from .models import Order, SentReminder
+from .pagination import Keyset
+
+REMINDER_DAYS = 7
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_BATCH_SIZE = 100
+
+ORDER_KEYSET = Keyset('customer_id', 'order_date', 'id')
+ORDER_FIELDS = ['id', 'order_date', 'total_amount', 'customer_id', 'customer__name', 'customer__email']
+
+
+@dataclass
+class Digest:
+    customer_id: int
+    name: str
+    email: str
+    orders: list = field(default_factory=list)
+
+    @property
+    def total(self):
+        return sum((order['total_amount'] for order in self.orders), Decimal('0.00'))
+
+    def subject(self):
+        count = len(self.orders)
+        return f"Reminder: {count} pending order{'s' if count != 1 else ''}"
+
+    def body(self):
+        lines = [f"Hello {self.name},", "", "These orders are still pending:"]
+        lines += [
+            f"- Order {order['id']} placed {timezone.localtime(order['order_date']):%Y-%m-%d}: {order['total_amount']}"
+            for order in self.orders
+        ]
+        return '\n'.join(lines + ["", f"Total: {self.total}"])
+
+
+class ReminderSink:
+    """Interface of a reminder destination; ``send`` receives a batch of digests"""
+
+    def send(self, digests):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FileSink(ReminderSink):
+    """Appends one line per digest, with one write per batch"""
+
+    def __init__(self, path='/tmp/order_reminders_log.txt'):
+        self.path = path
+
+    def send(self, digests):
+        timestamp = timezone.localtime().strftime('%Y-%m-%d %H:%M:%S')
+        lines = [
+            f"{timestamp} - {digest.email}: orders {', '.join(str(order['id']) for order in digest.orders)}\n"
+            for digest in digests
+        ]
+        with open(self.path, 'a') as f:
+            f.write(''.join(lines))
+
+
+class EmailSink(ReminderSink):
+    """Sends each batch over one connection of a Django email backend
+
+    ``backend`` defaults to ``EMAIL_BACKEND``; point it at a local SMTP
+    stand-in (``EMAIL_HOST``/``EMAIL_PORT``) or the console/file backends.
+    """
+
+    def __init__(self, backend=None, from_email=None, **backend_options):
+        self.from_email = from_email
+        self.connection = get_connection(backend, **backend_options)
+
+    def send(self, digests):
+        messages = [
+            EmailMessage(digest.subject(), digest.body(), self.from_email, [digest.email], connection=self.connection)
+            for digest in digests
+        ]
+        self.connection.open()
+        self.connection.send_messages(messages)
+
+    def close(self):
+        self.connection.close()
+
+
+def get_sink():
+    """A new sink configured by ``CRM_REMINDERS``"""
+    options = getattr(settings, 'CRM_REMINDERS', {})
+    sink_class = import_string(options.get('SINK', 'crm.reminders.FileSink'))
+    return sink_class(**options.get('OPTIONS', {}))
+
+
+def pending_orders(since, after=None, until=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield unreminded orders placed since ``since`` as dicts, in keyset chunks
+
+    Orders come grouped by customer. Only ids above ``after`` and up to
+    ``until`` are read, when given.
+    """
+    queryset = Order.objects.filter(order_date__gte=since)
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+    if until is not None:
+        queryset = queryset.filter(id__lte=until)
+    queryset = (
+        queryset.filter(~Exists(SentReminder.objects.filter(order=OuterRef('pk'))))
+        .order_by(*ORDER_KEYSET.order_by())
+        .values(*ORDER_FIELDS)
+    )
+    position = None
+    while True:
+        page = ORDER_KEYSET.seek(queryset, position) if position else queryset
+        chunk = list(page[:chunk_size])
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        position = [chunk[-1][name] for name in ORDER_KEYSET.fields]
+
+
+def build_digests(orders):
+    """Yield one ``Digest`` per customer from ``orders`` grouped by customer"""
+    for customer_id, group in groupby(orders, key=lambda order: order['customer_id']):
+        group = list(group)
+        yield Digest(customer_id, group[0]['customer__name'], group[0]['customer__email'], group)
+
+
+def send_order_reminders(days=REMINDER_DAYS, sink=None, checkpoint=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                         batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """Send a digest of their recent unreminded orders to each customer
+
+    ``checkpoint`` (a ``Checkpoint``) keeps the newest order id when the
+    last complete run started, so the next one starts after it. Returns
+    ``{'orders': n, 'digests': n}``. With ``dry_run`` nothing is sent or
+    recorded.
+
+    A ``sink`` passed in belongs to the caller and is left open. Without
+    one, a sink from ``get_sink()`` is created on the first batch and
+    always closed before returning, also when sending fails.
+    """
+    checkpoint = checkpoint or Checkpoint()
+    state = checkpoint.load()
+    since = timezone.now() - timedelta(days=days)
+    # Orders inserted while the run walks past their customer are left to the next one
+    newest = Order.objects.aggregate(newest=Max('id'))['newest']
+    digests = build_digests(pending_orders(since, state['id'] if state else None, newest, chunk_size))
+    stats = {'orders': 0, 'digests': 0}
+    owned = None
+    try:
+        while batch := list(islice(digests, batch_size)):
+            stats['orders'] += sum(len(digest.orders) for digest in batch)
+            stats['digests'] += len(batch)
+            if dry_run:
+                continue
+            if sink is None:
+                sink = owned = get_sink()
+            sink.send(batch)
+            SentReminder.objects.bulk_create(
+                [
+                    SentReminder(order_id=order['id'], customer_id=digest.customer_id)
+                    for digest in batch
+                    for order in digest.orders
+                ],
+                batch_size=chunk_size,
+                ignore_conflicts=True,
+            )
+    finally:
+        if owned is not None:
+            owned.close()
+    # Only a complete run moves the start; after a crash the anti-join skips what was sent
+    if newest is not None and not dry_run:
+        checkpoint.save({'id': newest})
+    return stats
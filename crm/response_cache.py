@@ -0,0 +1,289 @@
+"""
+Response cache for read-only GraphQL operations.
+
+Query results are stored under the sha256 of the normalized document
+(``print_ast``), the operation name and the variables. Each entry is
+tagged with the CRM tables its SQL read and with the version of each tag
+at the moment execution started. Writes bump the versions of the tables
+they touch, from ``post_save`` / ``post_delete`` / ``m2m_changed`` and
+from ``invalidate()`` in the bulk and ``QuerySet.update()`` paths that
+send no signals. An entry whose tag versions moved is a miss, so a result
+computed while a write was in flight is never served.
+
+Backends implement ``get/set/delete/versions/bump/clear``: ``LocMemBackend``
+is a per-process LRU, and ``FileBackend`` is shared by every process
+using the same directory.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils.module_loading import import_string
+from graphql import print_ast
+
+from .metrics import REGISTRY
+from .models import Customer, CustomerSales, DailySales, Order, OrderItem, Product, ProductSales
+
+TRACKED_MODELS = (Customer, Product, Order, OrderItem, DailySales, ProductSales, CustomerSales)
+DEFAULT_TIMEOUT = 60
+DEFAULT_MAX_ENTRIES = 1000
+
+
+def tag_for(model):
+    return model._meta.label_lower
+
+
+class LocMemBackend:
+    """Per-process LRU"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def versions(self, tags):
+        return {tag: self._versions.get(tag, 0) for tag in tags}
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileBackend:
+    """JSON files under ``directory``, shared between processes
+
+    A tag's version is the size of its file under ``versions/``; bumping
+    appends one byte, which is atomic across processes.
+    """
+
+    def __init__(self, directory=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'crm_response_cache')
+        self.max_entries = max_entries
+        self.evictions = 0
+        os.makedirs(os.path.join(self.directory, 'versions'), exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+
+    def _entries(self):
+        with os.scandir(self.directory) as entries:
+            return [entry for entry in entries if entry.name.endswith('.json')]
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, entry):
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(handle, 'w', encoding='utf-8') as temp:
+            json.dump(entry, temp)
+        os.replace(temp_path, self._path(key))
+
+        entries = self._entries()
+        if len(entries) > self.max_entries:
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[:len(entries) - self.max_entries]:
+                with suppress_missing():
+                    os.remove(entry.path)
+                self.evictions += 1
+
+    def delete(self, key):
+        with suppress_missing():
+            os.remove(self._path(key))
+
+    def versions(self, tags):
+        versions = {}
+        for tag in tags:
+            try:
+                versions[tag] = os.path.getsize(os.path.join(self.directory, 'versions', tag))
+            except OSError:
+                versions[tag] = 0
+        return versions
+
+    def bump(self, tags):
+        for tag in tags:
+            with open(os.path.join(self.directory, 'versions', tag), 'ab') as handle:
+                handle.write(b'.')
+
+    def clear(self):
+        for entry in self._entries():
+            with suppress_missing():
+                os.remove(entry.path)
+
+
+@contextmanager
+def suppress_missing():
+    try:
+        yield
+    except FileNotFoundError:
+        pass
+
+
+class ResponseCache:
+    def __init__(self, backend, timeout=DEFAULT_TIMEOUT):
+        self.backend = backend
+        self.timeout = timeout
+        self.hits = self.misses = self.invalidations = 0
+        self.tables = {model._meta.db_table: tag_for(model) for model in TRACKED_MODELS}
+        self.tags = sorted(self.tables.values())
+
+    def make_key(self, document, operation_name, variables):
+        payload = json.dumps(
+            [print_ast(document), operation_name, variables or {}],
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def versions(self):
+        """Snapshot every tag version; pass it to ``set()`` after executing"""
+        return self.backend.versions(self.tags)
+
+    def get(self, key):
+        entry = self.backend.get(key)
+        if entry is not None:
+            current = self.backend.versions(entry['tags'])
+            if entry['expires'] < time.time() or current != entry['tags']:
+                self.backend.delete(key)
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry['data']
+
+    def set(self, key, data, tags, versions):
+        """Store ``data`` unless one of its ``tags`` moved past ``versions``"""
+        tagged = {tag: versions[tag] for tag in tags}
+        if self.backend.versions(tagged) != tagged:
+            return
+        self.backend.set(key, {'data': data, 'tags': tagged, 'expires': time.time() + self.timeout})
+
+    def invalidate(self, tags):
+        self.invalidations += 1
+        self.backend.bump(tags)
+
+    @contextmanager
+    def record_tags(self):
+        """Collect the tags of the tracked tables read by the SQL run in the block"""
+        tags = set()
+
+        def wrapper(execute, sql, params, many, context):
+            quote = context['connection'].ops.quote_name
+            tags.update(tag for table, tag in self.tables.items() if quote(table) in sql)
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(wrapper))
+            yield tags
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.backend.evictions,
+            'invalidations': self.invalidations,
+        }
+
+    @classmethod
+    def from_settings(cls):
+        options = getattr(settings, 'CRM_RESPONSE_CACHE', {})
+        if not options.get('ENABLED', False):
+            return None
+        backend_class = import_string(options.get('BACKEND', 'crm.response_cache.LocMemBackend'))
+        return cls(backend_class(**options.get('OPTIONS', {})), timeout=options.get('TIMEOUT', DEFAULT_TIMEOUT))
+
+
+_response_cache = None
+_configured = False
+
+
+def get_response_cache():
+    """The process-wide ResponseCache, or None when disabled"""
+    global _response_cache, _configured
+    if not _configured:
+        _response_cache = ResponseCache.from_settings()
+        _configured = True
+    return _response_cache
+
+
+def reset_response_cache():
+    global _response_cache, _configured
+    _response_cache, _configured = None, False
+
+
+def invalidate(*models):
+    """Drop cached responses that read ``models``
+
+    Bumps once now and once on commit, so responses computed from the
+    pre-commit snapshot in the meantime are dropped as well.
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return
+    tags = [tag_for(model) for model in models]
+    cache.invalidate(tags)
+    using = router.db_for_write(models[0])
+    if connections[using].in_atomic_block:
+        transaction.on_commit(lambda: cache.invalidate(tags), using=using)
+
+
+def model_changed(sender, **kwargs):
+    """``post_save`` / ``post_delete`` receiver"""
+    invalidate(sender)
+
+
+def relation_changed(sender, action, **kwargs):
+    """``m2m_changed`` receiver for ``Order.products``"""
+    if action.startswith('post_'):
+        invalidate(OrderItem)
+
+
+@REGISTRY.add_collector
+def response_cache_metrics():
+    cache = get_response_cache()
+    if cache is None:
+        return
+    for name, value in cache.stats().items():
+        metric = f'crm_graphql_response_cache_{name}_total'
+        yield f'# TYPE {metric} counter'
+        yield f'{metric} {value}'
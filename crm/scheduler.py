@@ -0,0 +1,272 @@
+"""
+In-process job scheduler used by ``manage.py crm_worker``.
+
+Jobs are plain functions run against the ORM on a thread pool, on cron
+schedules (``CRM_WORKER['JOBS']``). Each planned run is delayed by a
+random ``jitter`` so that several workers or jobs sharing a schedule do
+not hit the database at the same second. A job never overlaps itself: a
+run that comes due while the previous one holds its ``JobLock`` (a thread
+lock plus, with ``LOCK_DIR``, an ``flock`` shared by every worker process
+on the host) is skipped. Durations and outcomes go to
+``crm.metrics.REGISTRY``.
+"""
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .metrics import REGISTRY
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only hold within one process
+    fcntl = None
+
+JOB_DURATION = REGISTRY.histogram(
+    'crm_job_duration_seconds', "Wall time of scheduled job runs", ['job'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0),
+)
+JOB_RUNS = REGISTRY.counter(
+    'crm_job_runs_total', "Scheduled job runs by outcome (success, failure, skipped)", ['job', 'status'],
+)
+
+ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+}
+# (name, lowest, highest) of the five cron fields
+FIELDS = (('minute', 0, 59), ('hour', 0, 23), ('day', 1, 31), ('month', 1, 12), ('weekday', 0, 7))
+MONTHS = 'jan feb mar apr may jun jul aug sep oct nov dec'.split()
+WEEKDAYS = 'sun mon tue wed thu fri sat'.split()
+
+
+class CronExpression:
+    """A five-field cron expression: ``minute hour day-of-month month day-of-week``
+
+    Supports ``*``, lists, ranges, steps (``*/15``, ``1-5/2``), month and
+    weekday names and the ``@daily``-style aliases. As in cron, a day that
+    matches either a restricted day of month or a restricted day of week
+    matches.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        fields = ALIASES.get(expression.strip().lower(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Expected 5 fields in cron expression {expression!r}")
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse(value, *spec) for value, spec in zip(fields, FIELDS)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def _parse(self, value, name, lowest, highest):
+        names = MONTHS if name == 'month' else WEEKDAYS if name == 'weekday' else []
+        offset = 1 if name == 'month' else 0
+        for i, label in enumerate(names):
+            value = re.sub(rf'\b{label}\b', str(i + offset), value.lower())
+
+        values = set()
+        for part in value.split(','):
+            span, _, step = part.partition('/')
+            try:
+                step = int(step) if step else 1
+                if span == '*':
+                    start, end = lowest, highest
+                elif '-' in span:
+                    start, end = (int(bound) for bound in span.split('-', 1))
+                else:
+                    start = end = int(span)
+                    if step > 1:
+                        end = highest
+            except ValueError:
+                raise ValueError(f"Invalid {name} field {part!r} in {self.expression!r}")
+            if step < 1 or not lowest <= start <= end <= highest:
+                raise ValueError(f"Invalid {name} field {part!r} in {self.expression!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment):
+        day = moment.day in self.days
+        # datetime.weekday() counts from Monday, cron from Sunday
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment):
+        """The first minute strictly after ``moment`` matching the expression"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Four years cover every combination of day of month and weekday
+        limit = candidate + timedelta(days=366 * 4)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression {self.expression!r} never matches")
+
+    def __str__(self):
+        return self.expression
+
+
+class JobLock:
+    """Non-blocking lock held while a job runs
+
+    With ``directory`` it is also an ``flock`` on ``<directory>/<name>.lock``
+    so that several worker processes on one host do not overlap either.
+    """
+
+    def __init__(self, name, directory=None):
+        self.name = name
+        self.path = os.path.join(directory, f'{name}.lock') if directory and fcntl else None
+        self._lock = threading.Lock()
+        self._handle = None
+
+    def acquire(self):
+        if not self._lock.acquire(blocking=False):
+            return False
+        if self.path is None:
+            return True
+        handle = open(self.path, 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            self._lock.release()
+            return False
+        self._handle = handle
+        return True
+
+    def release(self):
+        if self._handle is not None:
+            fcntl.flock(self._handle, fcntl.LOCK_UN)
+            self._handle.close()
+            self._handle = None
+        self._lock.release()
+
+
+class Job:
+    def __init__(self, name, schedule, function, jitter=0, lock_dir=None):
+        self.name = name
+        self.schedule = schedule if isinstance(schedule, CronExpression) else CronExpression(schedule)
+        self.function = import_string(function) if isinstance(function, str) else function
+        self.jitter = jitter
+        self.lock = JobLock(name, lock_dir)
+        self.next_run = None
+
+    def plan(self, now):
+        """Set ``next_run`` to the next scheduled time after ``now``, plus jitter"""
+        self.next_run = self.schedule.next_after(now) + timedelta(seconds=random.uniform(0, self.jitter))
+        return self.next_run
+
+
+class Scheduler:
+    def __init__(self, jobs, max_workers=4, log=None):
+        self.jobs = list(jobs)
+        self.max_workers = max_workers
+        self.log = log or (lambda message: None)
+        self.executor = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_settings(cls, only=None, max_workers=None, log=None):
+        options = getattr(settings, 'CRM_WORKER', {})
+        lock_dir = options.get('LOCK_DIR') or os.path.join(tempfile.gettempdir(), 'crm_worker')
+        os.makedirs(lock_dir, exist_ok=True)
+        jobs = [
+            Job(name, job['SCHEDULE'], job['FUNCTION'], jitter=job.get('JITTER', 0), lock_dir=lock_dir)
+            for name, job in options.get('JOBS', {}).items()
+            if only is None or name in only
+        ]
+        return cls(jobs, max_workers=max_workers or options.get('MAX_WORKERS', 4), log=log)
+
+    def get_job(self, name):
+        for job in self.jobs:
+            if job.name == name:
+                return job
+        raise KeyError(name)
+
+    def run_job(self, job):
+        """Run ``job`` now in the calling thread; False if it was already running
+
+        Unlike scheduled runs, the job's exception propagates once logged.
+        """
+        if not job.lock.acquire():
+            JOB_RUNS.inc(job=job.name, status='skipped')
+            self.log(f"{job.name}: skipped, previous run still in progress")
+            return False
+        self._execute(job, reraise=True)
+        return True
+
+    def _execute(self, job, reraise=False):
+        started = time.perf_counter()
+        status = 'failure'
+        close_old_connections()
+        try:
+            result = job.function()
+            status = 'success'
+        except Exception as e:
+            self.log(f"{job.name}: failed: {e!r}")
+            if reraise:
+                raise
+        finally:
+            duration = time.perf_counter() - started
+            close_old_connections()
+            job.lock.release()
+            JOB_DURATION.observe(duration, job=job.name)
+            JOB_RUNS.inc(job=job.name, status=status)
+        if status == 'success':
+            summary = f": {result}" if result is not None else ''
+            self.log(f"{job.name}: finished in {duration:.2f}s{summary}")
+
+    def tick(self, now):
+        """Start every job due at ``now`` and return when the next one is due"""
+        for job in self.jobs:
+            if job.next_run is None:
+                job.plan(now)
+            if job.next_run > now:
+                continue
+            if job.lock.acquire():
+                self.executor.submit(self._execute, job)
+            else:
+                JOB_RUNS.inc(job=job.name, status='skipped')
+                self.log(f"{job.name}: skipped, previous run still in progress")
+            job.plan(now)
+        return min((job.next_run for job in self.jobs), default=None)
+
+    def run(self, clock=timezone.localtime):
+        """Run jobs on their schedules until ``stop()``, then wait for running ones"""
+        self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='crm-worker')
+        try:
+            while not self._stop.is_set():
+                due = self.tick(clock())
+                if due is None:
+                    break
+                self._stop.wait(max(0.0, (due - clock()).total_seconds()))
+        finally:
+            self.executor.shutdown(wait=True)
+
+    def stop(self):
+        self._stop.set()
@@ -1,14 +1,27 @@
 # crm/schema.py
 import graphene
 from graphene_django import DjangoObjectType
-from graphene_django.filter import DjangoFilterConnectionField
+from graphql import GraphQLError
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
 from django.db import transaction
 from decimal import Decimal
-import re
-from .models import Customer, Product, Order
+from . import bulk
+from .analytics import add_orders
+from .async_orm import aget_or_none, alist, get_list, get_or_none
+from .models import Customer, CustomerSales, DailySales, Product, ProductSales, Order, OrderItem
 from .filters import CustomerFilter, ProductFilter, OrderFilter
+from .fields import CRMFilterConnectionField
+from .loaders import get_loaders
+from .validators import product_errors, validate_phone_format
+from .optimizer import optimize_queryset
+from .pagination import Keyset, KeysetConnection, KeysetConnectionField
+from .pubsub import ORDER_CREATED, STOCK_CHANGED, subscription
+from .response_cache import invalidate
+from .stock import InsufficientStock, lock_products, reserve_stock, restock_low_stock
+
+MAX_SALES_DAYS = 366 * 5
+MAX_TOP_PRODUCTS = 100
 
 # GraphQL Types
 class CustomerType(DjangoObjectType):
@@ -17,18 +30,63 @@ class CustomerType(DjangoObjectType):
         fields = "__all__"
         interfaces = (graphene.relay.Node,)
 
+    def resolve_orders(self, info, **kwargs):
+        return get_loaders(info).customer_orders.resolve(self)
+
 class ProductType(DjangoObjectType):
     class Meta:
         model = Product
         fields = "__all__"
         interfaces = (graphene.relay.Node,)
 
+    def resolve_orders(self, info, **kwargs):
+        return get_loaders(info).product_orders.resolve(self)
+
 class OrderType(DjangoObjectType):
     class Meta:
         model = Order
         fields = "__all__"
         interfaces = (graphene.relay.Node,)
 
+    def resolve_customer(self, info):
+        return get_loaders(info).order_customer.resolve(self)
+
+    def resolve_products(self, info, **kwargs):
+        return get_loaders(info).order_products.resolve(self)
+
+class OrderItemType(DjangoObjectType):
+    class Meta:
+        model = OrderItem
+        fields = ("product", "quantity")
+
+class DailySalesType(DjangoObjectType):
+    class Meta:
+        model = DailySales
+        fields = ("date", "orders", "units", "revenue")
+
+class ProductSalesType(DjangoObjectType):
+    class Meta:
+        model = ProductSales
+        fields = ("product", "orders", "units", "revenue")
+
+class CustomerSalesType(DjangoObjectType):
+    class Meta:
+        model = CustomerSales
+        fields = ("customer", "orders", "revenue", "first_order", "last_order")
+
+# Keyset Connections
+class CustomerKeysetConnection(KeysetConnection):
+    class Meta:
+        node = CustomerType
+
+class ProductKeysetConnection(KeysetConnection):
+    class Meta:
+        node = ProductType
+
+class OrderKeysetConnection(KeysetConnection):
+    class Meta:
+        node = OrderType
+
 # Input Types
 class CustomerInput(graphene.InputObjectType):
     name = graphene.String(required=True)
@@ -43,8 +101,15 @@ class ProductInput(graphene.InputObjectType):
 class OrderInput(graphene.InputObjectType):
     customer_id = graphene.ID(required=True)
     product_ids = graphene.List(graphene.ID, required=True)
+    quantities = graphene.List(graphene.Int)  # Same order as product_ids, default 1 each
     order_date = graphene.DateTime()
 
+# Enums
+class BulkCreateMode(graphene.Enum):
+    """How the bulk mutations treat a payload with invalid rows"""
+    PARTIAL = bulk.PARTIAL
+    ALL_OR_NOTHING = bulk.ALL_OR_NOTHING
+
 # Output Types
 class CustomerOutput(graphene.ObjectType):
     customer = graphene.Field(CustomerType)
@@ -55,6 +120,10 @@ class BulkCustomerOutput(graphene.ObjectType):
     customers = graphene.List(CustomerType)
     errors = graphene.List(graphene.String)
 
+class BulkOrderOutput(graphene.ObjectType):
+    orders = graphene.List(OrderType)
+    errors = graphene.List(graphene.String)
+
 class ProductOutput(graphene.ObjectType):
     product = graphene.Field(ProductType)
     message = graphene.String()
@@ -66,25 +135,12 @@ class OrderOutput(graphene.ObjectType):
     errors = graphene.List(graphene.String)
 
 class LowStockUpdateOutput(graphene.ObjectType):
+    success = graphene.Boolean()
     products = graphene.List(ProductType)
+    updated = graphene.List(graphene.String)  # "<name>: <new stock>", read by crm.cron
     message = graphene.String()
     errors = graphene.List(graphene.String)
 
-# Utility Functions
-def validate_phone_format(phone):
-    """Validate phone number format"""
-    if not phone:
-        return True
-    
-    # Patterns for +1234567890 or 123-456-7890
-    patterns = [
-        r'^\+\d{10,15}$',  # +1234567890
-        r'^\d{3}-\d{3}-\d{4}$',  # 123-456-7890
-        r'^\(\d{3}\) \d{3}-\d{4}$',  # (123) 456-7890
-    ]
-    
-    return any(re.match(pattern, phone) for pattern in patterns)
-
 # Mutations
 class CreateCustomer(graphene.Mutation):
     class Arguments:
@@ -128,41 +184,18 @@ class CreateCustomer(graphene.Mutation):
 class BulkCreateCustomers(graphene.Mutation):
     class Arguments:
         input = graphene.List(CustomerInput, required=True)
+        mode = BulkCreateMode(default_value=bulk.PARTIAL)
+        batch_size = graphene.Int(default_value=bulk.DEFAULT_BATCH_SIZE)
 
     Output = BulkCustomerOutput
 
-    def mutate(self, info, input):
-        customers = []
-        errors = []
-        
-        with transaction.atomic():
-            for i, customer_data in enumerate(input):
-                try:
-                    # Validate email format
-                    validate_email(customer_data.email)
-                    
-                    # Check email uniqueness
-                    if Customer.objects.filter(email=customer_data.email).exists():
-                        errors.append(f"Customer {i+1}: Email already exists")
-                        continue
-                    
-                    # Validate phone format
-                    if customer_data.phone and not validate_phone_format(customer_data.phone):
-                        errors.append(f"Customer {i+1}: Invalid phone format")
-                        continue
-                    
-                    customer = Customer.objects.create(
-                        name=customer_data.name,
-                        email=customer_data.email,
-                        phone=customer_data.phone
-                    )
-                    customers.append(customer)
-                    
-                except ValidationError:
-                    errors.append(f"Customer {i+1}: Invalid email format")
-                except Exception as e:
-                    errors.append(f"Customer {i+1}: {str(e)}")
-        
+    def mutate(self, info, input, mode=bulk.PARTIAL, batch_size=bulk.DEFAULT_BATCH_SIZE):
+        if batch_size < 1:
+            return BulkCustomerOutput(customers=[], errors=["Batch size must be positive"])
+
+        customers, errors = bulk.bulk_create_customers(
+            input, mode=getattr(mode, 'value', mode), batch_size=batch_size
+        )
         return BulkCustomerOutput(customers=customers, errors=errors)
 
 class CreateProduct(graphene.Mutation):
@@ -172,16 +205,9 @@ class CreateProduct(graphene.Mutation):
     Output = ProductOutput
 
     def mutate(self, info, input):
-        errors = []
-        
-        # Validate price is positive
-        if input.price <= 0:
-            errors.append("Price must be positive")
-        
-        # Validate stock is non-negative
+        # Validate price is positive and stock is non-negative
         stock = input.stock if input.stock is not None else 0
-        if stock < 0:
-            errors.append("Stock cannot be negative")
+        errors = product_errors(input.price, stock)
         
         if errors:
             return ProductOutput(errors=errors)
@@ -220,64 +246,106 @@ class CreateOrder(graphene.Mutation):
             errors.append("At least one product must be selected")
             return OrderOutput(errors=errors)
         
-        products = Product.objects.filter(id__in=input.product_ids)
-        if len(products) != len(input.product_ids):
+        quantities = input.quantities or [1] * len(input.product_ids)
+        if len(quantities) != len(input.product_ids):
+            errors.append("Quantities must match product IDs")
+            return OrderOutput(errors=errors)
+        if any(quantity is None or quantity < 1 for quantity in quantities):
+            errors.append("Quantities must be positive")
+            return OrderOutput(errors=errors)
+        try:
+            requested = {int(pk): quantity for pk, quantity in zip(input.product_ids, quantities)}
+        except (TypeError, ValueError):
             errors.append("One or more invalid product IDs")
             return OrderOutput(errors=errors)
         
         try:
             with transaction.atomic():
+                products = lock_products(list(requested))
+                if len(products) != len(input.product_ids):
+                    errors.append("One or more invalid product IDs")
+                    return OrderOutput(errors=errors)
+                
+                # Conditional UPDATE; raising rolls back any partial decrement
+                reserve_stock(requested)
+                
                 order = Order.objects.create(
                     customer=customer,
-                    order_date=input.order_date
+                    order_date=input.order_date,
+                    total_amount=sum(product.price * requested[product.pk] for product in products)
                 )
-                order.products.set(products)
-                
-                # Calculate total amount
-                total = sum(product.price for product in products)
-                order.total_amount = total
-                order.save()
+                OrderItem.objects.bulk_create(
+                    OrderItem(order=order, product=product, quantity=requested[product.pk])
+                    for product in products
+                )
+                invalidate(OrderItem)
+                add_orders([order.pk])
                 
                 return OrderOutput(
                     order=order,
                     message="Order created successfully"
                 )
+        except InsufficientStock:
+            short = [product.name for product in products if product.stock < requested[product.pk]]
+            message = "Insufficient stock"
+            if short:
+                message += f" for: {', '.join(short)}"
+            return OrderOutput(errors=[message])
         except Exception as e:
             return OrderOutput(errors=[str(e)])
 
+class BulkCreateOrders(graphene.Mutation):
+    """Create many orders with a fixed number of queries; see crm.bulk"""
+
+    class Arguments:
+        input = graphene.List(OrderInput, required=True)
+        mode = BulkCreateMode(default_value=bulk.PARTIAL)
+
+    Output = BulkOrderOutput
+
+    def mutate(self, info, input, mode=bulk.PARTIAL):
+        try:
+            orders, errors = bulk.bulk_create_orders(input, mode=getattr(mode, 'value', mode))
+        except InsufficientStock:
+            return BulkOrderOutput(orders=[], errors=["Insufficient stock, stock changed during the request"])
+        return BulkOrderOutput(orders=orders, errors=errors)
+
 class UpdateLowStockProducts(graphene.Mutation):
-    """Update products with stock < 10 by incrementing stock by 10"""
+    """Increment the stock of products below a threshold in a single UPDATE"""
+    
+    class Arguments:
+        threshold = graphene.Int(default_value=10)
+        increment = graphene.Int(default_value=10)
+        limit = graphene.Int()  # Restock at most this many products, lowest stock first
     
     Output = LowStockUpdateOutput
     
-    def mutate(self, info):
+    def mutate(self, info, threshold=10, increment=10, limit=None):
         errors = []
-        updated_products = []
+        if threshold < 0:
+            errors.append("Threshold cannot be negative")
+        if increment < 1:
+            errors.append("Increment must be positive")
+        if limit is not None and limit < 1:
+            errors.append("Limit must be positive")
+        if errors:
+            return LowStockUpdateOutput(success=False, errors=errors)
         
         try:
-            # Find products with stock < 10
-            low_stock_products = Product.objects.filter(stock__lt=10)
-            
-            if not low_stock_products.exists():
-                return LowStockUpdateOutput(
-                    products=[],
-                    message="No products with low stock found"
-                )
-            
-            # Update each product's stock
-            for product in low_stock_products:
-                old_stock = product.stock
-                product.stock += 10
-                product.save()
-                updated_products.append(product)
-            
-            return LowStockUpdateOutput(
-                products=updated_products,
-                message=f"Successfully updated {len(updated_products)} products with low stock"
-            )
-            
+            products = restock_low_stock(threshold=threshold, increment=increment, limit=limit)
         except Exception as e:
-            return LowStockUpdateOutput(errors=[str(e)])
+            return LowStockUpdateOutput(success=False, errors=[str(e)])
+        
+        if not products:
+            message = "No products with low stock found"
+        else:
+            message = f"Successfully updated {len(products)} products with low stock"
+        return LowStockUpdateOutput(
+            success=True,
+            products=products,
+            updated=[f"{product.name}: {product.stock}" for product in products],
+            message=message
+        )
 
 # Query Class
 class Query(graphene.ObjectType):
@@ -289,30 +357,67 @@ class Query(graphene.ObjectType):
     order = graphene.Field(OrderType, id=graphene.ID(required=True))
     
     # Filtered list queries
-    all_customers = DjangoFilterConnectionField(CustomerType, filterset_class=CustomerFilter)
-    all_products = DjangoFilterConnectionField(ProductType, filterset_class=ProductFilter)
-    all_orders = DjangoFilterConnectionField(OrderType, filterset_class=OrderFilter)
+    all_customers = CRMFilterConnectionField(CustomerType, filterset_class=CustomerFilter)
+    all_products = CRMFilterConnectionField(ProductType, filterset_class=ProductFilter)
+    all_orders = CRMFilterConnectionField(OrderType, filterset_class=OrderFilter)
+
+    # Keyset-paginated list queries (cursor encodes the sort key, no OFFSET)
+    all_customers_keyset = KeysetConnectionField(
+        CustomerKeysetConnection, keyset=Keyset('name', 'id'), filterset_class=CustomerFilter
+    )
+    all_products_keyset = KeysetConnectionField(
+        ProductKeysetConnection, keyset=Keyset('name', 'id'), filterset_class=ProductFilter
+    )
+    all_orders_keyset = KeysetConnectionField(
+        OrderKeysetConnection, keyset=Keyset('order_date', 'id', descending=True), filterset_class=OrderFilter
+    )
+
+    # Sales analytics, read from the rollup tables maintained by crm.analytics
+    sales_by_day = graphene.List(
+        graphene.NonNull(DailySalesType),
+        from_date=graphene.Date(required=True, name="from"),
+        to_date=graphene.Date(required=True, name="to"),
+        description="Days with sales between from and to, inclusive",
+    )
+    top_products = graphene.List(
+        graphene.NonNull(ProductSalesType),
+        limit=graphene.Int(default_value=10),
+        description="Products with the highest revenue",
+    )
+    customer_lifetime_value = graphene.Field(
+        CustomerSalesType,
+        id=graphene.ID(required=True),
+        description="Order count and revenue of a customer; null when they have no orders",
+    )
 
     def resolve_hello(self, info):
         return "Hello, GraphQL!"
     
     def resolve_customer(self, info, id):
-        try:
-            return Customer.objects.get(id=id)
-        except Customer.DoesNotExist:
-            return None
+        return get_or_none(optimize_queryset(Customer.objects.all(), info), id=id)
     
     def resolve_product(self, info, id):
-        try:
-            return Product.objects.get(id=id)
-        except Product.DoesNotExist:
-            return None
+        return get_or_none(optimize_queryset(Product.objects.all(), info), id=id)
     
     def resolve_order(self, info, id):
-        try:
-            return Order.objects.get(id=id)
-        except Order.DoesNotExist:
-            return None
+        return get_or_none(optimize_queryset(Order.objects.all(), info), id=id)
+
+    def resolve_sales_by_day(self, info, from_date, to_date):
+        if from_date > to_date:
+            raise GraphQLError("'from' must not be after 'to'")
+        if (to_date - from_date).days >= MAX_SALES_DAYS:
+            raise GraphQLError(f"At most {MAX_SALES_DAYS} days can be requested")
+        return get_list(DailySales.objects.filter(date__range=(from_date, to_date)).order_by('date'))
+
+    def resolve_top_products(self, info, limit=10):
+        if not 1 <= limit <= MAX_TOP_PRODUCTS:
+            raise GraphQLError(f"limit must be between 1 and {MAX_TOP_PRODUCTS}")
+        queryset = optimize_queryset(ProductSales.objects.all(), info)
+        return get_list(queryset.order_by('-revenue', 'pk')[:limit])
+
+    def resolve_customer_lifetime_value(self, info, id):
+        # Customers without orders have no row
+        return get_or_none(optimize_queryset(CustomerSales.objects.all(), info), pk=id)
 
 # Mutation Class
 class Mutation(graphene.ObjectType):
@@ -320,4 +425,31 @@ class Mutation(graphene.ObjectType):
     bulk_create_customers = BulkCreateCustomers.Field()
     create_product = CreateProduct.Field()
     create_order = CreateOrder.Field()
-    update_low_stock_products = UpdateLowStockProducts.Field()
\ No newline at end of file
+    bulk_create_orders = BulkCreateOrders.Field()
+    update_low_stock_products = UpdateLowStockProducts.Field()
+
+# Subscription Class
+class Subscription(graphene.ObjectType):
+    """Changes pushed over the WebSocket transport as they are committed"""
+
+    order_created = graphene.Field(OrderType)
+    product_stock_changed = graphene.Field(
+        ProductType,
+        threshold=graphene.Int(description="Only products whose stock is now below this"),
+    )
+
+    async def subscribe_order_created(root, info):
+        async with subscription(ORDER_CREATED) as messages:
+            async for message in messages:
+                order = await aget_or_none(optimize_queryset(Order.objects.all(), info), pk=message['id'])
+                if order is not None:
+                    yield order
+
+    async def subscribe_product_stock_changed(root, info, threshold=None):
+        async with subscription(STOCK_CHANGED) as messages:
+            async for message in messages:
+                products = optimize_queryset(Product.objects.filter(pk__in=message['ids']), info)
+                if threshold is not None:
+                    products = products.filter(stock__lt=threshold)
+                for product in await alist(products.order_by('pk')):
+                    yield product
@@ -0,0 +1,138 @@
+"""
+Indexed substring search for the ``icontains`` filters.
+
+On SQLite (3.34+) customer and product names and emails are mirrored into
+FTS5 tables with the ``trigram`` tokenizer, so ``contains`` searches of
+three characters or more are answered from the index instead of a
+``LIKE '%x%'`` scan. The mirrors are kept in sync by ``post_save`` /
+``post_delete`` receivers; ``bulk_create`` callers index their rows with
+``index_instances``. On PostgreSQL migration 0004 adds ``pg_trgm`` GIN
+indexes on ``UPPER(column)``, which serve Django's ``icontains`` as is.
+"""
+from django.db import connections, router
+from django.db.models.expressions import RawSQL
+
+from .models import Customer, Product
+
+# model -> (FTS5 table, mirrored columns)
+SEARCH_TABLES = {
+    Customer: ('crm_customer_search', ('name', 'email')),
+    Product: ('crm_product_search', ('name',)),
+}
+
+# The trigram tokenizer cannot match anything shorter
+MIN_TERM_LENGTH = 3
+
+
+def supports_fts(connection):
+    """Whether the FTS5 trigram tables exist on this connection"""
+    return (
+        connection.vendor == 'sqlite'
+        and connection.Database.sqlite_version_info >= (3, 34, 0)
+    )
+
+
+def _connection(model):
+    return connections[router.db_for_write(model)]
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def search_ids(model, field, value, using):
+    """``SELECT rowid`` subquery for rows of ``model`` whose ``field`` contains ``value``
+
+    Returns None when the index cannot answer the search.
+    """
+    table, columns = SEARCH_TABLES[model]
+    if field not in columns or len(value) < MIN_TERM_LENGTH or not supports_fts(connections[using]):
+        return None
+    return RawSQL(
+        f'SELECT rowid FROM {table} WHERE {table} MATCH %s',
+        [f'{field} : {_quote(value)}'],
+    )
+
+
+def filter_contains(queryset, field, value, path=''):
+    """``queryset.filter(<path><field>__icontains=value)`` through the search index
+
+    ``path`` is the lookup prefix of a related model, e.g. ``'customer__'``.
+    """
+    model = queryset.model
+    for part in path.split('__')[:-1]:
+        model = model._meta.get_field(part).related_model
+    ids = search_ids(model, field, value, queryset.db)
+    if ids is None:
+        return queryset.filter(**{f'{path}{field}__icontains': value})
+    return queryset.filter(**{f'{path}pk__in': ids})
+
+
+def filter_prefix(queryset, field, value):
+    """``startswith`` that a plain B-tree index can serve on SQLite
+
+    SQLite's ``LIKE`` is case-insensitive and never uses an ordinary index,
+    so the prefix becomes a range, which matches ``startswith`` exactly for
+    values without letters (phone numbers). Other backends keep ``LIKE``,
+    served on PostgreSQL by the ``varchar_pattern_ops`` index.
+    """
+    if not value or connections[queryset.db].vendor != 'sqlite':
+        return queryset.filter(**{f'{field}__startswith': value})
+    return queryset.filter(**{f'{field}__gte': value, f'{field}__lt': value + '\U0010ffff'})
+
+
+def index_instances(model, instances):
+    """Insert or refresh the search rows of ``instances``"""
+    instances = [instance for instance in instances if instance.pk is not None]
+    connection = _connection(model)
+    if not instances or not supports_fts(connection):
+        return
+    table, columns = SEARCH_TABLES[model]
+    placeholders = ', '.join(['%s'] * (len(columns) + 1))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {table} WHERE rowid = %s',
+            [(instance.pk,) for instance in instances],
+        )
+        cursor.executemany(
+            f'INSERT INTO {table} (rowid, {", ".join(columns)}) VALUES ({placeholders})',
+            [
+                (instance.pk, *(getattr(instance, column) or '' for column in columns))
+                for instance in instances
+            ],
+        )
+
+
+def unindex(model, pks):
+    connection = _connection(model)
+    if not pks or not supports_fts(connection):
+        return
+    table, _ = SEARCH_TABLES[model]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {table} WHERE rowid = %s', [(pk,) for pk in pks])
+
+
+def rebuild_index(using='default'):
+    """Repopulate every search table from its model table in one statement each"""
+    connection = connections[using]
+    if not supports_fts(connection):
+        return {}
+    counts = {}
+    with connection.cursor() as cursor:
+        for model, (table, columns) in SEARCH_TABLES.items():
+            source = ', '.join(f"COALESCE({column}, '')" for column in columns)
+            cursor.execute(f'DELETE FROM {table}')
+            cursor.execute(
+                f'INSERT INTO {table} (rowid, {", ".join(columns)}) '
+                f'SELECT id, {source} FROM {model._meta.db_table}'
+            )
+            counts[model._meta.model_name] = cursor.rowcount
+    return counts
+
+
+def instance_saved(sender, instance, **kwargs):
+    index_instances(sender, [instance])
+
+
+def instance_deleted(sender, instance, **kwargs):
+    unindex(sender, [instance.pk])
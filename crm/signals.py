@@ -0,0 +1,39 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from .analytics import item_deleted, items_changed, order_deleted
+from .database import configure_connection
+from .models import Order, OrderItem, Product
+from .pubsub import order_saved, product_saved
+from .response_cache import TRACKED_MODELS, model_changed, relation_changed
+from .search import SEARCH_TABLES, instance_deleted, instance_saved
+from .totals import products_changed
+
+m2m_changed.connect(
+    products_changed,
+    sender=Order.products.through,
+    dispatch_uid='crm.totals.products_changed',
+)
+
+for model in SEARCH_TABLES:
+    post_save.connect(instance_saved, sender=model, dispatch_uid=f'crm.search.saved.{model.__name__}')
+    post_delete.connect(instance_deleted, sender=model, dispatch_uid=f'crm.search.deleted.{model.__name__}')
+
+for model in TRACKED_MODELS:
+    post_save.connect(model_changed, sender=model, dispatch_uid=f'crm.response_cache.saved.{model.__name__}')
+    post_delete.connect(model_changed, sender=model, dispatch_uid=f'crm.response_cache.deleted.{model.__name__}')
+m2m_changed.connect(
+    relation_changed,
+    sender=Order.products.through,
+    dispatch_uid='crm.response_cache.relation_changed',
+)
+
+post_save.connect(order_saved, sender=Order, dispatch_uid='crm.pubsub.order_saved')
+post_save.connect(product_saved, sender=Product, dispatch_uid='crm.pubsub.product_saved')
+
+# After crm.totals so that refreshed rollups see the new order totals
+m2m_changed.connect(items_changed, sender=Order.products.through, dispatch_uid='crm.analytics.items_changed')
+post_delete.connect(order_deleted, sender=Order, dispatch_uid='crm.analytics.order_deleted')
+post_delete.connect(item_deleted, sender=OrderItem, dispatch_uid='crm.analytics.item_deleted')
+
+connection_created.connect(configure_connection, dispatch_uid='crm.database.configure_connection')
@@ -0,0 +1,143 @@
+"""
+Race-free stock reservation.
+
+Stock is decremented with one conditional ``UPDATE`` for the whole batch
+of products, ``stock = stock - n WHERE stock >= n``, so two concurrent
+orders can never both take the last unit. Rows are locked in primary key
+order beforehand (``select_for_update``, a no-op on SQLite) so that
+overlapping orders cannot deadlock.
+"""
+from django.db import connections, router, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import Product
+from .pubsub import publish_stock_changed
+from .response_cache import invalidate
+
+
+class InsufficientStock(Exception):
+    pass
+
+
+def lock_products(product_ids):
+    """Return the products for ``product_ids`` locked in primary key order
+
+    Must be called inside ``transaction.atomic()``.
+    """
+    return list(
+        Product.objects.select_for_update()
+        .filter(pk__in=product_ids)
+        .order_by('pk')
+    )
+
+
+def reserve_stock(quantities):
+    """Atomically take ``quantities`` ({product_id: n}) from stock
+
+    Raises InsufficientStock if any product is short; raised inside the
+    caller's ``transaction.atomic()`` block, this also rolls back the rows
+    the UPDATE did decrement.
+    """
+    if not quantities:
+        return
+
+    requested = Case(
+        *[When(pk=pk, then=Value(n)) for pk, n in quantities.items()],
+        output_field=IntegerField(),
+    )
+    invalidate(Product)
+    updated = (
+        Product.objects.filter(pk__in=list(quantities), stock__gte=requested)
+        .order_by()
+        .update(stock=F('stock') - requested)
+    )
+    if updated != len(quantities):
+        raise InsufficientStock("Insufficient stock")
+    publish_stock_changed(quantities)
+
+
+def supports_update_returning(connection):
+    """Whether the backend understands ``UPDATE ... RETURNING``"""
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35, 0)
+    return False
+
+
+def restock_low_stock(threshold=10, increment=10, limit=None):
+    """Add ``increment`` to every product with ``stock < threshold``
+
+    At most ``limit`` products (lowest stock first) are restocked. Returns
+    the updated products. Uses a single ``UPDATE ... RETURNING`` where the
+    backend supports it, otherwise locks and reads the rows, then updates
+    them with one ``UPDATE``.
+    """
+    connection = connections[router.db_for_write(Product)]
+    now = timezone.now()
+    invalidate(Product)
+    if supports_update_returning(connection):
+        products = _restock_returning(connection, threshold, increment, limit, now)
+        publish_stock_changed(product.pk for product in products)
+        return products
+
+    with transaction.atomic(using=connection.alias):
+        candidates = (
+            Product.objects.using(connection.alias)
+            .select_for_update()
+            .filter(stock__lt=threshold)
+            .order_by('stock', 'pk')
+        )
+        if limit is not None:
+            candidates = candidates[:limit]
+        products = list(candidates)
+        Product.objects.using(connection.alias).filter(pk__in=[p.pk for p in products]).update(
+            stock=F('stock') + increment, updated_at=now
+        )
+    for product in products:
+        product.stock += increment
+        product.updated_at = now
+    publish_stock_changed(product.pk for product in products)
+    return products
+
+
+def _restock_returning(connection, threshold, increment, limit, now):
+    opts = Product._meta
+    qn = connection.ops.quote_name
+    table = qn(opts.db_table)
+    fields = opts.concrete_fields
+    columns = ', '.join(qn(field.column) for field in fields)
+    stock, updated_at, pk = (
+        qn(opts.get_field(name).column) for name in ('stock', 'updated_at', opts.pk.name)
+    )
+
+    where = f'{stock} < %s'
+    params = [increment, opts.get_field('updated_at').get_db_prep_value(now, connection), threshold]
+    if limit is not None:
+        where = f'{pk} IN (SELECT {pk} FROM {table} WHERE {stock} < %s ORDER BY {stock}, {pk} LIMIT %s)'
+        params.append(limit)
+
+    sql = (
+        f'UPDATE {table} SET {stock} = {stock} + %s, {updated_at} = %s '
+        f'WHERE {where} RETURNING {columns}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    # Apply the same backend and field converters a SELECT would
+    cols = [field.get_col(opts.db_table) for field in fields]
+    converters = [
+        connection.ops.get_db_converters(col) + col.get_db_converters(connection)
+        for col in cols
+    ]
+    products = []
+    for row in rows:
+        row = list(row)
+        for i, col in enumerate(cols):
+            for converter in converters[i]:
+                row[i] = converter(row[i], col, connection)
+        products.append(Product.from_db(connection.alias, [f.attname for f in fields], row))
+    products.sort(key=lambda product: (product.stock, product.pk))
+    return products
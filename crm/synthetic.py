@@ -0,0 +1,207 @@
+"""
+Deterministic synthetic CRM data for benchmarks and load tests.
+
+The same ``seed`` and ``size`` always produce the same rows. The
+distributions follow real shops rather than round-robin:
+
+* product popularity is Zipfian (a few products in most orders);
+* customer activity is log-normal (a few customers place many orders,
+  most place a handful or none);
+* order sizes and quantities are geometric (mostly 1-3 products, 1 unit);
+* order dates are spread over the ``days`` before ``end`` (default:
+  ``DEFAULT_END``), with ids increasing with the date.
+
+Primary keys continue from the rows already in the database, but names,
+emails and dates depend only on the seed, so a dataset generated on top
+of other data or on another day is the same apart from its ids.
+
+Rows go in through ``executemany`` with precomputed primary keys, one
+transaction per chunk, so that orders and their items are written
+without reading anything back. Search tables and sales rollups, which
+signals would have maintained, are rebuilt at the end.
+"""
+import random
+import string
+from bisect import bisect
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from itertools import accumulate
+
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.db.models import Max
+
+from .analytics import rebuild_rollups
+from .models import Customer, Order, OrderItem, Product
+from .response_cache import invalidate
+from .search import rebuild_index
+
+
+@dataclass(frozen=True)
+class Scale:
+    customers: int
+    products: int
+    orders: int
+
+
+SIZES = {
+    '10k': Scale(customers=1_000, products=200, orders=10_000),
+    '1m': Scale(customers=100_000, products=5_000, orders=1_000_000),
+    '10m': Scale(customers=1_000_000, products=20_000, orders=10_000_000),
+}
+DEFAULT_CHUNK_SIZE = 20_000
+# Fixed, so that the dates of a seed do not move with the calendar
+DEFAULT_END = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+ZIPF_EXPONENT = 1.0
+ACTIVITY_SIGMA = 1.2
+MAX_ORDER_SIZE = 12
+SYLLABLES = ['an', 'bel', 'cor', 'da', 'el', 'fin', 'gar', 'hol', 'is', 'jo', 'ka', 'lin', 'mar', 'no', 'ra', 'sen', 'ta', 'vi']
+PRODUCT_WORDS = ['Laptop', 'Mouse', 'Keyboard', 'Monitor', 'Headphones', 'Webcam', 'Cable', 'Dock', 'Charger', 'Stand']
+
+
+def _name(rng, parts):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(parts)).capitalize()
+
+
+def _geometric(rng, p, limit):
+    """1 + the number of failures before a success of probability ``p``, at most ``limit``"""
+    value = 1
+    while value < limit and rng.random() > p:
+        value += 1
+    return value
+
+
+class Generator:
+    def __init__(self, scale, seed=0, days=365, end=None, using='default', chunk_size=DEFAULT_CHUNK_SIZE):
+        self.scale = scale
+        self.seed = seed
+        self.days = days
+        self.using = using
+        self.chunk_size = chunk_size
+        self.end = end or DEFAULT_END
+
+    def _next_id(self, model):
+        return (model.objects.using(self.using).aggregate(top=Max('pk'))['top'] or 0) + 1
+
+    def _insert(self, model, fields, rows):
+        connection = connections[self.using]
+        fields = [model._meta.get_field(name) for name in fields]
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        sql = f"INSERT INTO {table} ({columns}) VALUES ({', '.join(['%s'] * len(fields))})"
+        # Only dates and decimals need the backend's conversion
+        convert = [
+            (i, field) for i, field in enumerate(fields)
+            if field.get_internal_type() in ('DateTimeField', 'DecimalField')
+        ]
+        if convert:
+            rows = [list(row) for row in rows]
+            for row in rows:
+                for i, field in convert:
+                    row[i] = field.get_db_prep_save(row[i], connection)
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+    def customers(self, rng, first_id):
+        start = self.end - timedelta(days=self.days * 2)
+        for i in range(self.scale.customers):
+            created = start + timedelta(seconds=rng.uniform(0, self.days * 86400))
+            phone = f"+1{rng.randrange(10**9, 10**10)}" if rng.random() < 0.6 else None
+            name = f"{_name(rng, 2)} {_name(rng, 3)}"
+            # Unique per seed and index, whatever ids the rows get
+            email = f"{name.split()[0].lower()}.{self.seed}.{i + 1}@example.com"
+            yield (first_id + i, name, email, phone, created, created)
+
+    def products(self, rng, first_id):
+        for i in range(self.scale.products):
+            price = Decimal(str(round(rng.lognormvariate(3.5, 1.0)))) + Decimal('0.99')
+            created = self.end - timedelta(days=self.days * 2)
+            name = f"{rng.choice(PRODUCT_WORDS)} {''.join(rng.choices(string.ascii_uppercase, k=2))}-{i + 1}"
+            yield (first_id + i, name, price, rng.randrange(0, 500), created, created)
+
+    def orders(self, rng, first_order_id, first_item_id, customer_ids, products):
+        """Yield ``(order_rows, item_rows)`` chunks"""
+        product_ids = [pk for pk, _ in products]
+        prices = dict(products)
+        # Popularity rank is a random permutation so ids carry no signal
+        ranked = product_ids[:]
+        rng.shuffle(ranked)
+        product_weights = list(accumulate(1 / (rank + 1) ** ZIPF_EXPONENT for rank in range(len(ranked))))
+        customer_weights = list(accumulate(rng.lognormvariate(0, ACTIVITY_SIGMA) for _ in customer_ids))
+        top_product, top_customer = product_weights[-1], customer_weights[-1]
+
+        start = self.end - timedelta(days=self.days)
+        step = self.days * 86400 / self.scale.orders
+        item_id = first_item_id
+        orders, items = [], []
+        for i in range(self.scale.orders):
+            order_id = first_order_id + i
+            order_date = start + timedelta(seconds=(i + rng.random()) * step)
+            customer_id = customer_ids[bisect(customer_weights, rng.random() * top_customer)]
+            size = min(_geometric(rng, 0.45, MAX_ORDER_SIZE), len(ranked))
+            chosen = set()
+            while len(chosen) < size:
+                chosen.add(ranked[bisect(product_weights, rng.random() * top_product)])
+            total = Decimal('0.00')
+            for product_id in sorted(chosen):
+                quantity = _geometric(rng, 0.7, 10)
+                total += prices[product_id] * quantity
+                items.append((item_id, order_id, product_id, quantity))
+                item_id += 1
+            orders.append((order_id, customer_id, total, order_date, order_date, order_date))
+            if len(orders) >= self.chunk_size:
+                yield orders, items
+                orders, items = [], []
+        if orders:
+            yield orders, items
+
+    def run(self, on_progress=None):
+        """Insert the dataset and return the number of rows per model"""
+        rng = random.Random(self.seed)
+        report = on_progress or (lambda model, count: None)
+        counts = {}
+
+        first = self._next_id(Customer)
+        rows = list(self.customers(rng, first))
+        for start in range(0, len(rows), self.chunk_size):
+            with transaction.atomic(using=self.using):
+                self._insert(Customer, ['id', 'name', 'email', 'phone', 'created_at', 'updated_at'],
+                             rows[start:start + self.chunk_size])
+            report('customers', min(start + self.chunk_size, len(rows)))
+        customer_ids = [row[0] for row in rows]
+        counts['customers'] = len(rows)
+
+        first = self._next_id(Product)
+        rows = list(self.products(rng, first))
+        with transaction.atomic(using=self.using):
+            self._insert(Product, ['id', 'name', 'price', 'stock', 'created_at', 'updated_at'], rows)
+        products = [(row[0], row[2]) for row in rows]
+        counts['products'] = len(rows)
+        del rows
+
+        counts['orders'] = counts['items'] = 0
+        chunks = self.orders(rng, self._next_id(Order), self._next_id(OrderItem), customer_ids, products)
+        for orders, items in chunks:
+            with transaction.atomic(using=self.using):
+                self._insert(Order, ['id', 'customer', 'total_amount', 'order_date', 'created_at', 'updated_at'], orders)
+                self._insert(OrderItem, ['id', 'order', 'product', 'quantity'], items)
+            counts['orders'] += len(orders)
+            counts['items'] += len(items)
+            report('orders', counts['orders'])
+
+        connection = connections[self.using]
+        statements = connection.ops.sequence_reset_sql(no_style(), [Customer, Product, Order, OrderItem])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+        rebuild_index(self.using)
+        rebuild_rollups(self.using)
+        invalidate(Customer, Product, Order, OrderItem)
+        return counts
+
+
+def generate(size='10k', seed=0, using='default', on_progress=None, **options):
+    """Insert a ``SIZES[size]`` (or ``Scale``) dataset; see ``Generator``"""
+    scale = SIZES[size] if isinstance(size, str) else size
+    return Generator(scale, seed=seed, using=using, **options).run(on_progress)
@@ -1,3 +1,2047 @@
-from django.test import TestCase
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import CommandError, call_command
+
+from django.db import connection, connections
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphql import parse, subscribe
+from graphql_relay import from_global_id
+
+from alx_backend_graphql_crm.schema import schema
+from .checkpoint import Checkpoint
+from .bulk import DEFAULT_BATCH_SIZE
+from .cleanup import clean_inactive_customers as clean_customers_in_batches, inactive_customers
+from .analytics import rebuild_rollups
+from .cost import analyze_query_cost
+from .database import ReplicaRouter
+from .loaders import LoaderRegistry
+from .metrics import REGISTRY
+from .models import Customer, CustomerSales, DailySales, Product, ProductSales, Order, OrderItem, SentReminder
+from .persisted import DocumentCache, get_persisted_queries, query_hash, reset_persisted_queries
+from .pubsub import ORDER_CREATED, STOCK_CHANGED, Broker, get_broker, reset_broker
+from .jobs import clean_inactive_customers, log_crm_heartbeat, send_order_reminders, update_low_stock
+from .reminders import EmailSink, ReminderSink, pending_orders, send_order_reminders as send_reminder_digests
+from .response_cache import FileBackend, LocMemBackend, ResponseCache, get_response_cache, reset_response_cache
+from .scheduler import CronExpression, Job, JobLock, Scheduler
+from .stock import restock_low_stock
+from .synthetic import Scale, generate
+from .totals import recompute_totals
+from .tracing import operation_label
+from .websocket import GraphQLWebSocket, route_websockets
+
+
+ORDERS_QUERY = """
+query ($first: Int) {
+  allOrders(first: $first) {
+    edges {
+      node {
+        id
+        customer { name orders { edges { node { id } } } }
+        products { edges { node { name orders { edges { node { id } } } } } }
+      }
+    }
+  }
+}
+"""
+
+
+def create_orders(count):
+    products = [
+        Product.objects.create(name=f"Product {i}", price=Decimal("10.00"), stock=5)
+        for i in range(3)
+    ]
+    for i in range(count):
+        customer = Customer.objects.create(name=f"Customer {i}", email=f"customer{i}@example.com")
+        order = Order.objects.create(customer=customer)
+        order.products.set(products[: i % 3 + 1])
+
+
+class DataLoaderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_orders(30)
+
+    def execute(self, query, **variables):
+        request = RequestFactory().post('/graphql')
+        with CaptureQueriesContext(connection) as ctx:
+            result = schema.execute(query, variables=variables, context_value=request)
+        self.assertIsNone(result.errors)
+        return result, len(ctx.captured_queries)
+
+    def test_query_count_is_constant_across_page_sizes(self):
+        small, small_count = self.execute(ORDERS_QUERY, first=5)
+        large, large_count = self.execute(ORDERS_QUERY, first=30)
+
+        self.assertEqual(len(small.data['allOrders']['edges']), 5)
+        self.assertEqual(len(large.data['allOrders']['edges']), 30)
+        self.assertEqual(small_count, large_count)
+
+    def test_batched_relations_match_database(self):
+        result, _ = self.execute(ORDERS_QUERY, first=30)
+        for edge in result.data['allOrders']['edges']:
+            node = edge['node']
+            order = Order.objects.get(customer__name=node['customer']['name'])
+            names = [e['node']['name'] for e in node['products']['edges']]
+            self.assertEqual(names, [p.name for p in order.products.all()])
+            self.assertEqual(len(node['customer']['orders']['edges']), 1)
+
+    def test_loader_cache_is_scoped_to_request(self):
+        request = RequestFactory().post('/graphql')
+        schema.execute(ORDERS_QUERY, variables={'first': 5}, context_value=request)
+        other = RequestFactory().post('/graphql')
+        schema.execute(ORDERS_QUERY, variables={'first': 5}, context_value=other)
+        self.assertIsNot(request.crm_loaders, other.crm_loaders)
+
+    def test_primed_siblings_load_in_one_query(self):
+        loaders = LoaderRegistry()
+        orders = list(Order.objects.all())
+        loaders.prime(orders)
+        with self.assertNumQueries(2):
+            customers = [loaders.order_customer.resolve(order) for order in orders]
+            products = [loaders.order_products.resolve(order) for order in orders]
+        self.assertEqual([c.pk for c in customers], [o.customer_id for o in orders])
+        self.assertEqual(
+            [[p.pk for p in group] for group in products],
+            [[p.pk for p in o.products.all()] for o in orders],
+        )
+
+
+class QueryOptimizerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_orders(10)
+
+    def execute(self, query, **variables):
+        request = RequestFactory().post('/graphql')
+        with CaptureQueriesContext(connection) as ctx:
+            result = schema.execute(query, variables=variables, context_value=request)
+        self.assertIsNone(result.errors)
+        return result, [q['sql'] for q in ctx.captured_queries]
+
+    def test_only_selected_columns_are_fetched(self):
+        _, queries = self.execute('{ allCustomers(first: 5) { edges { node { name } } } }')
+        page = queries[-1]
+        self.assertIn('"crm_customer"."name"', page)
+        self.assertNotIn('"crm_customer"."email"', page)
+
+    def test_customer_is_joined(self):
+        result, queries = self.execute(
+            '{ allOrders(first: 10) { edges { node { totalAmount customer { email } } } } }'
+        )
+        self.assertEqual(len(queries), 2)
+        self.assertIn('JOIN "crm_customer"', queries[-1])
+        self.assertNotIn('"crm_customer"."name"', queries[-1])
+        self.assertEqual(len(result.data['allOrders']['edges']), 10)
+
+    def test_nested_relations_are_prefetched(self):
+        result, queries = self.execute(ORDERS_QUERY, first=10)
+        self.assertEqual(len(queries), 5)
+        self.assertTrue(result.data['allOrders']['edges'][0]['node']['products']['edges'])
+
+    def test_single_object_resolver(self):
+        order = Order.objects.first()
+        result, queries = self.execute(
+            'query ($id: ID!) { order(id: $id) { totalAmount customer { name } } }',
+            id=order.pk,
+        )
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(result.data['order']['customer']['name'], order.customer.name)
+
+    def test_fragments_are_expanded(self):
+        result, queries = self.execute("""
+            { allProducts(first: 3) { edges { node { ...ProductFields } } } }
+            fragment ProductFields on ProductType { name orders { edges { node { id } } } }
+        """)
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(len(result.data['allProducts']['edges']), 3)
+
+
+KEYSET_ORDERS_QUERY = """
+query ($first: Int, $last: Int, $after: String, $before: String) {
+  allOrdersKeyset(first: $first, last: $last, after: $after, before: $before) {
+    pageInfo { startCursor endCursor hasNextPage hasPreviousPage }
+    edges { node { id totalAmount } }
+  }
+}
+"""
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_orders(10)
+        # Force ties on the leading sort column so the id tiebreaker matters
+        Order.objects.filter(pk__in=Order.objects.order_by('pk')[:4].values('pk')).update(
+            order_date=Order.objects.order_by('pk').first().order_date
+        )
+
+    def execute(self, query, **variables):
+        request = RequestFactory().post('/graphql')
+        with CaptureQueriesContext(connection) as ctx:
+            result = schema.execute(query, variables=variables, context_value=request)
+        return result, len(ctx.captured_queries)
+
+    def node_ids(self, result):
+        return [
+            int(from_global_id(edge['node']['id'])[1])
+            for edge in result.data['allOrdersKeyset']['edges']
+        ]
+
+    def test_forward_pages_follow_sort_key(self):
+        expected = list(Order.objects.order_by('-order_date', '-id').values_list('pk', flat=True))
+        seen, after = [], None
+        while True:
+            result, queries = self.execute(KEYSET_ORDERS_QUERY, first=3, after=after)
+            self.assertIsNone(result.errors)
+            self.assertEqual(queries, 1)
+            seen.extend(self.node_ids(result))
+            page_info = result.data['allOrdersKeyset']['pageInfo']
+            if not page_info['hasNextPage']:
+                break
+            after = page_info['endCursor']
+        self.assertEqual(seen, expected)
+
+    def test_backward_pages(self):
+        expected = list(Order.objects.order_by('-order_date', '-id').values_list('pk', flat=True))
+        result, _ = self.execute(KEYSET_ORDERS_QUERY, last=3)
+        self.assertEqual(self.node_ids(result), expected[-3:])
+        self.assertTrue(result.data['allOrdersKeyset']['pageInfo']['hasPreviousPage'])
+
+        before = result.data['allOrdersKeyset']['pageInfo']['startCursor']
+        result, _ = self.execute(KEYSET_ORDERS_QUERY, last=3, before=before)
+        self.assertEqual(self.node_ids(result), expected[-6:-3])
+
+    def test_total_count_is_lazy(self):
+        _, without_count = self.execute(KEYSET_ORDERS_QUERY, first=3)
+        result, with_count = self.execute('{ allOrdersKeyset(first: 3) { totalCount } }')
+        self.assertEqual(result.data['allOrdersKeyset']['totalCount'], 10)
+        self.assertEqual(with_count, without_count + 1)
+
+    def test_invalid_cursor_is_rejected(self):
+        result, _ = self.execute(KEYSET_ORDERS_QUERY, first=3, after='not-a-cursor')
+        self.assertIn('Invalid cursor', result.errors[0].message)
+
+    def test_customers_are_paged_by_name(self):
+        result, _ = self.execute(
+            '{ allCustomersKeyset(first: 4, name: "Customer") { edges { node { name } } } }'
+        )
+        names = [edge['node']['name'] for edge in result.data['allCustomersKeyset']['edges']]
+        self.assertEqual(names, sorted(Customer.objects.values_list('name', flat=True))[:4])
+
+
+class OrderTotalTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Alice", email="alice@example.com")
+        self.laptop = Product.objects.create(name="Laptop", price=Decimal("999.99"), stock=5)
+        self.mouse = Product.objects.create(name="Mouse", price=Decimal("29.99"), stock=5)
+        self.order = Order.objects.create(customer=self.customer)
+
+    def total(self):
+        return Order.objects.values_list('total_amount', flat=True).get(pk=self.order.pk)
+
+    def test_adding_and_removing_products_updates_total(self):
+        self.order.products.add(self.laptop, self.mouse)
+        self.assertEqual(self.total(), Decimal("1029.98"))
+        self.order.products.remove(self.laptop)
+        self.assertEqual(self.total(), Decimal("29.99"))
+        self.order.products.clear()
+        self.assertEqual(self.total(), Decimal("0.00"))
+
+    def test_reverse_side_updates_total(self):
+        other = Order.objects.create(customer=self.customer)
+        self.laptop.orders.add(self.order, other)
+        self.assertEqual(self.total(), Decimal("999.99"))
+        self.laptop.orders.clear()
+        self.assertEqual(self.total(), Decimal("0.00"))
+
+    def test_each_change_is_one_update(self):
+        # INSERT of the through rows + one UPDATE of the total
+        with CaptureQueriesContext(connection) as ctx:
+            self.order.products.add(self.laptop, self.mouse)
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('SUM', updates[0]['sql'])
+
+    def test_plain_save_does_not_recompute(self):
+        self.order.products.add(self.laptop)
+        order = Order.objects.get(pk=self.order.pk)
+        with self.assertNumQueries(1):
+            order.save()
+
+    def test_recompute_command_repairs_drift(self):
+        self.order.products.add(self.laptop, self.mouse)
+        Order.objects.update(total_amount=Decimal("0.00"))
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('recompute_order_totals', stdout=StringIO())
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(self.total(), Decimal("1029.98"))
+
+    def test_create_order_mutation_reports_total(self):
+        result = schema.execute(
+            """
+            mutation ($customer: ID!, $products: [ID]!) {
+              createOrder(input: {customerId: $customer, productIds: $products}) {
+                order { totalAmount }
+                errors
+              }
+            }
+            """,
+            variables={'customer': self.customer.pk, 'products': [self.laptop.pk, self.mouse.pk]},
+            context_value=RequestFactory().post('/graphql'),
+        )
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data['createOrder']['order']['totalAmount'], '1029.98')
+        self.assertEqual(
+            Order.objects.exclude(pk=self.order.pk).get().total_amount, Decimal("1029.98")
+        )
+
+
+BULK_CUSTOMERS_MUTATION = """
+mutation ($input: [CustomerInput]!, $mode: BulkCreateMode, $batchSize: Int) {
+  bulkCreateCustomers(input: $input, mode: $mode, batchSize: $batchSize) {
+    customers { email }
+    errors
+  }
+}
+"""
+
+
+class BulkCreateCustomersTests(TestCase):
+    def setUp(self):
+        Customer.objects.create(name="Existing", email="taken@example.com")
+
+    def execute(self, rows, **variables):
+        with CaptureQueriesContext(connection) as ctx:
+            result = schema.execute(
+                BULK_CUSTOMERS_MUTATION,
+                variables={'input': rows, **variables},
+                context_value=RequestFactory().post('/graphql'),
+            )
+        self.assertIsNone(result.errors)
+        return result.data['bulkCreateCustomers'], len(ctx.captured_queries)
+
+    def test_partial_mode_keeps_per_row_errors(self):
+        data, _ = self.execute([
+            {'name': "A", 'email': "a@example.com", 'phone': "+1234567890"},
+            {'name': "B", 'email': "not-an-email"},
+            {'name': "C", 'email': "taken@example.com"},
+            {'name': "D", 'email': "d@example.com", 'phone': "12"},
+            {'name': "E", 'email': "a@example.com"},
+        ])
+        self.assertEqual([c['email'] for c in data['customers']], ["a@example.com"])
+        self.assertEqual(data['errors'], [
+            "Customer 2: Invalid email format",
+            "Customer 3: Email already exists",
+            "Customer 4: Invalid phone format",
+            "Customer 5: Duplicate email in input (same as customer 1)",
+        ])
+        self.assertEqual(Customer.objects.count(), 2)
+
+    def test_all_or_nothing_mode_creates_nothing_on_error(self):
+        data, _ = self.execute(
+            [{'name': "A", 'email': "a@example.com"}, {'name': "C", 'email': "taken@example.com"}],
+            mode='ALL_OR_NOTHING',
+        )
+        self.assertEqual(data['customers'], [])
+        self.assertEqual(data['errors'], ["Customer 2: Email already exists"])
+        self.assertEqual(Customer.objects.count(), 1)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        rows = [{'name': f"C{i}", 'email': f"c{i}@example.com"} for i in range(300)]
+        data, queries = self.execute(rows, batchSize=100)
+        self.assertEqual(len(data['customers']), 300)
+        self.assertEqual(data['errors'], [])
+        # probe + savepoints around three bulk INSERTs, independent of row count
+        self.assertLess(queries, 15)
+        self.assertEqual(Customer.objects.count(), 301)
+
+
+class ImportCommandTests(TestCase):
+    def write(self, name, text):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w') as handle:
+            handle.write(text)
+        return path
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def run_import(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('crm_import', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_customers_csv_reuses_mutation_rules(self):
+        Customer.objects.create(name="Existing", email="taken@example.com")
+        path = self.write('customers.csv', (
+            "name,email,phone\n"
+            "Alice,alice@example.com,+1234567890\n"
+            "Bob,not-an-email,\n"
+            "Carol,taken@example.com,\n"
+            "Dan,dan@example.com,12\n"
+            "Alice Again,alice@example.com,\n"
+            ",nameless@example.com,\n"
+        ))
+        out, err = self.run_import('customers', path, '--batch-size', '2')
+        self.assertEqual(
+            sorted(Customer.objects.values_list('email', flat=True)),
+            ["alice@example.com", "taken@example.com"],
+        )
+        self.assertIn("line 3: Invalid email format", err)
+        self.assertIn("line 4: Email already exists", err)
+        self.assertIn("line 5: Invalid phone format", err)
+        # Duplicate of a row committed by an earlier chunk
+        self.assertIn("line 6: Email already exists", err)
+        self.assertIn("line 7: Name is required", err)
+        self.assertIn("Imported 1 customers (5 skipped)", out)
+        self.assertIn("rows/s", out)
+
+    def test_products_and_orders_jsonl(self):
+        Customer.objects.create(name="Alice", email="alice@example.com")
+        products = self.write('products.jsonl', "\n".join(json.dumps(row) for row in [
+            {'name': "Laptop", 'price': "999.99", 'stock': 3},
+            {'name': "Mouse", 'price': "29.99"},
+            {'name': "Broken", 'price': "-1"},
+        ]) + "\n{not json\n123\n[1]\n" + json.dumps({'name': "Cable", 'price': "5.00"}) + "\n")
+        _, err = self.run_import('products', products)
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertIn("line 3: Price must be positive", err)
+        self.assertIn("line 4: Invalid JSON", err)
+        self.assertIn("line 5: Expected a JSON object", err)
+        self.assertIn("line 6: Expected a JSON object", err)
+
+        orders = self.write('orders.jsonl', "\n".join(json.dumps(row) for row in [
+            {'customer_email': "alice@example.com", 'product_names': ["Laptop", "Mouse"],
+             'order_date': "2024-01-02T03:04:05+00:00"},
+            {'customer_email': "alice@example.com", 'product_names': "Mouse"},
+            {'customer_email': "nobody@example.com", 'product_names': ["Mouse"]},
+            {'customer_email': "alice@example.com", 'product_names': ["Tablet"]},
+        ]))
+        out, err = self.run_import('orders', orders, '--batch-size', '3')
+        self.assertIn("Imported 2 orders (2 skipped)", out)
+        self.assertIn("line 3: Unknown customer email: nobody@example.com", err)
+        self.assertIn("line 4: Unknown product names: Tablet", err)
+
+        first, second = Order.objects.order_by('pk')
+        self.assertEqual(first.total_amount, Decimal("1029.98"))
+        self.assertEqual(first.order_date.year, 2024)
+        self.assertEqual(second.total_amount, Decimal("29.99"))
+        self.assertEqual(list(second.products.values_list('name', flat=True)), ["Mouse"])
+
+    def test_products_with_unstorable_prices(self):
+        path = self.write('products.csv', (
+            "name,price,stock\n"
+            "Ghost,NaN,1\n"
+            "Signal,sNaN,1\n"
+            "Endless,Infinity,1\n"
+            "Precise,1.234,1\n"
+            "Huge,123456789012,1\n"
+            "Cable,5.00,1\n"
+        ))
+        out, err = self.run_import('products', path)
+        self.assertEqual(list(Product.objects.values_list('name', flat=True)), ["Cable"])
+        for line in range(2, 7):
+            self.assertIn(f"line {line}: Invalid price", err)
+        self.assertIn("Imported 1 products (5 skipped)", out)
+
+
+class ExportOrdersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_orders(10)
+
+    def stream(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_export_includes_email_and_products(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/export/orders', {'chunk_size': 4})
+            lines = self.stream(response).splitlines()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(lines), 10)
+        # One orders query plus one product-id query per chunk of 4
+        self.assertEqual(len(ctx.captured_queries), 4)
+
+        row = json.loads(lines[0])
+        order = Order.objects.order_by('-order_date', '-id').first()
+        self.assertEqual(row['id'], order.pk)
+        self.assertEqual(row['customer_email'], order.customer.email)
+        self.assertEqual(row['product_ids'], sorted(p.pk for p in order.products.all()))
+
+    def test_csv_export_applies_order_filter(self):
+        response = self.client.get('/export/orders', {'format': 'csv', 'customer_name': 'Customer 3'})
+        lines = self.stream(response).splitlines()
+        self.assertEqual(lines[0], 'id,order_date,total_amount,customer_id,customer_email,product_ids')
+        self.assertEqual(len(lines), 2)
+        self.assertIn('customer3@example.com', lines[1])
+
+    def test_invalid_arguments_are_rejected(self):
+        self.assertEqual(self.client.get('/export/orders', {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/export/orders', {'total_amount_gte': 'x'}).status_code, 400)
+        self.assertEqual(self.client.post('/export/orders').status_code, 405)
+
+
+CREATE_ORDER_MUTATION = """
+mutation ($customer: ID!, $products: [ID]!, $quantities: [Int]) {
+  createOrder(input: {customerId: $customer, productIds: $products, quantities: $quantities}) {
+    order { totalAmount items { product { name } quantity } }
+    errors
+  }
+}
+"""
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Alice", email="alice@example.com")
+        self.laptop = Product.objects.create(name="Laptop", price=Decimal("999.99"), stock=2)
+        self.mouse = Product.objects.create(name="Mouse", price=Decimal("29.99"), stock=10)
+
+    def create_order(self, products, quantities=None):
+        result = schema.execute(
+            CREATE_ORDER_MUTATION,
+            variables={
+                'customer': self.customer.pk,
+                'products': [p.pk for p in products],
+                'quantities': quantities,
+            },
+            context_value=RequestFactory().post('/graphql'),
+        )
+        self.assertIsNone(result.errors)
+        return result.data['createOrder']
+
+    def stock(self):
+        return dict(Product.objects.values_list('name', 'stock'))
+
+    def test_quantities_are_reserved_and_totalled(self):
+        data = self.create_order([self.laptop, self.mouse], [2, 3])
+        self.assertIsNone(data['errors'])
+        self.assertEqual(data['order']['totalAmount'], '2089.95')
+        self.assertEqual(
+            sorted((item['product']['name'], item['quantity']) for item in data['order']['items']),
+            [("Laptop", 2), ("Mouse", 3)],
+        )
+        self.assertEqual(self.stock(), {"Laptop": 0, "Mouse": 7})
+
+    def test_insufficient_stock_rolls_back_every_product(self):
+        data = self.create_order([self.mouse, self.laptop], [1, 3])
+        self.assertEqual(data['errors'], ["Insufficient stock for: Laptop"])
+        self.assertIsNone(data['order'])
+        self.assertEqual(self.stock(), {"Laptop": 2, "Mouse": 10})
+        self.assertFalse(Order.objects.exists())
+
+    def test_last_unit_cannot_be_sold_twice(self):
+        self.assertIsNone(self.create_order([self.laptop], [2])['errors'])
+        self.assertEqual(self.create_order([self.laptop])['errors'], ["Insufficient stock for: Laptop"])
+        self.assertEqual(self.stock()["Laptop"], 0)
+
+    def test_quantities_must_match_products(self):
+        data = self.create_order([self.laptop, self.mouse], [1])
+        self.assertEqual(data['errors'], ["Quantities must match product IDs"])
+        data = self.create_order([self.laptop], [0])
+        self.assertEqual(data['errors'], ["Quantities must be positive"])
+
+
+BULK_ORDERS_MUTATION = """
+mutation ($input: [OrderInput]!, $mode: BulkCreateMode) {
+  bulkCreateOrders(input: $input, mode: $mode) { orders { id totalAmount orderDate } errors }
+}
+"""
+
+
+class BulkCreateOrdersTests(TestCase):
+    def setUp(self):
+        self.alice = Customer.objects.create(name="Alice", email="alice@example.com")
+        self.bob = Customer.objects.create(name="Bob", email="bob@example.com")
+        self.laptop = Product.objects.create(name="Laptop", price=Decimal("999.99"), stock=2)
+        self.mouse = Product.objects.create(name="Mouse", price=Decimal("29.99"), stock=100)
+
+    def execute(self, rows, **variables):
+        with CaptureQueriesContext(connection) as ctx:
+            result = schema.execute(
+                BULK_ORDERS_MUTATION,
+                variables={'input': rows, **variables},
+                context_value=RequestFactory().post('/graphql'),
+            )
+        self.assertIsNone(result.errors)
+        # Savepoints depend on the transaction the caller is in, not on the batch
+        statements = [query for query in ctx.captured_queries if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        return result.data['bulkCreateOrders'], len(statements)
+
+    def row(self, customer, products, quantities=None, **extra):
+        return {'customerId': customer.pk, 'productIds': [p.pk for p in products], 'quantities': quantities, **extra}
+
+    def test_partial_mode_creates_valid_orders_and_reports_the_rest(self):
+        data, _ = self.execute([
+            self.row(self.alice, [self.laptop, self.mouse], [1, 2]),
+            {'customerId': 999, 'productIds': [self.mouse.pk]},
+            {'customerId': self.bob.pk, 'productIds': [self.mouse.pk, 999]},
+            self.row(self.bob, [self.laptop], [2]),
+            self.row(self.bob, [self.mouse], [0]),
+            self.row(self.bob, [self.mouse], orderDate="2025-03-01T10:00:00+00:00"),
+        ])
+        self.assertEqual(data['errors'], [
+            "Order 2: Invalid customer ID",
+            "Order 3: One or more invalid product IDs",
+            "Order 4: Insufficient stock for: Laptop",
+            "Order 5: Quantities must be positive",
+        ])
+        self.assertEqual([order['totalAmount'] for order in data['orders']], ['1059.97', '29.99'])
+        self.assertEqual(data['orders'][1]['orderDate'], "2025-03-01T10:00:00+00:00")
+        self.assertEqual(dict(Product.objects.values_list('name', 'stock')), {"Laptop": 1, "Mouse": 97})
+        self.assertEqual(
+            dict(CustomerSales.objects.values_list('customer__name', 'orders')), {"Alice": 1, "Bob": 1}
+        )
+        self.assertEqual(ProductSales.objects.get(pk=self.mouse.pk).units, 3)
+
+        # The rollups added from Python match a rebuild from the orders
+        def rollups():
+            return [
+                list(DailySales.objects.order_by('date').values('date', 'orders', 'units', 'revenue')),
+                list(ProductSales.objects.order_by('pk').values()),
+                list(CustomerSales.objects.order_by('pk').values()),
+            ]
+
+        added = rollups()
+        rebuild_rollups()
+        self.assertEqual(added, rollups())
+
+    def test_all_or_nothing_mode_creates_nothing_on_error(self):
+        data, _ = self.execute(
+            [self.row(self.alice, [self.mouse]), self.row(self.bob, [self.laptop], [3])],
+            mode='ALL_OR_NOTHING',
+        )
+        self.assertEqual(data, {'orders': [], 'errors': ["Order 2: Insufficient stock for: Laptop"]})
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.mouse.pk).stock, 100)
+
+    def test_query_count_does_not_grow_with_orders(self):
+        _, few = self.execute([self.row(self.alice, [self.mouse])] * 2)
+        customers = Customer.objects.bulk_create(
+            Customer(name=f"C{i}", email=f"c{i}@example.com") for i in range(40)
+        )
+        products = Product.objects.bulk_create(
+            Product(name=f"P{i}", price=Decimal("1.00"), stock=10) for i in range(40)
+        )
+        data, many = self.execute([
+            self.row(customer, [product, self.mouse]) for customer, product in zip(customers, products)
+        ])
+        self.assertEqual(data['errors'], [])
+        self.assertEqual(len(data['orders']), 40)
+        self.assertEqual(many, few)
+        self.assertEqual(many, 8)
+        self.assertEqual(ProductSales.objects.get(pk=self.mouse.pk).units, 42)
+        self.assertEqual(DailySales.objects.get().orders, 42)
+
+    def test_batches_larger_than_the_default_batch_size(self):
+        Product.objects.filter(pk=self.mouse.pk).update(stock=1000)
+        rows = [self.row(self.alice, [self.mouse])] * (DEFAULT_BATCH_SIZE + 100)
+        data, queries = self.execute(rows)
+        self.assertLess(queries, 10)
+        self.assertEqual(data['errors'], [])
+        self.assertEqual(Order.objects.count(), DEFAULT_BATCH_SIZE + 100)
+
+
+SALES_QUERY = """
+query ($from: Date!, $to: Date!, $customer: ID!) {
+  salesByDay(from: $from, to: $to) { date orders units revenue }
+  topProducts(limit: 2) { product { name } orders units revenue }
+  customerLifetimeValue(id: $customer) { customer { name } orders revenue firstOrder lastOrder }
+}
+"""
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.alice = Customer.objects.create(name="Alice", email="alice@example.com")
+        self.bob = Customer.objects.create(name="Bob", email="bob@example.com")
+        self.laptop = Product.objects.create(name="Laptop", price=Decimal("1000.00"), stock=10)
+        self.mouse = Product.objects.create(name="Mouse", price=Decimal("20.00"), stock=100)
+        self.cable = Product.objects.create(name="Cable", price=Decimal("5.00"), stock=100)
+
+    def create_order(self, customer, products, quantities):
+        result = schema.execute(
+            CREATE_ORDER_MUTATION,
+            variables={'customer': customer.pk, 'products': [p.pk for p in products], 'quantities': quantities},
+            context_value=RequestFactory().post('/graphql'),
+        )
+        self.assertIsNone(result.errors)
+        self.assertIsNone(result.data['createOrder']['errors'])
+        return Order.objects.latest('pk')
+
+    def snapshot(self):
+        return (
+            sorted(DailySales.objects.values_list('date', 'orders', 'units', 'revenue')),
+            sorted(ProductSales.objects.values_list('product_id', 'orders', 'units', 'revenue')),
+            sorted(CustomerSales.objects.values_list('customer_id', 'orders', 'revenue', 'first_order', 'last_order')),
+        )
+
+    def assert_matches_rebuild(self):
+        incremental = self.snapshot()
+        rebuild_rollups()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_created_orders_are_added(self):
+        first = self.create_order(self.alice, [self.laptop, self.mouse], [1, 2])
+        self.create_order(self.alice, [self.mouse], [1])
+        self.create_order(self.bob, [self.cable], [4])
+        Order.objects.filter(pk=first.pk).update(order_date=first.order_date - timedelta(days=1))
+        rebuild_rollups()
+        self.create_order(self.bob, [self.mouse], [3])
+
+        today = timezone.localdate()
+        self.assertEqual(
+            list(DailySales.objects.order_by('date').values_list('date', 'orders', 'units', 'revenue')),
+            [(today - timedelta(days=1), 1, 3, Decimal("1040.00")), (today, 3, 8, Decimal("100.00"))],
+        )
+        mouse = ProductSales.objects.get(pk=self.mouse.pk)
+        self.assertEqual((mouse.orders, mouse.units, mouse.revenue), (3, 6, Decimal("120.00")))
+        bob = CustomerSales.objects.get(pk=self.bob.pk)
+        self.assertEqual((bob.orders, bob.revenue), (2, Decimal("80.00")))
+        self.assert_matches_rebuild()
+
+    def test_item_changes_and_deletions_refresh_the_rollups(self):
+        order = self.create_order(self.alice, [self.laptop], [1])
+        other = self.create_order(self.bob, [self.mouse, self.cable], [1, 1])
+        order.products.add(self.mouse, through_defaults={'quantity': 2})
+        self.assert_matches_rebuild()
+        self.assertEqual(CustomerSales.objects.get(pk=self.alice.pk).revenue, Decimal("1040.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cable.orders.clear()
+        self.assert_matches_rebuild()
+        self.assertFalse(ProductSales.objects.filter(pk=self.cable.pk).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assert_matches_rebuild()
+        self.assertFalse(CustomerSales.objects.filter(pk=self.bob.pk).exists())
+        self.assertEqual(ProductSales.objects.get(pk=self.mouse.pk).orders, 1)
+
+    def test_admin_reassigning_an_order_refreshes_the_previous_keys(self):
+        order = self.create_order(self.alice, [self.laptop], [1])
+        yesterday = order.order_date - timedelta(days=1)
+        Order.objects.filter(pk=order.pk).update(order_date=yesterday)
+        rebuild_rollups()
+        order.refresh_from_db()
+
+        model_admin = admin.site._registry[Order]
+        request = RequestFactory().post('/admin/crm/order/')
+        request.user = get_user_model()(is_active=True, is_superuser=True)
+        form = model_admin.get_form(request, order, change=True)({'customer': self.bob.pk}, instance=order)
+        self.assertTrue(form.is_valid(), form.errors)
+        # A date the form cannot edit, moved by the same save
+        order = form.save(commit=False)
+        order.order_date = order.order_date + timedelta(days=1)
+        model_admin.save_model(request, order, form, change=True)
+        model_admin.save_related(request, form, [], change=True)
+
+        self.assertFalse(CustomerSales.objects.filter(pk=self.alice.pk).exists())
+        self.assertEqual(CustomerSales.objects.get(pk=self.bob.pk).orders, 1)
+        self.assertFalse(DailySales.objects.filter(date=timezone.localdate(yesterday)).exists())
+        self.assert_matches_rebuild()
+
+    def test_graphql_fields_read_only_the_rollups(self):
+        self.create_order(self.alice, [self.laptop, self.mouse], [1, 2])
+        self.create_order(self.bob, [self.cable], [4])
+        today = timezone.localdate()
+        variables = {'from': str(today - timedelta(days=7)), 'to': str(today), 'customer': self.alice.pk}
+        with CaptureQueriesContext(connection) as queries:
+            result = schema.execute(SALES_QUERY, variables=variables, context_value=RequestFactory().post('/graphql'))
+        self.assertIsNone(result.errors)
+        self.assertLessEqual(len(queries), 3)
+        self.assertNotIn('crm_order"', ' '.join(query['sql'] for query in queries))
+        self.assertEqual(result.data['salesByDay'], [{'date': str(today), 'orders': 2, 'units': 7, 'revenue': '1060.00'}])
+        self.assertEqual(
+            [(row['product']['name'], row['revenue']) for row in result.data['topProducts']],
+            [("Laptop", '1000.00'), ("Mouse", '40.00')],
+        )
+        self.assertEqual(result.data['customerLifetimeValue']['orders'], 1)
+        self.assertEqual(result.data['customerLifetimeValue']['customer']['name'], "Alice")
+
+        variables.update({'from': str(today), 'to': str(today - timedelta(days=1))})
+        result = schema.execute(SALES_QUERY, variables=variables, context_value=RequestFactory().post('/graphql'))
+        self.assertEqual(result.errors[0].message, "'from' must not be after 'to'")
+
+
+LOW_STOCK_MUTATION = """
+mutation ($threshold: Int, $increment: Int, $limit: Int) {
+  updateLowStockProducts(threshold: $threshold, increment: $increment, limit: $limit) {
+    success
+    updated
+    products { name stock price updatedAt }
+    errors
+  }
+}
+"""
+
+
+class UpdateLowStockProductsTests(TestCase):
+    def setUp(self):
+        for name, stock in [("A", 0), ("B", 3), ("C", 9), ("D", 10), ("E", 50)]:
+            Product.objects.create(name=name, price=Decimal("1.50"), stock=stock)
+
+    def execute(self, **variables):
+        with CaptureQueriesContext(connection) as ctx:
+            result = schema.execute(
+                LOW_STOCK_MUTATION, variables=variables,
+                context_value=RequestFactory().post('/graphql'),
+            )
+        self.assertIsNone(result.errors)
+        return result.data['updateLowStockProducts'], len(ctx.captured_queries)
+
+    def stock(self):
+        return dict(Product.objects.values_list('name', 'stock'))
+
+    def test_defaults_match_cron_job_shape(self):
+        data, queries = self.execute()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['updated'], ["A: 10", "B: 13", "C: 19"])
+        self.assertEqual(data['products'][0]['price'], '1.50')
+        self.assertEqual(queries, 1)
+        self.assertEqual(self.stock(), {"A": 10, "B": 13, "C": 19, "D": 10, "E": 50})
+
+    def test_threshold_increment_and_limit(self):
+        data, _ = self.execute(threshold=20, increment=5, limit=2)
+        self.assertEqual(data['updated'], ["A: 5", "B: 8"])
+        self.assertEqual(self.stock(), {"A": 5, "B": 8, "C": 9, "D": 10, "E": 50})
+
+    def test_fallback_without_returning(self):
+        with mock.patch('crm.stock.supports_update_returning', return_value=False):
+            data, queries = self.execute(limit=2)
+        self.assertEqual(data['updated'], ["A: 10", "B: 13"])
+        self.assertEqual(self.stock()["C"], 9)
+        # SAVEPOINT/RELEASE around the SELECT ... FOR UPDATE and the UPDATE
+        self.assertEqual(queries, 4)
+
+    def test_invalid_arguments(self):
+        data, _ = self.execute(increment=0)
+        self.assertFalse(data['success'])
+        self.assertEqual(data['errors'], ["Increment must be positive"])
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.alice = Customer.objects.create(name="Alice Johnson", email="alice@example.com", phone="+1234567890")
+        self.bob = Customer.objects.create(name="Bob Smith", email="bob@shop.org", phone="555-123-4567")
+        self.laptop = Product.objects.create(name="Gaming Laptop", price=Decimal("999.99"), stock=3)
+        self.mouse = Product.objects.create(name="Wireless Mouse", price=Decimal("19.99"), stock=30)
+
+    def names(self, query, variables):
+        result = schema.execute(query, variables=variables, context_value=RequestFactory().post('/graphql'))
+        self.assertIsNone(result.errors)
+        (connection_,) = result.data.values()
+        return sorted(edge['node']['name'] for edge in connection_['edges'])
+
+    def customers(self, **variables):
+        return self.names("""
+            query ($name: String, $email: String, $phonePattern: String) {
+              allCustomers(name: $name, email: $email, phonePattern: $phonePattern) { edges { node { name } } }
+            }
+        """, variables)
+
+    def test_contains_uses_search_table(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.customers(name="JOHN"), ["Alice Johnson"])
+        self.assertIn('crm_customer_search MATCH', ctx.captured_queries[-1]['sql'])
+        self.assertEqual(self.customers(email="shop.o"), ["Bob Smith"])
+        # Matches are per column
+        self.assertEqual(self.customers(name="example"), [])
+
+    def test_short_terms_fall_back_to_icontains(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.customers(name="ob"), ["Bob Smith"])
+        self.assertNotIn('MATCH', ctx.captured_queries[-1]['sql'])
+
+    def test_quotes_in_terms_are_literal(self):
+        Customer.objects.create(name='Dan "The Man"', email="dan@example.com")
+        self.assertEqual(self.customers(name='"The'), ['Dan "The Man"'])
+        self.assertEqual(self.customers(name='" OR "'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.alice.name = "Alicia Keys"
+        self.alice.save()
+        self.assertEqual(self.customers(name="john"), [])
+        self.assertEqual(self.customers(name="keys"), ["Alicia Keys"])
+        self.bob.delete()
+        self.assertEqual(self.customers(name="smith"), [])
+
+    def test_bulk_created_customers_are_indexed(self):
+        result = schema.execute(BULK_CUSTOMERS_MUTATION, variables={
+            'input': [{'name': "Carol Danvers", 'email': "carol@example.com"}],
+        })
+        self.assertIsNone(result.errors)
+        self.assertEqual(self.customers(name="danv"), ["Carol Danvers"])
+
+    def test_phone_prefix(self):
+        self.assertEqual(self.customers(phonePattern="+123"), ["Alice Johnson"])
+        self.assertEqual(self.customers(phonePattern="555-"), ["Bob Smith"])
+        self.assertEqual(self.customers(phonePattern="556"), [])
+
+    def test_order_filters(self):
+        order = Order.objects.create(customer=self.alice)
+        order.products.add(self.laptop, self.mouse)
+        Order.objects.create(customer=self.bob).products.add(self.mouse)
+        result = schema.execute("""
+            query ($customerName: String, $productName: String) {
+              allOrders(customerName: $customerName, productName: $productName) {
+                edges { node { customer { name } } }
+              }
+            }
+        """, variables={'customerName': "johnson", 'productName': "laptop"},
+            context_value=RequestFactory().post('/graphql'))
+        self.assertIsNone(result.errors)
+        edges = result.data['allOrders']['edges']
+        self.assertEqual([edge['node']['customer']['name'] for edge in edges], ["Alice Johnson"])
+
+    def test_product_name(self):
+        self.assertEqual(self.names("""
+            query ($name: String) { allProducts(name: $name) { edges { node { name } } } }
+        """, {'name': "less mo"}), ["Wireless Mouse"])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM crm_customer_search')
+        self.assertEqual(self.customers(name="alice"), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn("Indexed 2 customers, 2 products", out.getvalue())
+        self.assertEqual(self.customers(name="alice"), ["Alice Johnson"])
+
+
+class PersistedQueryTests(TestCase):
+    QUERY = '{ hello }'
+
+    def setUp(self):
+        reset_persisted_queries()
+        reset_response_cache()
+        self.addCleanup(reset_persisted_queries)
+        self.addCleanup(reset_response_cache)
+
+    def post(self, body):
+        return self.client.post('/graphql', body, content_type='application/json').json()
+
+    def persisted(self, query=None, sha=None):
+        body = {'extensions': {'persistedQuery': {'version': 1, 'sha256Hash': sha or query_hash(self.QUERY)}}}
+        if query:
+            body['query'] = query
+        return body
+
+    def test_hash_only_request_after_registration(self):
+        response = self.post(self.persisted())
+        self.assertEqual(response['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_NOT_FOUND')
+
+        self.assertEqual(self.post(self.persisted(self.QUERY))['data'], {'hello': 'Hello, GraphQL!'})
+        self.assertEqual(self.post(self.persisted())['data'], {'hello': 'Hello, GraphQL!'})
+
+        response = self.client.get('/graphql', {'extensions': json.dumps(self.persisted()['extensions'])},
+                                   HTTP_ACCEPT='application/json')
+        self.assertEqual(response.json()['data'], {'hello': 'Hello, GraphQL!'})
+
+    def test_plain_requests_skip_parse_and_validate_when_cached(self):
+        self.post({'query': self.QUERY})
+        with mock.patch('crm.persisted.parse') as parse, mock.patch('crm.persisted.validate') as validate:
+            self.assertEqual(self.post({'query': self.QUERY})['data'], {'hello': 'Hello, GraphQL!'})
+        parse.assert_not_called()
+        validate.assert_not_called()
+        self.assertEqual(get_persisted_queries().cache.stats()['hits'], 1)
+
+    def test_hash_mismatch(self):
+        response = self.post(self.persisted('{ __typename }'))
+        self.assertEqual(response['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_HASH_MISMATCH')
+
+    def test_malformed_persisted_query_is_a_bad_request(self):
+        for persisted in ({'version': 1}, 'abc', {'sha256Hash': 1}):
+            with self.subTest(persisted=persisted):
+                response = self.client.post('/graphql', {'extensions': {'persistedQuery': persisted}},
+                                            content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("sha256Hash", response.json()['errors'][0]['message'])
+
+    def test_invalid_documents_are_not_cached(self):
+        response = self.post({'query': '{ nope }'})
+        self.assertIn("Cannot query field 'nope'", response['errors'][0]['message'])
+        self.assertNotIn(query_hash('{ nope }'), get_persisted_queries().cache)
+
+    def test_lru_eviction(self):
+        cache = DocumentCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.stats(), {'size': 2, 'maxsize': 2, 'hits': 2, 'misses': 1, 'evictions': 1})
+
+    def test_allow_list_rejects_unknown_documents_unparsed(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.graphql', delete=False) as document:
+            document.write(self.QUERY)
+        manifest = document.name + '.json'
+        self.addCleanup(os.remove, document.name)
+        self.addCleanup(os.remove, manifest)
+        call_command('build_query_manifest', document.name, output=manifest, stdout=StringIO())
+
+        with self.settings(CRM_PERSISTED_QUERIES={'ALLOW_LIST': manifest}):
+            reset_persisted_queries()
+            self.assertEqual(self.post(self.persisted())['data'], {'hello': 'Hello, GraphQL!'})
+            self.assertEqual(self.post({'query': self.QUERY})['data'], {'hello': 'Hello, GraphQL!'})
+            with mock.patch('crm.persisted.parse') as parse:
+                response = self.post({'query': '{ __typename }'})
+            parse.assert_not_called()
+            self.assertEqual(response['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_NOT_ALLOWED')
+
+
+class QueryCostTests(TestCase):
+    def setUp(self):
+        reset_persisted_queries()
+        reset_response_cache()
+        self.addCleanup(reset_persisted_queries)
+        self.addCleanup(reset_response_cache)
+
+    def post(self, query, variables=None):
+        return self.client.post('/graphql', {'query': query, 'variables': variables or {}},
+                                content_type='application/json')
+
+    def cost(self, query, variables=None):
+        return analyze_query_cost(schema.graphql_schema, parse(query), variables=variables)
+
+    def test_connections_weighted_by_page_size_and_fan_out(self):
+        query = "query ($n: Int) { allCustomers(first: $n) { edges { node { name orders { edges { node { id } } } } } } }"
+        self.assertEqual(self.cost(query, {'n': 100}).cost, 1 + 100 * (1 + 1 + 20))
+        self.assertEqual(self.cost(query, {'n': 5}).cost, 1 + 5 * (1 + 1 + 20))
+        # Without first/last a connection costs its maximum page
+        self.assertEqual(self.cost("{ allProducts { totalCount pageInfo { hasNextPage } } }").cost, 1)
+        self.assertEqual(self.cost("{ allProducts { edges { node { name } } } }").cost, 1 + 100)
+
+    def test_fragments_spread_many_times_are_costed_once(self):
+        fragments = ["fragment F0 on Query { product(id: 1) { name } }"] + [
+            f"fragment F{i} on Query {{ {' '.join([f'...F{i - 1}'] * 5)} }}" for i in range(1, 16)
+        ]
+        started = time.perf_counter()
+        cost = self.cost("{ ...F15 } " + " ".join(fragments))
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual((cost.cost, cost.depth), (5 ** 15, 2))
+
+    def test_fragments_and_introspection(self):
+        query = """
+            { order(id: 1) { ...Parts ... on OrderType { customer { name } } } __schema { types { name } } }
+            fragment Parts on OrderType { products(first: 3) { edges { node { name } } } }
+        """
+        cost = self.cost(query)
+        self.assertEqual(cost.cost, 1 + 1 + 3 + 1)
+        self.assertEqual(cost.depth, 5)
+
+    def test_cost_reported_in_extensions(self):
+        response = self.post("{ allProducts(first: 10) { edges { node { name } } } }")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['extensions']['cost']['requested'], 11)
+
+    def test_expensive_cyclic_query_rejected_before_resolution(self):
+        query = """
+            { allCustomers(first: 100000) { edges { node { orders { edges { node {
+                products { edges { node { orders { edges { node { id } } } } } }
+            } } } } } } }
+        """
+        with mock.patch('crm.schema.optimize_queryset') as optimize, \
+                CaptureQueriesContext(connection) as ctx:
+            response = self.post(query)
+        optimize.assert_not_called()
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(response.status_code, 400)
+        body = response.json()
+        self.assertEqual(body['errors'][0]['extensions']['code'], 'QUERY_TOO_EXPENSIVE')
+        self.assertGreater(body['extensions']['cost']['requested'], 20000)
+
+    def test_depth_limit(self):
+        with self.settings(CRM_QUERY_COST={'MAX_DEPTH': 3}):
+            response = self.post("{ order(id: 1) { customer { orders { edges { node { id } } } } } }")
+        self.assertEqual(response.json()['errors'][0]['extensions']['code'], 'QUERY_TOO_DEEP')
+
+
+class TracingTests(TestCase):
+    QUERY = "query Dashboard { allOrders(first: 5) { edges { node { id customer { name } } } } }"
+
+    def setUp(self):
+        create_orders(3)
+        REGISTRY.clear()
+        reset_persisted_queries()
+        reset_response_cache()
+        self.addCleanup(reset_persisted_queries)
+        self.addCleanup(reset_response_cache)
+
+    def post(self, **headers):
+        response = self.client.post('/graphql', {'query': self.QUERY}, content_type='application/json', **headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_untraced_requests_have_no_tracing_extension(self):
+        self.assertNotIn('tracing', self.post()['extensions'])
+
+    def test_trace_header_reports_phases_fields_and_sql(self):
+        with CaptureQueriesContext(connection) as ctx:
+            tracing = self.post(HTTP_X_CRM_TRACE='1')['extensions']['tracing']
+        self.assertEqual(tracing['sql']['count'], len(ctx.captured_queries))
+        self.assertGreater(tracing['parsing']['duration'], 0)
+        self.assertGreater(tracing['execution']['duration'], 0)
+
+        resolvers = {tuple(r['path']): r for r in tracing['execution']['resolvers']}
+        root = resolvers[('allOrders',)]
+        self.assertEqual((root['parentType'], root['returnType']), ('Query', 'OrderTypeConnection'))
+        # count + page; customers come from the select_related join
+        self.assertEqual(root['sqlCount'], 2)
+        customer = resolvers[('allOrders', 'edges', 0, 'node', 'customer')]
+        self.assertEqual((customer['parentType'], customer['sqlCount']), ('OrderType', 0))
+        self.assertEqual(sum(r['sqlCount'] for r in resolvers.values()), tracing['sql']['count'])
+
+    def test_tracing_enabled_by_setting(self):
+        with self.settings(CRM_TRACING={'ENABLED': True}):
+            self.assertIn('tracing', self.post()['extensions'])
+
+    def test_metrics_endpoint(self):
+        self.post()
+        self.post(HTTP_X_CRM_TRACE='1')
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn(
+            'crm_graphql_request_duration_seconds_count{operation_type="query",operation_name="Dashboard"} 2', body
+        )
+        self.assertIn('crm_graphql_field_sql_queries_total{parent_type="Query",field="allOrders"} 4', body)
+        # Nested fields are only timed on traced requests
+        self.assertIn('crm_graphql_field_duration_seconds_count{parent_type="OrderType",field="customer"} 3', body)
+        self.assertIn('crm_graphql_phase_duration_seconds_count{phase="execute"} 2', body)
+        self.assertIn('crm_graphql_document_cache_hits_total', body)
+
+    @mock.patch('crm.tracing._operation_names', set())
+    def test_operation_name_labels_are_bounded(self):
+        with self.settings(CRM_TRACING={'MAX_OPERATION_NAMES': 2}):
+            self.assertEqual(
+                [operation_label(name) for name in ('A', 'B', 'C', 'A', None)], ['A', 'B', 'other', 'A', '']
+            )
+        get_persisted_queries().operation_names = {'Dashboard'}
+        self.addCleanup(reset_persisted_queries)
+        self.assertEqual([operation_label(name) for name in ('Dashboard', 'A')], ['Dashboard', 'other'])
+
+    def test_metrics_only_served_locally(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.7').status_code, 403)
+
+
+@override_settings(CRM_RESPONSE_CACHE={**settings.CRM_RESPONSE_CACHE, 'ENABLED': True})
+class ResponseCacheTests(TestCase):
+    PRODUCTS = "query ($low: Boolean) { allProducts(lowStock: $low) { edges { node { name stock } } } }"
+    CUSTOMERS = "{ allCustomers { edges { node { name } } } }"
+
+    def setUp(self):
+        reset_response_cache()
+        self.addCleanup(reset_response_cache)
+        self.customer = Customer.objects.create(name="Alice", email="alice@example.com")
+        self.product = Product.objects.create(name="Mouse", price=Decimal("20.00"), stock=5)
+
+    def post(self, query, variables=None):
+        response = self.client.post('/graphql', {'query': query, 'variables': variables or {}},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_repeated_query_is_served_from_cache(self):
+        first = self.post(self.PRODUCTS, {'low': True})
+        self.assertEqual(first['extensions']['responseCache'], 'miss')
+        with self.assertNumQueries(0):
+            second = self.post("query($low:Boolean){allProducts(lowStock:$low){edges{node{name stock}}}}", {'low': True})
+        self.assertEqual(second['extensions']['responseCache'], 'hit')
+        self.assertEqual(second['data'], first['data'])
+        self.assertEqual(self.post(self.PRODUCTS, {'low': False})['extensions']['responseCache'], 'miss')
+        self.assertEqual(get_response_cache().stats()['hits'], 1)
+
+    def test_saves_invalidate_only_queries_reading_the_model(self):
+        self.post(self.PRODUCTS)
+        self.post(self.CUSTOMERS)
+        self.product.stock = 50
+        self.product.save()
+        data = self.post(self.PRODUCTS)
+        self.assertEqual(data['extensions']['responseCache'], 'miss')
+        self.assertEqual(data['data']['allProducts']['edges'][0]['node']['stock'], 50)
+        self.assertEqual(self.post(self.CUSTOMERS)['extensions']['responseCache'], 'hit')
+        self.customer.delete()
+        self.assertEqual(self.post(self.CUSTOMERS)['data']['allCustomers']['edges'], [])
+
+    def test_stock_reservation_invalidates_products(self):
+        self.post(self.PRODUCTS, {'low': True})
+        result = self.post(CREATE_ORDER_MUTATION, {
+            'customer': str(self.customer.pk), 'products': [str(self.product.pk)], 'quantities': [2],
+        })
+        self.assertEqual(result['data']['createOrder']['errors'], None)
+        self.assertNotIn('responseCache', result['extensions'])
+        data = self.post(self.PRODUCTS, {'low': True})
+        self.assertEqual(data['extensions']['responseCache'], 'miss')
+        self.assertEqual(data['data']['allProducts']['edges'][0]['node']['stock'], 3)
+
+    def test_order_items_invalidate_order_queries(self):
+        order = Order.objects.create(customer=self.customer)
+        query = "{ allOrders { edges { node { totalAmount products { edges { node { name } } } } } } }"
+        self.post(query)
+        order.products.add(self.product)
+        node = self.post(query)['data']['allOrders']['edges'][0]['node']
+        self.assertEqual((node['totalAmount'], len(node['products']['edges'])), ('20.00', 1))
+
+    def test_entries_written_after_a_concurrent_write_are_dropped(self):
+        cache = ResponseCache(LocMemBackend())
+        versions = cache.versions()
+        cache.invalidate(['crm.product'])
+        cache.set('key', {'stale': True}, {'crm.product'}, versions)
+        self.assertIsNone(cache.get('key'))
+
+    def test_file_backend_is_shared_between_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            writer = ResponseCache(FileBackend(directory))
+            reader = ResponseCache(FileBackend(directory))
+            writer.set('key', {'a': 1}, {'crm.order'}, writer.versions())
+            self.assertEqual(reader.get('key'), {'a': 1})
+            writer.invalidate(['crm.order'])
+            self.assertIsNone(reader.get('key'))
+            self.assertEqual(reader.stats()['misses'], 1)
+
+    def test_lru_evictions_are_counted(self):
+        cache = ResponseCache(LocMemBackend(max_entries=1))
+        cache.set('a', 1, set(), cache.versions())
+        cache.set('b', 2, set(), cache.versions())
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 2)
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'evictions': 1, 'invalidations': 0})
+
+
+class AsyncGraphQLViewTests(TestCase):
+    QUERY = """
+    query ($first: Int) {
+      allOrders(first: $first) { pageInfo { hasNextPage } edges { node { id customer { name } products { edges { node { name } } } } } }
+      allCustomersKeyset(first: 2) { totalCount edges { node { name } } }
+      hello
+    }
+    """
+
+    def setUp(self):
+        create_orders(3)
+        reset_persisted_queries()
+        reset_response_cache()
+        self.addCleanup(reset_persisted_queries)
+        self.addCleanup(reset_response_cache)
+
+    async def apost(self, query, variables=None, headers=None):
+        response = await self.async_client.post(
+            '/graphql/async', {'query': query, 'variables': variables or {}},
+            content_type='application/json', headers=headers,
+        )
+        return response.status_code, response.json()
+
+    async def test_matches_the_sync_view(self):
+        expected = await sync_to_async(self.client.post)(
+            '/graphql', {'query': self.QUERY, 'variables': {'first': 2}}, content_type='application/json'
+        )
+        status, body = await self.apost(self.QUERY, {'first': 2})
+        self.assertEqual(status, 200)
+        self.assertNotIn('errors', body)
+        self.assertEqual(body['data'], expected.json()['data'])
+        self.assertTrue(body['data']['allOrders']['pageInfo']['hasNextPage'])
+        self.assertEqual(len(body['data']['allOrders']['edges']), 2)
+
+    async def test_single_object_fields(self):
+        customer = await Customer.objects.aget(name="Customer 1")
+        query = "query ($id: ID!) { customer(id: $id) { name orders { edges { node { id } } } } order(id: 0) { id } }"
+        status, body = await self.apost(query, {'id': customer.pk})
+        self.assertEqual(body['data']['customer']['name'], "Customer 1")
+        self.assertEqual(len(body['data']['customer']['orders']['edges']), 1)
+        self.assertIsNone(body['data']['order'])
+
+    async def test_offset_and_last_pages(self):
+        query = "{ allProducts(offset: 1, first: 1) { edges { node { name } } pageInfo { hasNextPage } } }"
+        status, body = await self.apost(query)
+        self.assertEqual(body['data']['allProducts'], {
+            'edges': [{'node': {'name': "Product 1"}}], 'pageInfo': {'hasNextPage': True},
+        })
+        status, body = await self.apost("{ allProducts(last: 1) { edges { node { name } } } }")
+        self.assertEqual(body['data']['allProducts']['edges'], [{'node': {'name': "Product 2"}}])
+
+    async def test_tracing_charges_sql_to_each_root_field(self):
+        status, body = await self.apost(self.QUERY, {'first': 3}, headers={'X-CRM-Trace': '1'})
+        tracing = body['extensions']['tracing']
+        resolvers = {tuple(r['path']): r for r in tracing['execution']['resolvers']}
+        # count + page + products prefetch
+        self.assertEqual(resolvers[('allOrders',)]['sqlCount'], 3)
+        self.assertEqual(resolvers[('allCustomersKeyset',)]['sqlCount'], 1)
+        self.assertEqual(resolvers[('allCustomersKeyset', 'totalCount')]['sqlCount'], 1)
+        self.assertEqual(tracing['sql']['count'], 5)
+
+    async def test_mutations_run_on_the_sync_path(self):
+        query = 'mutation { createProduct(input: {name: "Desk", price: "100.00", stock: 3}) { product { name } } }'
+        status, body = await self.apost(query)
+        self.assertEqual(body['data']['createProduct']['product']['name'], "Desk")
+        self.assertTrue(await Product.objects.filter(name="Desk").aexists())
+
+
+class BatchRequestTests(TestCase):
+    ORDERS = "{ allOrders(first: 3) { edges { node { id customer { name } } } } }"
+    PRODUCTS = "{ allProducts(first: 5) { edges { node { name stock } } } }"
+    CREATE_PRODUCT = 'mutation { createProduct(input: {name: "Desk", price: "100.00", stock: 3}) { product { name } } }'
+
+    def setUp(self):
+        create_orders(3)
+        reset_persisted_queries()
+        reset_response_cache()
+        self.addCleanup(reset_persisted_queries)
+        self.addCleanup(reset_response_cache)
+
+    def post(self, operations, path='/graphql', **kwargs):
+        response = self.client.post(path, operations, content_type='application/json', **kwargs)
+        return response.status_code, response.json()
+
+    async def apost(self, operations, **kwargs):
+        response = await self.async_client.post(
+            '/graphql/async', operations, content_type='application/json', **kwargs
+        )
+        return response.status_code, response.json()
+
+    def test_returns_one_result_per_operation_in_order(self):
+        status, body = self.post([
+            {'query': self.PRODUCTS},
+            {'query': self.CREATE_PRODUCT},
+            {'query': self.PRODUCTS},
+            {'query': "{ nope }"},
+        ])
+        self.assertEqual(status, 400)
+        self.assertEqual(len(body), 4)
+        self.assertEqual(len(body[0]['data']['allProducts']['edges']), 3)
+        self.assertEqual(body[1]['data']['createProduct']['product']['name'], "Desk")
+        self.assertEqual(len(body[2]['data']['allProducts']['edges']), 4)
+        self.assertEqual(body[3]['status'], 400)
+        self.assertIn("nope", body[3]['errors'][0]['message'])
+
+    @override_settings(CRM_RESPONSE_CACHE={'ENABLED': False})
+    def test_operations_share_the_dataloaders_until_a_mutation(self):
+        with mock.patch('crm.loaders.LoaderRegistry', wraps=LoaderRegistry) as registry:
+            status, body = self.post([{'query': self.ORDERS}, {'query': self.ORDERS}])
+        self.assertEqual(status, 200)
+        self.assertEqual(body[0]['data'], body[1]['data'])
+        self.assertEqual(registry.call_count, 1)
+
+        with mock.patch('crm.loaders.LoaderRegistry', wraps=LoaderRegistry) as registry:
+            self.post([{'query': self.ORDERS}, {'query': self.CREATE_PRODUCT}, {'query': self.ORDERS}])
+        self.assertEqual(registry.call_count, 2)
+
+    @override_settings(CRM_BATCH={'MAX_SIZE': 2})
+    def test_batch_size_is_limited(self):
+        status, body = self.post([{'query': self.PRODUCTS}] * 3)
+        self.assertEqual(status, 400)
+        self.assertEqual(body['errors'][0]['message'], "Batches are limited to 2 operations.")
+        status, body = self.post(["{ hello }"])
+        self.assertEqual(status, 400)
+
+    async def test_async_view_executes_queries_together(self):
+        expected = await sync_to_async(self.post)([{'query': self.ORDERS}, {'query': self.PRODUCTS}])
+        status, body = await self.apost(
+            [{'query': self.ORDERS}, {'query': self.PRODUCTS}], headers={'X-CRM-Trace': '1'},
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual([result['data'] for result in body], [result['data'] for result in expected[1]])
+        # Each operation counts only its own SQL
+        alone = [
+            (await self.apost({'query': query}, headers={'X-CRM-Trace': '1'}))[1]
+            for query in (self.ORDERS, self.PRODUCTS)
+        ]
+        self.assertEqual(
+            [result['extensions']['tracing']['sql']['count'] for result in body],
+            [result['extensions']['tracing']['sql']['count'] for result in alone],
+        )
+
+    async def test_async_view_runs_batches_with_mutations_in_order(self):
+        status, body = await self.apost([
+            {'query': self.PRODUCTS}, {'query': self.CREATE_PRODUCT}, {'query': self.PRODUCTS},
+        ])
+        self.assertEqual(status, 200)
+        self.assertEqual([len(body[i]['data']['allProducts']['edges']) for i in (0, 2)], [3, 4])
+
+
+class SettingsProfileTests(TestCase):
+    def test_graphene_schema_setting_points_at_the_schema(self):
+        from graphene_django.settings import graphene_settings
+
+        self.assertIs(graphene_settings.SCHEMA, schema)
+
+    def test_api_profile_serves_graphql_without_the_admin_stack(self):
+        script = (
+            "import sys, django; django.setup()\n"
+            "from django.conf import settings\n"
+            "from django.core.management import call_command\n"
+            "from django.test import Client\n"
+            "settings.DATABASES['default']['NAME'] = ':memory:'\n"
+            "call_command('migrate', verbosity=0)\n"
+            "response = Client(HTTP_HOST='localhost').post(\n"
+            "    '/graphql', {'query': '{ hello allProducts(first: 1) { edges { node { id } } } }'},\n"
+            "    content_type='application/json')\n"
+            "loaded = sorted(m for m in sys.modules if m.startswith(('django.contrib.admin', 'django.contrib.sessions')))\n"
+            "print(response.status_code, response.json()['data']['hello'], loaded)\n"
+        )
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'alx_backend_graphql_crm.settings_api'}
+        result = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "200 Hello, GraphQL! []")
+
+    def test_cron_module_imports_jobs_lazily(self):
+        script = "import sys, crm.cron; print('crm.jobs' in sys.modules)"
+        result = subprocess.run([sys.executable, '-c', script], cwd=settings.BASE_DIR, capture_output=True, text=True)
+        self.assertEqual(result.stdout.strip(), "False", result.stderr)
+        from .cron import log_crm_heartbeat as job
+
+        self.assertIs(job, log_crm_heartbeat)
+
+
+class DatabaseTuningTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def pragma(self, name, using='default'):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_sqlite_pragmas_are_applied_on_connect(self):
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -20000)
+
+    def test_file_databases_use_wal(self):
+        # The in-memory test database has no WAL
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = SQLiteDatabaseWrapper(
+                {**connections['default'].settings_dict, 'NAME': os.path.join(directory, 'db.sqlite3')}
+            )
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+            finally:
+                wrapper.close()
+
+    def test_connections_are_persistent_with_health_checks(self):
+        for alias in ('default', 'replica'):
+            self.assertEqual(settings.DATABASES[alias]['CONN_MAX_AGE'], 60)
+            self.assertTrue(settings.DATABASES[alias]['CONN_HEALTH_CHECKS'])
+
+
+@override_settings(CRM_DATABASE={'READ_REPLICAS': ['replica']}, CRM_RESPONSE_CACHE={'ENABLED': False})
+class ReplicaRoutingTests(TransactionTestCase):
+    # The mirror is a second connection to the in-memory test database, so
+    # it would block on the tables locked by a TestCase transaction
+    databases = {'default', 'replica'}
+    PRODUCTS = "{ allProducts(first: 5) { edges { node { name } } } }"
+
+    def setUp(self):
+        self.product = Product.objects.create(name="Mouse", price=Decimal("1.00"), stock=1)
+        self.customer = Customer.objects.create(name="Alice", email="alice@example.com")
+
+    def post(self, query, path='/graphql'):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.post(path, {'query': query}, content_type='application/json')
+        return response.json(), primary.captured_queries, replica.captured_queries
+
+    def test_queries_read_from_the_replica(self):
+        for path in ('/graphql', '/graphql/async'):
+            with self.subTest(path=path):
+                _, primary, replica = self.post(self.PRODUCTS, path)
+                self.assertTrue(any('"crm_product"' in query['sql'] for query in replica))
+                self.assertFalse(any('"crm_product"' in query['sql'] for query in primary))
+        self.assertEqual(ReplicaRouter().db_for_read(Product), None)
+
+    def test_mutations_read_and_write_the_primary(self):
+        body, primary, replica = self.post(
+            f'mutation {{ createOrder(input: {{customerId: {self.customer.pk}, productIds: [{self.product.pk}]}}) '
+            '{ order { totalAmount } errors } }'
+        )
+        self.assertEqual(body['data']['createOrder'], {'order': {'totalAmount': '1.00'}, 'errors': None})
+        self.assertTrue(any(query['sql'].startswith('INSERT INTO "crm_order"') for query in primary))
+        self.assertEqual(replica, [])
+
+    def test_replicas_are_not_migrated(self):
+        router = ReplicaRouter()
+        self.assertTrue(router.allow_migrate('default', 'crm'))
+        self.assertFalse(router.allow_migrate('replica', 'crm'))
+
+
+class RecordingBroker(Broker):
+    """Stand-in broker keeping what was published"""
+
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, channel, message):
+        self.messages.append((channel, message))
+
+
+ORDER_MUTATION = """
+mutation ($customer: ID!, $products: [ID]!, $quantities: [Int]) {
+  createOrder(input: {customerId: $customer, productIds: $products, quantities: $quantities}) {
+    order { id }
+    errors
+  }
+}
+"""
+
+
+@override_settings(CRM_PUBSUB={'BROKER': 'crm.tests.RecordingBroker'})
+class PublishTests(TestCase):
+    def setUp(self):
+        reset_broker()
+        self.addCleanup(reset_broker)
+        self.customer = Customer.objects.create(name="Alice", email="alice@example.com")
+        self.product = Product.objects.create(name="Mouse", price=Decimal("20.00"), stock=5)
+        self.messages = get_broker().messages
+
+    def create_order(self, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = schema.execute(
+                ORDER_MUTATION,
+                variables={'customer': self.customer.pk, 'products': [self.product.pk], 'quantities': [quantity]},
+                context_value=RequestFactory().post('/graphql'),
+            )
+        return result.data['createOrder']
+
+    def test_created_order_and_reserved_stock_are_published_on_commit(self):
+        self.messages.clear()
+        order = self.create_order(2)
+        self.assertCountEqual(self.messages, [
+            (ORDER_CREATED, {'id': int(from_global_id(order['order']['id'])[1])}),
+            (STOCK_CHANGED, {'ids': [self.product.pk]}),
+        ])
+
+    def test_rolled_back_order_publishes_nothing(self):
+        self.messages.clear()
+        self.assertEqual(self.create_order(50)['errors'], ["Insufficient stock for: Mouse"])
+        self.assertEqual(self.messages, [])
+
+    def test_restock_and_product_saves(self):
+        self.messages.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            restock_low_stock(threshold=10)
+            self.product.save(update_fields=['name'])
+        self.assertEqual(self.messages, [(STOCK_CHANGED, {'ids': [self.product.pk]})])
+
+        product = Product.objects.get(pk=self.product.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.price = Decimal("25.00")
+            product.save()
+        self.assertEqual(len(self.messages), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.stock += 1
+            product.save()
+            product.save()
+        self.assertEqual(self.messages[1:], [(STOCK_CHANGED, {'ids': [self.product.pk]})])
+
+
+class SubscriptionTests(TestCase):
+    def setUp(self):
+        reset_broker()
+        self.addCleanup(reset_broker)
+        create_orders(2)
+
+    async def next_event(self, query, publish, **variables):
+        results = await subscribe(schema.graphql_schema, parse(query), variable_values=variables)
+        event = asyncio.ensure_future(anext(results))
+        while not get_broker().stats()['subscribers']:
+            await asyncio.sleep(0)
+        publish()
+        try:
+            return await asyncio.wait_for(event, 5)
+        finally:
+            await results.aclose()
+
+    async def test_order_created_pushes_the_order(self):
+        order = await Order.objects.select_related('customer').order_by('pk').afirst()
+        result = await self.next_event(
+            "subscription { orderCreated { id customer { name } products { edges { node { name } } } } }",
+            lambda: get_broker().publish(ORDER_CREATED, {'id': order.pk}),
+        )
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data['orderCreated']['customer']['name'], order.customer.name)
+        self.assertEqual(len(result.data['orderCreated']['products']['edges']), 1)
+
+    async def test_stock_changes_are_filtered_by_threshold(self):
+        await Product.objects.filter(name="Product 1").aupdate(stock=50)
+        ids = [pk async for pk in Product.objects.order_by('pk').values_list('pk', flat=True)]
+        result = await self.next_event(
+            "subscription ($threshold: Int) { productStockChanged(threshold: $threshold) { name stock } }",
+            lambda: get_broker().publish(STOCK_CHANGED, {'ids': ids[1:]}),
+            threshold=10,
+        )
+        self.assertEqual(result.data, {'productStockChanged': {'name': "Product 2", 'stock': 5}})
+
+    def test_http_views_reject_subscriptions(self):
+        response = self.client.post('/graphql', {'query': "subscription { orderCreated { id } }"},
+                                    content_type='application/json')
+        self.assertIn("WebSocket", response.json()['errors'][0]['message'])
+
+
+class WebSocketTests(TransactionTestCase):
+    def setUp(self):
+        reset_broker()
+        reset_persisted_queries()
+        self.addCleanup(reset_broker)
+        self.product = Product.objects.create(name="Mouse", price=Decimal("20.00"), stock=5)
+
+    @asynccontextmanager
+    async def websocket(self, subprotocols=('graphql-transport-ws',)):
+        incoming, outgoing = asyncio.Queue(), asyncio.Queue()
+        scope = {'type': 'websocket', 'path': '/graphql', 'subprotocols': list(subprotocols)}
+        app = route_websockets(None, {'/graphql': GraphQLWebSocket(schema, init_timeout=5)})
+        task = asyncio.ensure_future(app(scope, incoming.get, outgoing.put))
+        await incoming.put({'type': 'websocket.connect'})
+        try:
+            yield incoming, outgoing
+        finally:
+            await incoming.put({'type': 'websocket.disconnect'})
+            await asyncio.wait_for(task, 5)
+
+    async def send(self, incoming, message):
+        await incoming.put({'type': 'websocket.receive', 'text': json.dumps(message)})
+
+    async def receive(self, outgoing):
+        event = await asyncio.wait_for(outgoing.get(), 5)
+        return json.loads(event['text']) if event['type'] == 'websocket.send' else event
+
+    async def test_subscribe_receive_and_complete(self):
+        async with self.websocket() as (incoming, outgoing):
+            self.assertEqual((await self.receive(outgoing))['subprotocol'], 'graphql-transport-ws')
+            await self.send(incoming, {'type': 'connection_init'})
+            self.assertEqual(await self.receive(outgoing), {'type': 'connection_ack'})
+
+            await self.send(incoming, {'type': 'subscribe', 'id': '1', 'payload': {
+                'query': "subscription { productStockChanged(threshold: 10) { name stock } }",
+            }})
+            while not get_broker().stats()['subscribers']:
+                await asyncio.sleep(0.01)
+            self.product.stock = 3
+            await sync_to_async(self.product.save)()
+            self.assertEqual(await self.receive(outgoing), {
+                'type': 'next', 'id': '1',
+                'payload': {'data': {'productStockChanged': {'name': "Mouse", 'stock': 3}}},
+            })
+
+            await self.send(incoming, {'type': 'complete', 'id': '1'})
+            await self.send(incoming, {'type': 'ping'})
+            self.assertEqual(await self.receive(outgoing), {'type': 'pong'})
+            while get_broker().stats()['subscribers']:
+                await asyncio.sleep(0.01)
+
+    async def test_subscribe_before_init_is_unauthorized(self):
+        async with self.websocket() as (incoming, outgoing):
+            await self.receive(outgoing)
+            await self.send(incoming, {'type': 'subscribe', 'id': '1', 'payload': {'query': "{ hello }"}})
+            self.assertEqual((await self.receive(outgoing))['code'], 4401)
+
+    async def test_queries_and_errors(self):
+        async with self.websocket() as (incoming, outgoing):
+            await self.receive(outgoing)
+            await self.send(incoming, {'type': 'connection_init'})
+            await self.receive(outgoing)
+            query = "{ product(id: %d) { name } }" % self.product.pk
+            await self.send(incoming, {'type': 'subscribe', 'id': 'q', 'payload': {'query': query}})
+            self.assertEqual((await self.receive(outgoing))['payload'], {'data': {'product': {'name': "Mouse"}}})
+            self.assertEqual(await self.receive(outgoing), {'type': 'complete', 'id': 'q'})
+
+            await self.send(incoming, {'type': 'subscribe', 'id': 'e', 'payload': {'query': "{ nope }"}})
+            message = await self.receive(outgoing)
+            self.assertEqual((message['type'], message['id']), ('error', 'e'))
+
+            for persisted in ({'version': 1}, 'abc'):
+                await self.send(incoming, {'type': 'subscribe', 'id': 'p', 'payload': {
+                    'extensions': {'persistedQuery': persisted},
+                }})
+                message = await self.receive(outgoing)
+                self.assertEqual((message['type'], message['id']), ('error', 'p'))
+
+    async def test_rejects_other_subprotocols(self):
+        async with self.websocket(subprotocols=()) as (incoming, outgoing):
+            self.assertEqual(await self.receive(outgoing), {'type': 'websocket.close', 'code': 4406})
+
+
+class CronExpressionTests(TestCase):
+    def test_next_after(self):
+        moment = datetime(2024, 1, 1, 10, 7, 30)  # a Monday
+        self.assertEqual(CronExpression('*/5 * * * *').next_after(moment), datetime(2024, 1, 1, 10, 10))
+        self.assertEqual(CronExpression('0 */12 * * *').next_after(moment), datetime(2024, 1, 1, 12, 0))
+        self.assertEqual(CronExpression('0 2 * * 0').next_after(moment), datetime(2024, 1, 7, 2, 0))
+        self.assertEqual(CronExpression('@monthly').next_after(moment), datetime(2024, 2, 1, 0, 0))
+        self.assertEqual(CronExpression('30 9 29 feb *').next_after(moment), datetime(2024, 2, 29, 9, 30))
+        self.assertEqual(CronExpression('0 0 * * sun').next_after(moment), datetime(2024, 1, 7, 0, 0))
+
+    def test_day_of_month_or_day_of_week(self):
+        cron = CronExpression('0 0 13 * 5')
+        self.assertEqual(cron.next_after(datetime(2024, 1, 1)), datetime(2024, 1, 5))
+        self.assertEqual(cron.next_after(datetime(2024, 1, 12)), datetime(2024, 1, 13))
+
+    def test_invalid_expressions(self):
+        for expression in ('* * * *', '60 * * * *', '*/0 * * * *', '5-1 * * * *', 'x * * * *', '0 0 31 2 *'):
+            with self.subTest(expression=expression), self.assertRaises(ValueError):
+                CronExpression(expression).next_after(datetime(2024, 1, 1))
+
+
+class SchedulerTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        self.job = Job('record', '*/5 * * * *', lambda: self.calls.append(1) or "done")
+        self.scheduler = Scheduler([self.job], log=self.calls.append)
+        self.scheduler.executor = mock.Mock(submit=lambda function, *args: function(*args))
+
+    def test_jitter_delays_planned_run(self):
+        self.job.jitter = 30
+        with mock.patch('crm.scheduler.random.uniform', return_value=12.5) as uniform:
+            planned = self.job.plan(datetime(2024, 1, 1, 10, 0))
+        uniform.assert_called_once_with(0, 30)
+        self.assertEqual(planned, datetime(2024, 1, 1, 10, 5, 12, 500000))
+
+    def test_tick_runs_due_jobs_and_plans_the_next_run(self):
+        start = datetime(2024, 1, 1, 10, 1)
+        self.assertEqual(self.scheduler.tick(start), datetime(2024, 1, 1, 10, 5))
+        self.assertEqual(self.calls, [])
+        self.assertEqual(self.scheduler.tick(datetime(2024, 1, 1, 10, 5)), datetime(2024, 1, 1, 10, 10))
+        self.assertEqual(self.calls[0], 1)
+        self.assertTrue(self.calls[1].startswith("record: finished in"))
+        self.assertIn('crm_job_runs_total{job="record",status="success"}', REGISTRY.render())
+
+    def test_skips_overlapping_runs(self):
+        self.job.lock.acquire()
+        self.addCleanup(self.job.lock.release)
+        self.scheduler.tick(datetime(2024, 1, 1, 10, 1))
+        self.scheduler.tick(datetime(2024, 1, 1, 10, 5))
+        self.assertEqual(self.calls, ["record: skipped, previous run still in progress"])
+        self.assertFalse(self.scheduler.run_job(self.job))
+
+    def test_failures_release_the_lock(self):
+        self.job.function = mock.Mock(side_effect=RuntimeError("boom"))
+        with self.assertRaises(RuntimeError):
+            self.scheduler.run_job(self.job)
+        self.assertIn("record: failed", self.calls[0])
+        self.assertTrue(self.job.lock.acquire())
+        self.job.lock.release()
+        # Scheduled runs only log the failure
+        self.scheduler.tick(datetime(2024, 1, 1, 10, 1))
+        self.scheduler.tick(datetime(2024, 1, 1, 10, 5))
+        self.assertIn("record: failed", self.calls[1])
+        self.assertIn('crm_job_runs_total{job="record",status="failure"}', REGISTRY.render())
+
+    def test_file_lock_spans_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first, second = JobLock('record', directory), JobLock('record', directory)
+            self.assertTrue(first.acquire())
+            self.assertFalse(second.acquire())
+            first.release()
+            self.assertTrue(second.acquire())
+            second.release()
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log_path = os.path.join(directory.name, 'log.txt')
+
+    def read_log(self):
+        with open(self.log_path) as f:
+            return f.read()
+
+    def test_heartbeat(self):
+        self.assertEqual(log_crm_heartbeat(self.log_path), "responsive")
+        self.assertIn("CRM is alive - Status: responsive", self.read_log())
+
+    def test_update_low_stock(self):
+        Product.objects.create(name="Cable", price=Decimal("5.00"), stock=2)
+        Product.objects.create(name="Monitor", price=Decimal("200.00"), stock=50)
+        self.assertEqual(update_low_stock(self.log_path), "1 products restocked")
+        self.assertIn("Cable: 12", self.read_log())
+
+    def test_order_reminders_and_cleanup(self):
+        old = timezone.now() - timedelta(days=400)
+        alice = Customer.objects.create(name="Alice", email="alice@example.com")
+        idle = Customer.objects.create(name="Idle", email="idle@example.com")
+        Customer.objects.create(name="New", email="new@example.com")
+        Customer.objects.filter(pk__in=[alice.pk, idle.pk]).update(created_at=old)
+        order = Order.objects.create(customer=alice)
+        stale = Order.objects.create(customer=alice)
+        Order.objects.filter(pk=stale.pk).update(order_date=old)
+
+        directory = os.path.dirname(self.log_path)
+        sink = {'SINK': 'crm.reminders.FileSink', 'OPTIONS': {'path': self.log_path}}
+        with override_settings(CRM_REMINDERS=sink):
+            self.assertEqual(send_order_reminders(os.path.join(directory, 'reminders.json')), "1 digests for 1 orders")
+        self.assertIn(f"alice@example.com: orders {order.pk}", self.read_log())
+
+        self.assertEqual(clean_inactive_customers(self.log_path, checkpoint=os.path.join(directory, 'cleanup.json')), "1 customers deleted")
+        self.assertEqual(set(Customer.objects.values_list('name', flat=True)), {"Alice", "New"})
+
+    def test_worker_command(self):
+        out = StringIO()
+        with override_settings(CRM_WORKER={'JOBS': {
+            'noop': {'SCHEDULE': '@daily', 'FUNCTION': 'crm.tests.noop_job'},
+        }}):
+            call_command('crm_worker', '--list', stdout=out)
+            self.assertIn("noop", out.getvalue())
+            call_command('crm_worker', '--run', 'noop', stdout=out)
+            self.assertIn("noop: finished in", out.getvalue())
+            with self.assertRaises(CommandError):
+                call_command('crm_worker', '--run', 'missing', stdout=out)
+        with override_settings(CRM_WORKER={'JOBS': {
+            'broken': {'SCHEDULE': '@daily', 'FUNCTION': 'crm.tests.failing_job'},
+        }}):
+            with self.assertRaisesMessage(CommandError, "broken failed: boom"):
+                call_command('crm_worker', '--run', 'broken', stdout=out)
+
+
+class InactiveCustomerCleanupTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint = Checkpoint(os.path.join(directory.name, 'checkpoint.json'))
+        old = timezone.now() - timedelta(days=400)
+        customers = Customer.objects.bulk_create(
+            Customer(name=f"Customer {i}", email=f"customer{i}@example.com") for i in range(7)
+        )
+        Customer.objects.filter(pk__in=[c.pk for c in customers[:6]]).update(created_at=old)
+        Order.objects.create(customer=customers[0])
+        self.keep = {customers[0].pk, customers[6].pk}
+
+    def test_anti_join(self):
+        cutoff = timezone.now() - timedelta(days=365)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(inactive_customers(cutoff).count(), 5)
+        self.assertIn("NOT EXISTS", queries[0]['sql'])
+
+    def test_deletes_in_batches(self):
+        progress = []
+        stats = clean_customers_in_batches(batch_size=2, checkpoint=self.checkpoint, on_progress=progress.append)
+        self.assertEqual((stats['deleted'], stats['batches']), (5, 3))
+        self.assertEqual(len(progress), 3)
+        self.assertEqual(set(Customer.objects.values_list('pk', flat=True)), self.keep)
+        self.assertIsNone(self.checkpoint.load())
+
+    def test_dry_run_only_counts(self):
+        stats = clean_customers_in_batches(dry_run=True)
+        self.assertEqual(stats['candidates'], 5)
+        self.assertEqual(Customer.objects.count(), 7)
+
+    def test_resumes_from_checkpoint(self):
+        cutoff = timezone.now() - timedelta(days=365)
+        first = inactive_customers(cutoff).order_by('pk').values_list('pk', flat=True)[1]
+        self.checkpoint.save({'cutoff': cutoff, 'last_pk': first, 'deleted': 2})
+
+        stats = clean_customers_in_batches(days=0, batch_size=10, checkpoint=self.checkpoint)
+        self.assertTrue(stats['resumed'])
+        self.assertEqual(stats['cutoff'], cutoff)
+        self.assertEqual(stats['deleted'], 5)
+        # Rows before the checkpoint and the recent customer are left alone
+        self.assertEqual(Customer.objects.count(), 4)
+        self.assertIsNone(self.checkpoint.load())
+
+    def test_command(self):
+        out = StringIO()
+        call_command('clean_inactive_customers', '--dry-run', stdout=out)
+        self.assertIn("5 customers created before", out.getvalue())
+        call_command('clean_inactive_customers', '--batch-size', '3', '--checkpoint', self.checkpoint.path, stdout=out)
+        self.assertIn("Deleted 5 inactive customers in 2 batches", out.getvalue())
+        self.assertEqual(Customer.objects.count(), 2)
+
+
+class SyntheticDataTests(TestCase):
+    END = timezone.make_aware(datetime(2025, 1, 1))
+
+    def generate(self):
+        return generate(Scale(customers=40, products=15, orders=300), seed=7, end=self.END, chunk_size=64)
+
+    def snapshot(self):
+        return (
+            list(Customer.objects.order_by('pk').values_list('name', 'email', 'phone')),
+            list(Order.objects.order_by('pk').values_list('customer__email', 'total_amount', 'order_date')),
+            list(OrderItem.objects.order_by('pk').values_list('order__order_date', 'product__name', 'quantity')),
+        )
+
+    def test_generates_consistent_rows(self):
+        counts = self.generate()
+        self.assertEqual((counts['customers'], counts['products'], counts['orders']), (40, 15, 300))
+        self.assertEqual(OrderItem.objects.count(), counts['items'])
+        totals = list(Order.objects.order_by('pk').values_list('total_amount', flat=True))
+        recompute_totals()
+        self.assertEqual(totals, list(Order.objects.order_by('pk').values_list('total_amount', flat=True)))
+        self.assertEqual(sum(DailySales.objects.values_list('orders', flat=True)), 300)
+        dates = list(Order.objects.order_by('pk').values_list('order_date', flat=True))
+        self.assertEqual(dates, sorted(dates))
+        self.assertTrue(self.END - timedelta(days=365) <= dates[0] and dates[-1] < self.END)
+        # Popularity is skewed: the top product is in far more orders than the median one
+        sold = sorted(ProductSales.objects.values_list('orders', flat=True), reverse=True)
+        self.assertGreater(sold[0], 4 * sold[len(sold) // 2])
+
+    def test_same_seed_same_data(self):
+        self.generate()
+        first = self.snapshot()
+        Customer.objects.all().delete()
+        Product.objects.all().delete()
+        self.generate()
+        self.assertEqual(first, self.snapshot())
+
+    def test_same_seed_same_data_on_another_day_and_database(self):
+        generate(Scale(customers=40, products=15, orders=300), seed=7, chunk_size=64)
+        first = self.snapshot()
+        Customer.objects.all().delete()
+        Product.objects.all().delete()
+        # Rows of another seed shift the ids of the second run
+        generate(Scale(customers=10, products=5, orders=30), seed=3)
+        later = timezone.now() + timedelta(days=40)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            generate(Scale(customers=40, products=15, orders=300), seed=7, chunk_size=64)
+        Customer.objects.exclude(email__contains='.7.').delete()
+        self.assertEqual(first, self.snapshot())
+
+    def test_command(self):
+        out = StringIO()
+        with mock.patch.dict('crm.synthetic.SIZES', {'10k': Scale(customers=5, products=3, orders=20)}):
+            call_command('generate_dataset', '--size', '10k', '--seed', '1', stdout=out)
+        self.assertIn("Generated 5 customers, 3 products, 20 orders", out.getvalue())
+        self.assertEqual(Order.objects.count(), 20)
+
+
+class RecordingSink(ReminderSink):
+    def __init__(self):
+        self.batches = []
+        self.closed = False
+
+    def send(self, digests):
+        self.batches.append(digests)
+
+    def close(self):
+        self.closed = True
+
+
+class OrderReminderTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint = Checkpoint(os.path.join(directory.name, 'checkpoint.json'))
+        self.alice = Customer.objects.create(name="Alice", email="alice@example.com")
+        self.bob = Customer.objects.create(name="Bob", email="bob@example.com")
+        self.orders = [Order.objects.create(customer=customer) for customer in (self.alice, self.bob, self.alice)]
+        stale = Order.objects.create(customer=self.bob)
+        Order.objects.filter(pk=stale.pk).update(order_date=timezone.now() - timedelta(days=30))
+
+    def send(self, **kwargs):
+        sink = RecordingSink()
+        stats = send_reminder_digests(sink=sink, checkpoint=self.checkpoint, **kwargs)
+        return stats, sink
+
+    def test_one_digest_per_customer(self):
+        stats, sink = self.send(chunk_size=1, batch_size=1)
+        self.assertEqual(stats, {'orders': 3, 'digests': 2})
+        self.assertEqual(len(sink.batches), 2)
+        # Alice's orders span two chunks
+        alice, bob = (batch[0] for batch in sink.batches)
+        self.assertEqual([order['id'] for order in alice.orders], [self.orders[0].pk, self.orders[2].pk])
+        self.assertEqual((bob.email, len(bob.orders)), ("bob@example.com", 1))
+        # The caller's sink stays open for the caller to reuse
+        self.assertFalse(sink.closed)
+        self.assertEqual(SentReminder.objects.count(), 3)
+
+    def test_digests_are_sent_while_orders_are_read(self):
+        sink = RecordingSink()
+        sent_after = []
+        with CaptureQueriesContext(connection) as queries:
+            sink.send = lambda digests: sent_after.append(len(queries.captured_queries))
+            send_reminder_digests(sink=sink, checkpoint=self.checkpoint, chunk_size=1, batch_size=1)
+            reads = [i for i, query in enumerate(queries.captured_queries) if 'NOT EXISTS' in query['sql']]
+        self.assertEqual(len(sent_after), 2)
+        self.assertLess(sent_after[0], reads[-1])
+
+    def test_reruns_only_send_new_orders(self):
+        self.send()
+        stats, sink = self.send()
+        self.assertEqual(stats, {'orders': 0, 'digests': 0})
+        self.assertEqual(sink.batches, [])
+
+        new = Order.objects.create(customer=self.bob)
+        stats, sink = self.send()
+        self.assertEqual(stats, {'orders': 1, 'digests': 1})
+        self.assertEqual(sink.batches[0][0].orders[0]['id'], new.pk)
+
+    def test_checkpoint_skips_older_orders(self):
+        self.send()
+        self.assertEqual(self.checkpoint.load()['id'], Order.objects.latest('id').pk)
+        with CaptureQueriesContext(connection) as queries:
+            list(pending_orders(timezone.now() - timedelta(days=7), after=self.orders[2].pk))
+        self.assertIn('"crm_order"."id" >', queries[0]['sql'])
+
+    def test_backdated_orders_after_the_checkpoint_are_reminded(self):
+        self.send()
+        backdated = Order.objects.create(customer=self.alice)
+        Order.objects.filter(pk=backdated.pk).update(order_date=timezone.now() - timedelta(days=3))
+        stats, sink = self.send()
+        self.assertEqual(stats, {'orders': 1, 'digests': 1})
+        self.assertEqual(sink.batches[0][0].orders[0]['id'], backdated.pk)
+
+    def test_reminders_survive_a_failed_batch(self):
+        sink = RecordingSink()
+        sink.send = mock.Mock(side_effect=[None, OSError("sink down")])
+        with self.assertRaises(OSError):
+            send_reminder_digests(sink=sink, checkpoint=self.checkpoint, batch_size=1)
+        self.assertFalse(sink.closed)
+        self.assertIsNone(self.checkpoint.load())
+        stats, _ = self.send()
+        self.assertEqual(stats, {'orders': 1, 'digests': 1})
+
+    def test_the_default_sink_is_always_closed(self):
+        sink = RecordingSink()
+        sink.send = mock.Mock(side_effect=OSError("sink down"))
+        with mock.patch('crm.reminders.get_sink', return_value=sink) as get_sink:
+            with self.assertRaises(OSError):
+                send_reminder_digests(checkpoint=self.checkpoint, batch_size=1)
+            self.assertTrue(sink.closed)
+
+            sink.closed = False
+            sink.send = mock.Mock()
+            send_reminder_digests(checkpoint=self.checkpoint, batch_size=1)
+        self.assertTrue(sink.closed)
+        self.assertEqual(sink.send.call_count, 2)
+        self.assertEqual(get_sink.call_count, 2)
+
+    def test_dry_run(self):
+        stats, sink = self.send(dry_run=True)
+        self.assertEqual(stats, {'orders': 3, 'digests': 2})
+        self.assertFalse(SentReminder.objects.exists())
+
+    def test_email_sink(self):
+        sink = EmailSink('django.core.mail.backends.locmem.EmailBackend', from_email="crm@example.com")
+        send_reminder_digests(sink=sink, checkpoint=self.checkpoint)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, ["alice@example.com"])
+        self.assertIn(f"Order {self.orders[2].pk}", mail.outbox[0].body)
+
+
+def noop_job():
+    return "nothing to do"
+
+
+def failing_job():
+    raise RuntimeError("boom")
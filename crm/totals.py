@@ -0,0 +1,62 @@
+"""
+Maintenance of the denormalized ``Order.total_amount``.
+
+Totals only change when an order's items change, so they are kept up to
+date from ``m2m_changed`` with a single aggregate ``UPDATE`` of the
+affected orders instead of re-summing every product on each save.
+``recompute_totals`` rebuilds them in one statement.
+"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Order, OrderItem
+from .response_cache import invalidate
+
+MONEY = DecimalField(max_digits=10, decimal_places=2)
+ZERO = Value(Decimal('0.00'), output_field=MONEY)
+
+
+def order_total():
+    """Correlated subquery computing ``SUM(price * quantity)`` of the outer order"""
+    totals = (
+        OrderItem.objects.filter(order=OuterRef('pk'))
+        .order_by()
+        .values('order')
+        .annotate(total=Sum(F('product__price') * F('quantity'), output_field=MONEY))
+        .values('total')
+    )
+    return Coalesce(Subquery(totals), ZERO)
+
+
+def recompute_totals(queryset=None):
+    """Recompute ``total_amount`` for ``queryset`` (default: all orders) in one UPDATE"""
+    if queryset is None:
+        queryset = Order.objects.all()
+    invalidate(Order)
+    return queryset.order_by().update(total_amount=order_total())
+
+
+def products_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """``m2m_changed`` receiver for ``Order.products``
+
+    Recomputes only the affected orders. With per-item quantities a delta
+    derived from ``pk_set`` alone would be wrong, and the aggregate over
+    one order's items is as cheap as the delta query would be.
+    """
+    if action == 'pre_clear' and reverse:
+        # The affected orders are gone by post_clear, remember them now
+        instance._cleared_order_ids = list(instance.orders.values_list('pk', flat=True))
+        return
+
+    if action in ('post_add', 'post_remove') and pk_set:
+        order_ids = pk_set if reverse else [instance.pk]
+        recompute_totals(Order.objects.filter(pk__in=list(order_ids)))
+    elif action == 'post_clear':
+        if reverse:
+            order_ids = getattr(instance, '_cleared_order_ids', [])
+            recompute_totals(Order.objects.filter(pk__in=order_ids))
+        else:
+            invalidate(Order)
+            Order.objects.filter(pk=instance.pk).update(total_amount=Decimal('0.00'))
@@ -0,0 +1,249 @@
+"""
+Per-request GraphQL tracing and SQL accounting.
+
+``CRMGraphQLView`` opens a ``Tracer`` for every request. It times the
+parse/validate/cost/execute phases and, through a DB execute wrapper,
+counts the SQL each resolver runs. ``TracingMiddleware`` times root
+fields on every request and every field when tracing is requested (the
+``X-CRM-Trace: 1`` header or ``CRM_TRACING['ENABLED']``); traced
+requests get an Apollo-style ``extensions.tracing``. Every request feeds
+the histograms in ``crm.metrics.REGISTRY``, served by ``/metrics``.
+"""
+import contextlib
+import contextvars
+import inspect
+import threading
+from datetime import timedelta
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .metrics import COUNT_BUCKETS, REGISTRY
+from .persisted import get_persisted_queries
+
+DEFAULT_HEADER = 'X-CRM-Trace'
+DEFAULT_MAX_OPERATION_NAMES = 50
+OTHER_OPERATION = 'other'
+TRUTHY = ('1', 'true', 'yes', 'on')
+
+REQUEST_DURATION = REGISTRY.histogram(
+    'crm_graphql_request_duration_seconds', "GraphQL request wall time",
+    ['operation_type', 'operation_name'],
+)
+PHASE_DURATION = REGISTRY.histogram(
+    'crm_graphql_phase_duration_seconds', "Time spent per GraphQL phase", ['phase'],
+)
+FIELD_DURATION = REGISTRY.histogram(
+    'crm_graphql_field_duration_seconds',
+    "Resolver wall time (root fields, every field on traced requests)",
+    ['parent_type', 'field'],
+)
+FIELD_SQL_QUERIES = REGISTRY.counter(
+    'crm_graphql_field_sql_queries_total', "SQL queries run inside a resolver",
+    ['parent_type', 'field'],
+)
+REQUEST_SQL_QUERIES = REGISTRY.histogram(
+    'crm_graphql_request_sql_queries', "SQL queries per GraphQL request",
+    ['operation_type'], buckets=COUNT_BUCKETS,
+)
+
+
+@REGISTRY.add_collector
+def document_cache_metrics():
+    stats = get_persisted_queries().cache.stats()
+    for name in ('hits', 'misses', 'evictions'):
+        metric = f'crm_graphql_document_cache_{name}_total'
+        yield f'# TYPE {metric} counter'
+        yield f'{metric} {stats[name]}'
+    yield '# TYPE crm_graphql_document_cache_size gauge'
+    yield f"crm_graphql_document_cache_size {stats['size']}"
+
+
+# The resolver record SQL is charged to; a context variable so that root
+# fields awaited together on the async view each keep their own
+_current_field = contextvars.ContextVar('crm_current_field', default=None)
+
+# The tracer of the operation running in this context; operations of a batch
+# executed together each count only their own SQL
+_current_tracer = contextvars.ContextVar('crm_current_tracer', default=None)
+
+
+def _ns(seconds):
+    return int(seconds * 1e9)
+
+
+_operation_names = set()
+_operation_names_lock = threading.Lock()
+
+
+def operation_label(name):
+    """Bound the client-chosen operation names that become metric labels
+
+    With an allow list only its operations keep their name. Otherwise the
+    first ``CRM_TRACING['MAX_OPERATION_NAMES']`` names seen do; every other
+    name is reported as ``other``.
+    """
+    if not name:
+        return ''
+    allowed = get_persisted_queries().operation_names
+    if allowed is not None:
+        return name if name in allowed else OTHER_OPERATION
+    limit = getattr(settings, 'CRM_TRACING', {}).get('MAX_OPERATION_NAMES', DEFAULT_MAX_OPERATION_NAMES)
+    with _operation_names_lock:
+        if name in _operation_names or len(_operation_names) < limit:
+            _operation_names.add(name)
+            return name
+    return OTHER_OPERATION
+
+
+def tracing_requested(request):
+    options = getattr(settings, 'CRM_TRACING', {})
+    if options.get('ENABLED', False):
+        return True
+    header = options.get('HEADER', DEFAULT_HEADER)
+    return bool(header) and request.headers.get(header, '').lower() in TRUTHY
+
+
+class Tracer:
+    def __init__(self, detailed=False):
+        self.detailed = detailed
+        self.start_time = timezone.now()
+        self.started = perf_counter()
+        self.duration = None
+        self.phases = {}
+        self.resolvers = []
+        self.sql_count = 0
+        self.sql_duration = 0.0
+        self.operation_type = None
+        self.operation_name = None
+
+    def offset(self):
+        return perf_counter() - self.started
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = self.offset()
+        try:
+            yield
+        finally:
+            self.phases[name] = (start, self.offset() - start)
+
+    @contextlib.contextmanager
+    def instrument_sql(self):
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self._execute_sql))
+            yield
+
+    @contextlib.contextmanager
+    def active(self):
+        """Mark the SQL run in this context as this tracer's"""
+        token = _current_tracer.set(self)
+        try:
+            yield
+        finally:
+            _current_tracer.reset(token)
+
+    def _execute_sql(self, execute, sql, params, many, context):
+        if _current_tracer.get() not in (None, self):
+            return execute(sql, params, many, context)
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - start
+            self.sql_count += 1
+            self.sql_duration += duration
+            record = _current_field.get()
+            if record is not None:
+                record['sqlCount'] += 1
+                record['sqlDuration'] += duration
+
+    def trace_field(self, next, root, info, **args):
+        record = {
+            'path': info.path.as_list(),
+            'parentType': info.parent_type.name,
+            'fieldName': info.field_name,
+            'returnType': str(info.return_type),
+            'startOffset': self.offset(),
+            'duration': 0.0,
+            'sqlCount': 0,
+            'sqlDuration': 0.0,
+        }
+        token = _current_field.set(record)
+        try:
+            result = next(root, info, **args)
+        except Exception:
+            self._end_field(record)
+            raise
+        finally:
+            _current_field.reset(token)
+        if inspect.isawaitable(result):
+            return self._trace_awaitable(record, result)
+        self._end_field(record)
+        return result
+
+    async def _trace_awaitable(self, record, result):
+        token = _current_field.set(record)
+        try:
+            return await result
+        finally:
+            _current_field.reset(token)
+            self._end_field(record)
+
+    def _end_field(self, record):
+        record['duration'] = self.offset() - record['startOffset']
+        self.resolvers.append(record)
+
+    def finish(self):
+        self.duration = self.offset()
+        labels = {'operation_type': self.operation_type or 'unknown'}
+        REQUEST_DURATION.observe(self.duration, operation_name=operation_label(self.operation_name), **labels)
+        REQUEST_SQL_QUERIES.observe(self.sql_count, **labels)
+        for name, (_, duration) in self.phases.items():
+            PHASE_DURATION.observe(duration, phase=name)
+        for record in self.resolvers:
+            field = {'parent_type': record['parentType'], 'field': record['fieldName']}
+            FIELD_DURATION.observe(record['duration'], **field)
+            if record['sqlCount']:
+                FIELD_SQL_QUERIES.inc(record['sqlCount'], **field)
+
+    def as_dict(self):
+        def phase(name):
+            start, duration = self.phases.get(name, (0, 0))
+            return {'startOffset': _ns(start), 'duration': _ns(duration)}
+
+        return {
+            'version': 1,
+            'startTime': self.start_time.isoformat(),
+            'endTime': (self.start_time + timedelta(seconds=self.duration)).isoformat(),
+            'duration': _ns(self.duration),
+            'parsing': phase('parse'),
+            'validation': phase('validate'),
+            'costAnalysis': phase('cost'),
+            'execution': {
+                **phase('execute'),
+                'resolvers': [
+                    {
+                        **record,
+                        'startOffset': _ns(record['startOffset']),
+                        'duration': _ns(record['duration']),
+                        'sqlDuration': _ns(record['sqlDuration']),
+                    }
+                    for record in self.resolvers
+                ],
+            },
+            'sql': {'count': self.sql_count, 'duration': _ns(self.sql_duration)},
+        }
+
+
+class TracingMiddleware:
+    """Graphene middleware feeding ``info.context.crm_tracer``"""
+
+    def resolve(self, next, root, info, **args):
+        tracer = getattr(info.context, 'crm_tracer', None)
+        if tracer is None or not (tracer.detailed or info.path.prev is None):
+            return next(root, info, **args)
+        return tracer.trace_field(next, root, info, **args)
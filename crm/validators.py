@@ -0,0 +1,36 @@
+import re
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+
+PHONE_PATTERNS = [
+    re.compile(r'^\+\d{10,15}$'),  # +1234567890
+    re.compile(r'^\d{3}-\d{3}-\d{4}$'),  # 123-456-7890
+    re.compile(r'^\(\d{3}\) \d{3}-\d{4}$'),  # (123) 456-7890
+]
+
+
+def validate_phone_format(phone):
+    """Validate phone number format"""
+    if not phone:
+        return True
+
+    return any(pattern.match(phone) for pattern in PHONE_PATTERNS)
+
+
+def is_valid_email(email):
+    try:
+        validate_email(email)
+    except ValidationError:
+        return False
+    return True
+
+
+def product_errors(price, stock):
+    """Return the validation messages for a product's price and stock"""
+    errors = []
+    if price <= 0:
+        errors.append("Price must be positive")
+    if stock < 0:
+        errors.append("Stock cannot be negative")
+    return errors
@@ -1,3 +1,589 @@
-from django.shortcuts import render
+import asyncio
+import csv
+import inspect
+import json
+from contextlib import ExitStack, contextmanager, nullcontext
+from dataclasses import dataclass
+from itertools import groupby, islice
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.http import (
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    HttpResponseNotAllowed,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.views.decorators.http import require_GET
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import (
+    DocumentNode,
+    ExecutionResult,
+    GraphQLError,
+    OperationDefinitionNode,
+    OperationType,
+    execute,
+    get_operation_ast,
+    validate_schema,
+)
+
+from .async_orm import on_orm_thread
+from .cost import analyze_query_cost
+from .database import read_from_replicas
+from .filters import OrderFilter
+from .models import Order
+from .metrics import REGISTRY
+from .persisted import get_persisted_queries, requested_hash
+from .response_cache import get_response_cache
+from .tracing import Tracer, TracingMiddleware, tracing_requested
+
+EXPORT_FIELDS = ['id', 'order_date', 'total_amount', 'customer_id', 'customer__email']
+EXPORT_COLUMNS = ['id', 'order_date', 'total_amount', 'customer_id', 'customer_email', 'product_ids']
+DEFAULT_CHUNK_SIZE = 2000
+MAX_CHUNK_SIZE = 10000
+DEFAULT_MAX_BATCH_SIZE = 20
+
+
+class Echo:
+    """File-like object whose write() returns the line for the streaming response"""
+
+    def write(self, value):
+        return value
+
+
+def iter_order_rows(queryset, chunk_size):
+    """Yield export rows from ``queryset`` with bounded memory
+
+    Orders are read with ``values()`` through a server-side iterator and,
+    per chunk, their product ids are fetched with one ``IN (...)`` query.
+    """
+    orders = (
+        queryset.order_by('-order_date', '-id')
+        .values(*EXPORT_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    through = Order.products.through.objects
+    while True:
+        chunk = list(islice(orders, chunk_size))
+        if not chunk:
+            return
+        links = (
+            through.filter(order_id__in=[row['id'] for row in chunk])
+            .order_by('order_id', 'product_id')
+            .values_list('order_id', 'product_id')
+        )
+        product_ids = {
+            order_id: [product_id for _, product_id in group]
+            for order_id, group in groupby(links, key=lambda link: link[0])
+        }
+        for row in chunk:
+            row['customer_email'] = row.pop('customer__email')
+            row['product_ids'] = product_ids.get(row['id'], [])
+            yield row
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        row['product_ids'] = ';'.join(str(pk) for pk in row['product_ids'])
+        yield writer.writerow([row[column] for column in EXPORT_COLUMNS])
+
+
+@require_GET
+def export_orders(request):
+    """Stream the orders matching the OrderFilter query parameters
+
+    ``?format=ndjson`` (default) or ``?format=csv``; ``chunk_size`` bounds
+    the rows held in memory at once.
+    """
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return JsonResponse({'errors': {'format': ["Expected 'ndjson' or 'csv'"]}}, status=400)
+    try:
+        chunk_size = min(int(request.GET.get('chunk_size', DEFAULT_CHUNK_SIZE)), MAX_CHUNK_SIZE)
+    except ValueError:
+        chunk_size = 0
+    if chunk_size < 1:
+        return JsonResponse({'errors': {'chunk_size': ["Expected a positive integer"]}}, status=400)
+
+    filterset = OrderFilter(request.GET, queryset=Order.objects.all(), request=request)
+    if not filterset.is_valid():
+        return JsonResponse({'errors': filterset.errors}, status=400)
+
+    rows = iter_order_rows(filterset.qs, chunk_size)
+    if export_format == 'csv':
+        response = StreamingHttpResponse(csv_lines(rows), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="orders.csv"'
+    else:
+        response = StreamingHttpResponse(ndjson_lines(rows), content_type='application/x-ndjson')
+    return response
+
+
+@dataclass
+class PreparedOperation:
+    """A parsed, validated and costed operation ready to execute"""
+
+    document: DocumentNode
+    ast: OperationDefinitionNode
+    extensions: dict
+    cache: object = None
+    cache_key: str = None
+    versions: dict = None
+
+    @contextmanager
+    def executing(self, tracer):
+        """Time the execution and collect the tables it reads for the response cache"""
+        with tracer.phase('execute'), (self.cache.record_tags() if self.cache else nullcontext()) as tags:
+            yield tags
+
+    def complete(self, result, tags):
+        if self.cache is not None and not result.errors:
+            self.cache.set(self.cache_key, result.data, tags, self.versions)
+        result.extensions = {**(result.extensions or {}), **self.extensions}
+        return result
+
+
+def batch_options():
+    options = getattr(settings, 'CRM_BATCH', {})
+    return {
+        'max_size': options.get('MAX_SIZE', DEFAULT_MAX_BATCH_SIZE),
+        'parallel': options.get('PARALLEL', True),
+    }
+
+
+class OperationRequest:
+    """The request as seen by one operation of a batch
+
+    Attributes the operation sets (its tracer, graphene's mutation error
+    flag) stay with it; everything else is read from the request, and the
+    DataLoader registry is shared with the other operations.
+    """
+
+    SHARED = ('crm_loaders',)
+
+    def __init__(self, request):
+        object.__setattr__(self, '_request', request)
+
+    def __getattr__(self, name):
+        return getattr(self._request, name)
+
+    def __setattr__(self, name, value):
+        if name in self.SHARED:
+            setattr(self._request, name, value)
+        else:
+            object.__setattr__(self, name, value)
+
+
+class CRMGraphQLView(GraphQLView):
+    """GraphQLView that takes its documents from the persisted query cache
+
+    Accepts ``extensions.persistedQuery.sha256Hash`` in place of (or next
+    to) the query text; see ``crm.persisted``. Operations over the
+    ``crm.cost`` budget are rejected before execution, and the computed
+    cost is returned in ``extensions.cost``. Untraced queries go through
+    the ``crm.response_cache``. Every request is timed by a
+    ``crm.tracing.Tracer``; traced ones also get ``extensions.tracing``.
+
+    A JSON array of operations is executed as a batch in one request, in
+    order and with shared DataLoaders, and answered with an array of
+    results; ``CRM_BATCH['MAX_SIZE']`` bounds its length.
+    """
+
+    def parse_body(self, request):
+        if self.get_content_type(request) == 'application/json' and request.body.lstrip()[:1] == b'[':
+            self.batch = True
+        data = super().parse_body(request)
+        if self.batch:
+            max_size = batch_options()['max_size']
+            if len(data) > max_size:
+                raise HttpError(HttpResponseBadRequest(f"Batches are limited to {max_size} operations."))
+            if not all(isinstance(entry, dict) for entry in data):
+                raise HttpError(HttpResponseBadRequest("Every operation of a batch must be a JSON object."))
+        return data
+
+    def get_middleware(self, request):
+        return [TracingMiddleware(), *(self.middleware or [])]
+
+    @staticmethod
+    def get_extensions(request, data):
+        extensions = request.GET.get('extensions') or data.get('extensions') or {}
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        return extensions if isinstance(extensions, dict) else {}
+
+    def get_persisted_hash(self, request, data):
+        try:
+            return requested_hash(self.get_extensions(request, data))
+        except GraphQLError as e:
+            raise HttpError(HttpResponseBadRequest(e.message))
+
+    def get_document(self, request, data, query):
+        return get_persisted_queries().get_document(
+            self.schema.graphql_schema,
+            query,
+            sha256=self.get_persisted_hash(request, data),
+            rules=self.validation_rules,
+            max_errors=graphene_settings.MAX_VALIDATION_ERRORS,
+            tracer=getattr(request, 'crm_tracer', None),
+        )
+
+    def is_query(self, request, data):
+        """Whether the batch entry ``data`` is a valid query operation, checked without executing it"""
+        query, _, operation_name, _ = self.get_graphql_params(request, data)
+        try:
+            if not query and self.get_persisted_hash(request, data) is None:
+                return False
+            document, errors = self.get_document(request, data, query)
+        except HttpError:
+            return False
+        if errors:
+            return False
+        operation_ast = get_operation_ast(document, operation_name)
+        return operation_ast is not None and operation_ast.operation == OperationType.QUERY
+
+    @staticmethod
+    def finish_batched_operation(request):
+        # Relations the DataLoaders cached may have changed
+        if request.crm_tracer.operation_type == OperationType.MUTATION.value:
+            request.crm_loaders = None
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        tracer = request.crm_tracer = Tracer(detailed=tracing_requested(request))
+        try:
+            with tracer.instrument_sql():
+                result = self.run_graphql_request(
+                    request, data, query, variables, operation_name, show_graphiql
+                )
+        finally:
+            tracer.finish()
+        return self.add_tracing(tracer, result)
+
+    @staticmethod
+    def add_tracing(tracer, result):
+        if result is not None and tracer.detailed:
+            result.extensions = {**(result.extensions or {}), 'tracing': tracer.as_dict()}
+        return result
+
+    def run_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        operation = self.prepare_operation(request, data, query, variables, operation_name, show_graphiql)
+        if not isinstance(operation, PreparedOperation):
+            return operation
+        with operation.executing(request.crm_tracer) as tags:
+            result = self.execute_document(
+                request, operation.document, operation.ast, variables, operation_name
+            )
+        return operation.complete(result, tags)
+
+    def prepare_operation(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        """Everything before execution, none of which reads the database
+
+        Returns a ``PreparedOperation``, or the ``ExecutionResult`` (None
+        for GraphiQL) that ends the request early.
+        """
+        tracer = request.crm_tracer
+        if not query and self.get_persisted_hash(request, data) is None:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        document, errors = self.get_document(request, data, query)
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+        if operation_ast is not None:
+            tracer.operation_type = operation_ast.operation.value
+            tracer.operation_name = operation_name or (operation_ast.name and operation_ast.name.value)
+        if (
+            request.method.lower() == 'get'
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseNotAllowed(
+                ['POST'],
+                f"Can only perform a {operation_ast.operation.value} operation from a POST request.",
+            ))
+
+        if operation_ast is not None and operation_ast.operation == OperationType.SUBSCRIPTION:
+            return ExecutionResult(data=None, errors=[GraphQLError(
+                "Subscriptions are only served over WebSocket (graphql-transport-ws)"
+            )])
+
+        with tracer.phase('cost'):
+            cost = analyze_query_cost(schema, document, operation_name, variables)
+        operation = PreparedOperation(document, operation_ast, extensions={'cost': cost.as_dict()})
+        errors = cost.errors()
+        if errors:
+            return ExecutionResult(data=None, errors=errors, extensions=operation.extensions)
+
+        cache = get_response_cache()
+        if (
+            cache is not None
+            and operation_ast is not None
+            and operation_ast.operation == OperationType.QUERY
+            and not tracer.detailed
+        ):
+            operation.cache = cache
+            operation.cache_key = cache.make_key(document, operation_name, variables)
+            data = cache.get(operation.cache_key)
+            if data is not None:
+                return ExecutionResult(data=data, extensions={**operation.extensions, 'responseCache': 'hit'})
+            operation.versions = cache.versions()
+            operation.extensions['responseCache'] = 'miss'
+        return operation
+
+    def execute_document(self, request, document, operation_ast, variables, operation_name):
+        schema = self.schema.graphql_schema
+        try:
+            execute_options = {
+                'root_value': self.get_root_value(request),
+                'context_value': self.get_context(request),
+                'variable_values': variables,
+                'operation_name': operation_name,
+                'middleware': self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                execute_options['execution_context_class'] = self.execution_context_class
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get('ATOMIC_MUTATIONS', False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            if operation_ast is not None and operation_ast.operation == OperationType.QUERY:
+                with read_from_replicas():
+                    return execute(schema, document, **execute_options)
+            return execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+    def get_response(self, request, data, show_graphiql=False):
+        """GraphQLView.get_response, plus the result's ``extensions``"""
+        if self.batch:
+            request = OperationRequest(request)
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        if self.batch:
+            self.finish_batched_operation(request)
+        return self.format_response(request, execution_result, id, show_graphiql)
+
+    def format_response(self, request, execution_result, id=None, show_graphiql=False):
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        status_code = 200
+        if not execution_result:
+            return None, status_code
+
+        response = {}
+        if execution_result.errors:
+            set_rollback()
+            response['errors'] = [self.format_error(e) for e in execution_result.errors]
+
+        if execution_result.errors and any(
+            not getattr(e, 'path', None) for e in execution_result.errors
+        ):
+            status_code = 400
+        else:
+            response['data'] = execution_result.data
+
+        if execution_result.extensions:
+            response['extensions'] = execution_result.extensions
+
+        if self.batch:
+            response['id'] = id
+            response['status'] = status_code
+
+        return self.json_encode(request, response, pretty=show_graphiql), status_code
+
+
+class AsyncCRMGraphQLView(CRMGraphQLView):
+    """``CRMGraphQLView`` executed on the event loop, for ASGI servers
+
+    Query resolvers return coroutines (see ``crm.async_orm``), so a request
+    waiting on the database no longer holds a worker thread and sibling
+    root fields are awaited together. Mutations and GraphiQL keep the sync
+    code path, run in a thread. A batch made only of queries is executed
+    concurrently when ``CRM_BATCH['PARALLEL']``; any other runs in order.
+    """
+
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ('get', 'post'):
+                raise HttpError(HttpResponseNotAllowed(
+                    ['GET', 'POST'], "GraphQL only supports GET and POST requests."
+                ))
+            data = self.parse_body(request)
+            if self.batch:
+                return await self.adispatch_batch(request, data)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+            query, variables, operation_name, id = self.get_graphql_params(request, data)
+            execution_result = await self.aexecute_graphql_request(
+                request, data, query, variables, operation_name
+            )
+            result, status_code = self.format_response(request, execution_result, id)
+            return HttpResponse(status=status_code, content=result, content_type='application/json')
+        except HttpError as e:
+            response = e.response
+            response['Content-Type'] = 'application/json'
+            response.content = self.json_encode(request, {'errors': [self.format_error(e)]})
+            return response
+
+    async def adispatch_batch(self, request, data):
+        requests = [OperationRequest(request) for _ in data]
+        if batch_options()['parallel'] and all(map(self.is_query, requests, data)):
+            results = await self.aexecute_together(requests, data)
+        else:
+            results = []
+            for operation_request, entry in zip(requests, data):
+                query, variables, operation_name, _ = self.get_graphql_params(operation_request, entry)
+                results.append(await self.aexecute_graphql_request(
+                    operation_request, entry, query, variables, operation_name
+                ))
+                self.finish_batched_operation(operation_request)
+
+        responses = [
+            self.format_response(operation_request, result, self.get_graphql_params(operation_request, entry)[3])
+            for operation_request, entry, result in zip(requests, data, results)
+        ]
+        status_code = max(status for _, status in responses)
+        content = '[{}]'.format(','.join(content for content, _ in responses))
+        return HttpResponse(status=status_code, content=content, content_type='application/json')
+
+    async def aexecute_together(self, requests, data):
+        """Execute the query operations of a batch concurrently, on the one ORM thread"""
+        for operation_request in requests:
+            operation_request.crm_tracer = Tracer(detailed=tracing_requested(operation_request))
+        results, pending = [None] * len(requests), []
+
+        @contextmanager
+        def instrumented():
+            # Entered and exited together so every execute wrapper stays nested
+            with ExitStack() as stack:
+                tags = []
+                for _, operation_request, operation, _, _ in pending:
+                    tracer = operation_request.crm_tracer
+                    stack.enter_context(tracer.instrument_sql())
+                    tags.append(stack.enter_context(operation.executing(tracer)))
+                yield tags
+
+        async def run(operation_request, operation, variables, operation_name):
+            with operation_request.crm_tracer.active():
+                return await self.aexecute_document(
+                    operation_request, operation.document, operation.ast, variables, operation_name
+                )
+
+        try:
+            for i, (operation_request, entry) in enumerate(zip(requests, data)):
+                query, variables, operation_name, _ = self.get_graphql_params(operation_request, entry)
+                operation = self.prepare_operation(operation_request, entry, query, variables, operation_name)
+                if isinstance(operation, PreparedOperation):
+                    pending.append((i, operation_request, operation, variables, operation_name))
+                else:
+                    results[i] = operation
+
+            async with on_orm_thread(instrumented()) as tags:
+                executed = await asyncio.gather(*(run(r, op, v, name) for _, r, op, v, name in pending))
+            for (i, _, operation, _, _), result, operation_tags in zip(pending, executed, tags):
+                results[i] = operation.complete(result, operation_tags)
+        finally:
+            for operation_request in requests:
+                operation_request.crm_tracer.finish()
+        return [
+            self.add_tracing(operation_request.crm_tracer, result)
+            for operation_request, result in zip(requests, results)
+        ]
+
+    async def aexecute_graphql_request(self, request, data, query, variables, operation_name):
+        tracer = request.crm_tracer = Tracer(detailed=tracing_requested(request))
+        try:
+            async with on_orm_thread(tracer.instrument_sql()):
+                result = operation = self.prepare_operation(
+                    request, data, query, variables, operation_name
+                )
+                if isinstance(operation, PreparedOperation):
+                    async with on_orm_thread(operation.executing(tracer)) as tags:
+                        result = await self.aexecute_document(
+                            request, operation.document, operation.ast, variables, operation_name
+                        )
+                    result = operation.complete(result, tags)
+        finally:
+            tracer.finish()
+        return self.add_tracing(tracer, result)
+
+    async def aexecute_document(self, request, document, operation_ast, variables, operation_name):
+        if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+            return await sync_to_async(self.execute_document)(
+                request, document, operation_ast, variables, operation_name
+            )
+        try:
+            with read_from_replicas():
+                result = execute(
+                    self.schema.graphql_schema,
+                    document,
+                    root_value=self.get_root_value(request),
+                    context_value=self.get_context(request),
+                    variable_values=variables,
+                    operation_name=operation_name,
+                    middleware=self.get_middleware(request),
+                    execution_context_class=self.execution_context_class,
+                )
+                if inspect.isawaitable(result):
+                    result = await result
+            return result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+def metrics(request):
+    """Prometheus scrape endpoint, only answered for ``CRM_TRACING['METRICS_ALLOWED_IPS']``"""
+    options = getattr(settings, 'CRM_TRACING', {})
+    allowed = options.get('METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+    if request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
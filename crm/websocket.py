@@ -0,0 +1,203 @@
+"""
+GraphQL over WebSocket, ``graphql-transport-ws`` protocol, as a plain ASGI app.
+
+``alx_backend_graphql_crm.asgi`` routes WebSocket connections on
+``/graphql`` here and everything else to Django. Subscriptions stream one
+``next`` message per published change (see ``crm.pubsub``); queries and
+mutations get a single ``next``. Documents go through the persisted query
+cache and the cost limits like on the HTTP views.
+"""
+import asyncio
+import json
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.db import close_old_connections
+from graphql import ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast, subscribe
+
+from .cost import analyze_query_cost
+from .persisted import get_persisted_queries, requested_hash
+
+PROTOCOL = 'graphql-transport-ws'
+DEFAULT_INIT_TIMEOUT = 3
+
+
+class SubscriptionContext:
+    """``info.context`` of WebSocket operations
+
+    ``crm_loaders`` is never kept, so every resolver batch gets fresh
+    loaders: a subscription resolves one object per event, with the
+    relations the optimizer prefetched, and no cache may outlive an event.
+    """
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.user = scope.get('user')
+
+    crm_loaders = property(lambda self: None, lambda self, value: None)
+
+
+class GraphQLWebSocket:
+    def __init__(self, schema, init_timeout=DEFAULT_INIT_TIMEOUT):
+        self.schema = schema
+        self.init_timeout = init_timeout
+
+    async def __call__(self, scope, receive, send):
+        # One ORM thread per connection rather than one for the whole server
+        async with ThreadSensitiveContext():
+            try:
+                await Connection(self, scope, send).run(receive)
+            finally:
+                await sync_to_async(close_old_connections)()
+
+
+class Connection:
+    def __init__(self, app, scope, send):
+        self.app = app
+        self.scope = scope
+        self.send = send
+        self.initialised = self.acknowledged = self.closed = False
+        self.operations = {}
+
+    async def run(self, receive):
+        event = await receive()
+        if event['type'] != 'websocket.connect':
+            return
+        if PROTOCOL not in self.scope.get('subprotocols', ()):
+            await self.send({'type': 'websocket.close', 'code': 4406})
+            return
+        await self.send({'type': 'websocket.accept', 'subprotocol': PROTOCOL})
+
+        timer = asyncio.get_running_loop().call_later(self.app.init_timeout, self.init_timed_out)
+        try:
+            while not self.closed:
+                event = await receive()
+                if event['type'] == 'websocket.disconnect':
+                    break
+                if event['type'] == 'websocket.receive':
+                    await self.handle(event.get('text') or (event.get('bytes') or b'').decode())
+        finally:
+            timer.cancel()
+            tasks = list(self.operations.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def close(self, code, reason):
+        if not self.closed:
+            self.closed = True
+            await self.send({'type': 'websocket.close', 'code': code, 'reason': reason})
+
+    def init_timed_out(self):
+        if not self.initialised:
+            asyncio.ensure_future(self.close(4408, "Connection initialisation timeout"))
+
+    async def send_message(self, type_, id=None, payload=None):
+        message = {'type': type_}
+        if id is not None:
+            message['id'] = id
+        if payload is not None:
+            message['payload'] = payload
+        if not self.closed:
+            await self.send({'type': 'websocket.send', 'text': json.dumps(message)})
+
+    async def handle(self, text):
+        try:
+            message = json.loads(text)
+            type_ = message['type']
+        except (ValueError, TypeError, KeyError):
+            return await self.close(4400, "Invalid message received")
+
+        if type_ == 'connection_init':
+            if self.initialised:
+                return await self.close(4429, "Too many initialisation requests")
+            self.initialised = self.acknowledged = True
+            await self.send_message('connection_ack')
+        elif type_ == 'ping':
+            await self.send_message('pong', payload=message.get('payload'))
+        elif type_ == 'pong':
+            pass
+        elif type_ == 'subscribe':
+            if not self.acknowledged:
+                return await self.close(4401, "Unauthorized")
+            id, payload = message.get('id'), message.get('payload')
+            if not isinstance(id, str) or not isinstance(payload, dict):
+                return await self.close(4400, "Invalid message received")
+            if id in self.operations:
+                return await self.close(4409, f"Subscriber for {id} already exists")
+            self.operations[id] = asyncio.ensure_future(self.run_operation(id, payload))
+        elif type_ == 'complete':
+            task = self.operations.pop(message.get('id'), None)
+            if task is not None:
+                task.cancel()
+        else:
+            await self.close(4400, "Invalid message received")
+
+    def prepare(self, payload):
+        """Return ``(document, operation, errors)`` for a ``subscribe`` payload"""
+        schema = self.app.schema.graphql_schema
+        query = payload.get('query')
+        if query is not None and not isinstance(query, str):
+            return None, None, [GraphQLError("The query must be a string.")]
+        try:
+            sha256 = requested_hash(payload.get('extensions'))
+        except GraphQLError as e:
+            return None, None, [e]
+        document, errors = get_persisted_queries().get_document(schema, query, sha256=sha256)
+        if errors:
+            return None, None, errors
+        operation = get_operation_ast(document, payload.get('operationName'))
+        if operation is None:
+            return None, None, [GraphQLError("Unknown operation")]
+        cost = analyze_query_cost(schema, document, payload.get('operationName'), payload.get('variables'))
+        return document, operation, cost.errors()
+
+    async def run_operation(self, id, payload):
+        try:
+            document, operation, errors = self.prepare(payload)
+            if errors:
+                await self.send_message('error', id, [error.formatted for error in errors])
+                return
+
+            options = {
+                'context_value': SubscriptionContext(self.scope),
+                'variable_values': payload.get('variables'),
+                'operation_name': payload.get('operationName'),
+            }
+            schema = self.app.schema.graphql_schema
+            if operation.operation == OperationType.SUBSCRIPTION:
+                results = await subscribe(schema, document, **options)
+                if isinstance(results, ExecutionResult):
+                    await self.send_message('error', id, [error.formatted for error in results.errors])
+                    return
+                try:
+                    async for result in results:
+                        await self.send_message('next', id, result.formatted)
+                finally:
+                    await results.aclose()
+            elif operation.operation == OperationType.QUERY:
+                result = execute(schema, document, **options)
+                if asyncio.iscoroutine(result):
+                    result = await result
+                await self.send_message('next', id, result.formatted)
+            else:
+                result = await sync_to_async(execute)(schema, document, **options)
+                await self.send_message('next', id, result.formatted)
+            await self.send_message('complete', id)
+        finally:
+            if self.operations.get(id) is asyncio.current_task():
+                del self.operations[id]
+
+
+def route_websockets(http_application, routes):
+    """ASGI app sending WebSocket connections to ``routes[path]`` and the rest to Django"""
+
+    async def application(scope, receive, send):
+        if scope['type'] == 'websocket':
+            handler = routes.get(scope['path'])
+            if handler is None:
+                await send({'type': 'websocket.close', 'code': 4404})
+                return
+            return await handler(scope, receive, send)
+        return await http_application(scope, receive, send)
+
+    return application
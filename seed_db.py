@@ -102,10 +102,6 @@ def seed_database():
     orders[3].products.set([products[0], products[3]])  # Laptop + Monitor
     orders[4].products.set([products[1], products[2], products[4]])  # Mouse + Keyboard + Headphones
     
-    # Recalculate totals for all orders
-    for order in orders:
-        order.save()
-    
     print(f"Created {len(customers)} customers")
     print(f"Created {len(products)} products")
     print(f"Created {len(orders)} orders")